@@ -11,5 +11,7 @@ __description__ = "A command-line toolkit for music producers to download audio/
 
 from . import downloader
 from . import processor
+from .session import Toolkit
+from .service import SeparationService
 
-__all__ = ["downloader", "processor"]
+__all__ = ["downloader", "processor", "Toolkit", "SeparationService"]
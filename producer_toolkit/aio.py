@@ -0,0 +1,202 @@
+"""
+Asyncio API for Producer Toolkit.
+
+Async counterparts of `download_audio`, `download_video` and
+`extract_stems`. Downloads run concurrently on a thread pool (yt-dlp and
+ffmpeg are blocking), while separation is scheduled onto a small bounded
+executor so concurrent requests don't overload the CPU or memory.
+
+Cancelling a task, or exceeding its timeout, stops the underlying work at
+its next progress update: downloads abort mid-transfer and separation stops
+between stages.
+
+Example:
+    async with AsyncToolkit(output_dir="downloads") as toolkit:
+        paths = await asyncio.gather(*(toolkit.download_audio(url) for url in urls))
+        await toolkit.extract_stems(paths[0], "stems", timeout=600)
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .session import Toolkit
+
+
+class OperationCancelled(Exception):
+    """Raised inside a worker thread to stop work whose task was cancelled."""
+
+
+async def _run_cancellable(executor, fn, *args, timeout=None, progress=None, **kwargs):
+    """
+    Runs a blocking toolkit call on an executor with cancellation and timeout.
+
+    The call receives a progress callback that forwards to `progress` and
+    raises OperationCancelled once the awaiting task is cancelled or times out.
+
+    Args:
+        executor (Executor): Executor to run the call on (None for the loop's default).
+        fn (callable): Blocking function accepting a `progress` keyword argument.
+        *args: Positional arguments for fn.
+        timeout (float, optional): Seconds to wait before cancelling.
+        progress (callable, optional): Progress callback (called from the worker thread).
+        **kwargs: Keyword arguments for fn.
+
+    Returns:
+        The result of fn.
+    """
+    cancelled = threading.Event()
+
+    def checked_progress(event):
+        if cancelled.is_set():
+            raise OperationCancelled(f"{event.get('stage', 'operation')} cancelled")
+        if progress is not None:
+            progress(event)
+
+    loop = asyncio.get_running_loop()
+    call = functools.partial(fn, *args, progress=checked_progress, **kwargs)
+    future = loop.run_in_executor(executor, call)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        # The thread can't be interrupted; it stops at its next progress update
+        cancelled.set()
+        raise
+
+
+class AsyncToolkit:
+    """
+    Asyncio front-end to a `Toolkit` session.
+
+    Args:
+        toolkit (Toolkit, optional): Session to use (default: a new one, closed
+                                     together with this object).
+        download_workers (int): Maximum number of concurrent downloads.
+        separation_workers (int): Maximum number of concurrent separations.
+        timeout (float, optional): Default timeout in seconds for every call.
+        **toolkit_kwargs: Arguments for the new Toolkit when none is given.
+    """
+
+    def __init__(self, toolkit=None, download_workers=8, separation_workers=1, timeout=None,
+                 **toolkit_kwargs):
+        self._owns_toolkit = toolkit is None
+        self.toolkit = toolkit or Toolkit(**toolkit_kwargs)
+        self.timeout = timeout
+        self._download_executor = ThreadPoolExecutor(max_workers=download_workers,
+                                                     thread_name_prefix='pt-download')
+        self._separation_executor = ThreadPoolExecutor(max_workers=separation_workers,
+                                                       thread_name_prefix='pt-separate')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Waits for running work to stop, then releases executors and the session."""
+        loop = asyncio.get_running_loop()
+        for executor in (self._download_executor, self._separation_executor):
+            await loop.run_in_executor(None, functools.partial(executor.shutdown, wait=True,
+                                                               cancel_futures=True))
+        if self._owns_toolkit:
+            await loop.run_in_executor(None, self.toolkit.close)
+
+    def _timeout(self, timeout):
+        return self.timeout if timeout is None else timeout
+
+    async def download_audio(self, url, output_path=None, timeout=None, **kwargs):
+        """Async `download_audio`; returns the path to the WAV file."""
+        return await _run_cancellable(self._download_executor, self.toolkit.download_audio,
+                                      url, output_path, timeout=self._timeout(timeout), **kwargs)
+
+    async def download_video(self, url, output_path=None, timeout=None, **kwargs):
+        """Async `download_video`; returns the path to the MP4 file."""
+        return await _run_cancellable(self._download_executor, self.toolkit.download_video,
+                                      url, output_path, timeout=self._timeout(timeout), **kwargs)
+
+    async def extract_stems(self, audio_path, output_dir, stem_number=2, timeout=None, **kwargs):
+        """Async `extract_stems`; returns the output directory."""
+        return await _run_cancellable(self._separation_executor, self.toolkit.extract_stems,
+                                      audio_path, output_dir, stem_number,
+                                      timeout=self._timeout(timeout), **kwargs)
+
+
+# Module-level functions share a bounded executor for separation
+_separation_executor = None
+_separation_lock = threading.Lock()
+
+
+def _default_separation_executor():
+    global _separation_executor
+    with _separation_lock:
+        if _separation_executor is None:
+            _separation_executor = ThreadPoolExecutor(max_workers=1,
+                                                      thread_name_prefix='pt-separate')
+        return _separation_executor
+
+
+async def download_audio(url, output_path=None, timeout=None, **kwargs):
+    """
+    Async counterpart of `downloader.download_audio`.
+
+    Runs on the event loop's default executor, so several downloads can
+    be awaited concurrently.
+
+    Args:
+        url (str): YouTube video URL.
+        output_path (str, optional): Custom file path or directory.
+        timeout (float, optional): Seconds before the download is cancelled.
+        **kwargs: Other `download_audio` arguments.
+
+    Returns:
+        str: Path to the downloaded WAV file.
+    """
+    from .downloader.download import download_audio as sync_download_audio
+
+    return await _run_cancellable(None, sync_download_audio, url, output_path,
+                                  timeout=timeout, **kwargs)
+
+
+async def download_video(url, output_path=None, timeout=None, **kwargs):
+    """
+    Async counterpart of `downloader.download_video`.
+
+    Args:
+        url (str): YouTube video URL.
+        output_path (str, optional): Custom file path or directory.
+        timeout (float, optional): Seconds before the download is cancelled.
+        **kwargs: Other `download_video` arguments.
+
+    Returns:
+        str: Path to the downloaded MP4 file.
+    """
+    from .downloader.download import download_video as sync_download_video
+
+    return await _run_cancellable(None, sync_download_video, url, output_path,
+                                  timeout=timeout, **kwargs)
+
+
+async def extract_stems(audio_path, output_dir, stem_number=2, timeout=None, **kwargs):
+    """
+    Async counterpart of `processor.extract_stems`.
+
+    Separations are queued on a single-worker executor shared by all callers.
+
+    Args:
+        audio_path (str): Path to the input audio file.
+        output_dir (str): Directory where the separated stems will be saved.
+        stem_number (int or list): Number of stems (2, 4, or 5), or a list of counts.
+        timeout (float, optional): Seconds before the separation is cancelled
+                                   (including time spent waiting in the queue).
+        **kwargs: Other `extract_stems` arguments.
+
+    Returns:
+        str: The output directory where stems are saved.
+    """
+    from .processor.spleeter_processor import extract_stems as sync_extract_stems
+
+    return await _run_cancellable(_default_separation_executor(), sync_extract_stems,
+                                  audio_path, output_dir, stem_number,
+                                  timeout=timeout, **kwargs)
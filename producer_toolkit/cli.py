@@ -12,53 +12,404 @@ import argparse
 import tempfile
 import platform
 import shutil
+import json
+import contextlib
 from pathlib import Path
 
+import soundfile as sf
+
 # Import from the package
-from .downloader.download import download_audio, download_video
-from .processor.spleeter_processor import extract_stems
+from .downloader.download import (download_audio, download_video, download_media,
+                                  plan_output_path, stream_audio)
+from .downloader.metadata import MetadataCache, fetch_info
+from .processor.spleeter_processor import (extract_stems, stream_stem, INSTRUMENTAL,
+                                           _create_separator)
+from .processor.batch import separate_batch
+from .processor.fingerprint import FingerprintIndex
+from .processor.memory import MemoryGovernor, parse_size
+from .processor.spectrogram import SpectrogramCache, MIX
+from .processor.analysis import tag_stems
+from .processor.masks import MASKS_DIR, attach_source, render_from_masks
+from .processor.pcm import PCMWriter
+from .processor.probe import probe_file, probe_link, plan_separation
+from .processor.audio import SoundfileAdapter, set_audio_adapter
+from .processor.resample import QUALITIES
+from .processor.streaming import separate_stream
+from .staging import staging_dir, atomic_path, commit_file
+from .scheduler import POLICIES, DEFAULT_POLICY, read_batch_file, run_jobs
+from .sync import SyncState, default_state_path, sync_folder, sync_playlist, watch
+from .progress import json_lines_callback
 
-def main():
+# Extensions picked up when a folder of samples is given with -s
+AUDIO_EXTENSIONS = {".wav", ".flac", ".aif", ".aiff", ".mp3", ".ogg", ".m4a"}
+
+def parse_time(value):
     """
-    Main function to handle downloading and processing of video/audio.
+    Parses a timestamp given as seconds or as [hh:]mm:ss(.ms).
+
+    Args:
+        value (str): Timestamp such as "90", "1:30" or "0:01:30.5".
+
+    Returns:
+        float: The timestamp in seconds.
     """
-    parser = argparse.ArgumentParser(
-        description="Download and process audio from a link.",
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter
-    )
-    
-    # Required argument: the YouTube link
-    parser.add_argument("link", help="Link to download video/audio from")
-    
-    # Optional arguments for different operations
-    parser.add_argument("-v", "--video", action="store_true", help="Download Video")
-    parser.add_argument("-a", "--audio", action="store_true", help="Download Audio")
-    parser.add_argument("-s", "--stems", action="store_true", help="Download Audio & Extract Stems")
-    parser.add_argument("-o", "--output-dir", dest="output_dir", help="Specify output directory")
-    parser.add_argument("-n", "--num-stems", dest="num_stems", type=int, default=2, 
-                       choices=[2, 4, 5], help="Number of stems to extract (2, 4, or 5)")
+    try:
+        seconds = 0.0
+        for part in value.split(':'):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid time: {value!r} (use seconds or [hh:]mm:ss)")
+    if seconds < 0:
+        raise argparse.ArgumentTypeError(f"Time must not be negative: {value!r}")
+    return seconds
+
+def parse_stem_list(value):
+    """
+    Parses a comma-separated list of stem names.
+
+    Args:
+        value (str): Stem names such as "vocals,drums".
+
+    Returns:
+        list: The stem names.
+    """
+    stems = [stem.strip() for stem in value.split(',') if stem.strip()]
+    if not stems:
+        raise argparse.ArgumentTypeError("Expected at least one stem name")
+    return stems
+
+def parse_memory_size(value):
+    """
+    Parses a memory size such as "512M" or "8G".
+
+    Args:
+        value (str): The size.
+
+    Returns:
+        int: The size in bytes.
+    """
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def write_tags(cache, audio_path, stems_output_dir, stem_numbers):
+    """
+    Writes the tempo and key of the mix and each stem to "tags.json".
+
+    The analysis reuses the spectrograms cached during separation, which are
+    dropped from the cache afterwards so a long batch doesn't accumulate them.
+
+    Args:
+        cache (SpectrogramCache): Cache filled by `extract_stems`.
+        audio_path (str): The separated audio file.
+        stems_output_dir (str): Directory the stems were written to.
+        stem_numbers (list): Stem counts that were separated.
+    """
+    stem_numbers = list(dict.fromkeys(stem_numbers))
+    try:
+        for number in stem_numbers:
+            _write_stem_tags(cache, audio_path, stems_output_dir, stem_numbers, number)
+    finally:
+        cache.discard(audio_path)
+
+def _write_stem_tags(cache, audio_path, stems_output_dir, stem_numbers, number):
+    """Writes the "tags.json" of one stem count (see `write_tags`)."""
+    tags = tag_stems(cache, audio_path, number)
+    if not tags:
+        # Reused and chunked separations don't keep their spectrograms
+        print(f"⚠️ No tags.json for the {number}-stem separation: its stems were reused "
+              f"or separated in chunks, so no spectrograms were kept")
+        return
+    stems_dir = stems_output_dir
+    if len(stem_numbers) > 1:
+        stems_dir = os.path.join(stems_output_dir, f"{number}stems")
+    with atomic_path(os.path.join(stems_dir, "tags.json")) as tmp_path:
+        with open(tmp_path, "w") as f:
+            json.dump(tags, f, indent=2)
+    mix = tags.get(MIX)
+    if mix:
+        print(f"✓ Created tags.json ({mix['tempo']:.0f} BPM, {mix['key']})")
+    else:
+        print("✓ Created tags.json")
+
+def stream_to_stdout(options, start=None, end=None, metadata_cache=None):
+    """
+    Writes the downloaded audio, or a single stem, to stdout as PCM/WAV.
+
+    Status messages are sent to stderr so they don't corrupt the stream.
+
+    Args:
+        options (argparse.Namespace): Parsed command-line options.
+        start (float, optional): Start of the time range in seconds.
+        end (float, optional): End of the time range in seconds.
+        metadata_cache (MetadataCache, optional): Cache of video metadata.
+
+    Returns:
+        int: Exit code.
+    """
+    out = sys.stdout.buffer
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            if options.video:
+                raise ValueError("--stdout is only supported for audio and stems")
+            
+            if not options.stems:
+                print("Streaming audio to stdout...")
+                stream_audio(options.link, out, start=start, end=end,
+                             sample_format=options.sample_format,
+                             container=options.stdout_format,
+                             metadata_cache=metadata_cache)
+                return 0
+            
+            # Stems: exactly one output can be streamed
+            if options.only and len(options.only) == 1 and not options.instrumental:
+                stem = options.only[0]
+            elif options.instrumental and not options.only:
+                stem = INSTRUMENTAL
+            else:
+                raise ValueError("--stdout with -s needs exactly one stem (--only NAME or --instrumental)")
+            stem_number = options.num_stems[0]
+            
+            if options.test and options.test_file:
+                duration = None if end is None else end - (start or 0)
+                stream_stem(options.test_file, stem, out, stem_number=stem_number,
+                            offset=start, duration=duration,
+                            sample_format=options.sample_format,
+                            container=options.stdout_format)
+                return 0
+            
+            # Nothing is written to the output directory; the download is scratch only
+            with staging_dir(tempfile.gettempdir(), options.scratch_dir) as scratch:
+                print("Downloading audio for stem separation...")
+                final_audio_path = download_audio(options.link, scratch,
+                                                  start=start, end=end,
+                                                  metadata_cache=metadata_cache)
+                print(f"Streaming {stem} to stdout...")
+                stream_stem(final_audio_path, stem, out, stem_number=stem_number,
+                            sample_format=options.sample_format,
+                            container=options.stdout_format)
+            return 0
+        except BrokenPipeError:
+            # The reading end closed early (e.g. `| head`); not an error for us
+            return 0
+        except Exception as e:
+            print(f"Error during streaming: {str(e)}")
+            return 1
+
+def separate_stdin(options, output_dir):
+    """
+    Separates raw PCM read from stdin as it arrives (LINK "-").
+
+    With --stdout, a single stem is streamed to stdout; otherwise the stems
+    are written to "<output_dir>/stdin_stems" as they are produced.
+
+    Args:
+        options (argparse.Namespace): Parsed command-line options.
+        output_dir (str): Directory for the stem files.
+
+    Returns:
+        int: Exit code.
+    """
+    out = sys.stdout.buffer
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            if options.stdout:
+                if options.only and len(options.only) == 1 and not options.instrumental:
+                    stems, instrumental = options.only, False
+                elif options.instrumental and not options.only:
+                    stems, instrumental = [], True
+                else:
+                    raise ValueError("--stdout with -s needs exactly one stem (--only NAME or --instrumental)")
+            else:
+                stems, instrumental = options.only, options.instrumental
+            
+            # Stems come out at the model's rate, which the input must also be at
+            separator = _create_separator(options.num_stems[0])
+            sample_rate = separator._sample_rate
+            
+            # Stem files are committed only if the whole stream is separated
+            with contextlib.ExitStack() as outputs:
+                writers = {}
+                
+                def on_output(sources):
+                    for name, waveform in sources.items():
+                        if name not in writers:
+                            if options.stdout:
+                                writers[name] = PCMWriter(out, sample_rate, waveform.shape[1],
+                                                          sample_format=options.sample_format,
+                                                          container=options.stdout_format)
+                            else:
+                                stems_dir = os.path.join(output_dir, "stdin_stems")
+                                os.makedirs(stems_dir, exist_ok=True)
+                                tmp_path = outputs.enter_context(
+                                    atomic_path(os.path.join(stems_dir, f"{name}.wav")))
+                                writers[name] = outputs.enter_context(
+                                    sf.SoundFile(tmp_path, 'w', sample_rate, waveform.shape[1],
+                                                 subtype='PCM_16'))
+                        writers[name].write(waveform)
+                        if options.stdout:
+                            writers[name].flush()
+                
+                streamer = separate_stream(
+                    sys.stdin.buffer,
+                    on_output,
+                    stem_number=options.num_stems[0],
+                    stems=stems,
+                    instrumental=instrumental,
+                    channels=options.channels,
+                    sample_format=options.sample_format,
+                    block_seconds=options.block_seconds,
+                    lookahead_seconds=options.lookahead,
+                    separator=separator
+                )
+            print(f"✅ Stream separated (latency {streamer.latency:.2f}s)")
+            return 0
+        except BrokenPipeError:
+            return 0
+        except Exception as e:
+            print(f"Error during stream separation: {str(e)}")
+            return 1
+
+def separate_download(options, audio_path, output_dir, progress=None, fingerprint_index=None,
+                      governor=None, spectrogram_cache=None, keep_source=False):
+    """
+    Separates a downloaded WAV file into "<title>_stems" in the output directory.
+
+    Args:
+        options (argparse.Namespace): Parsed command-line options.
+        audio_path (str): The downloaded WAV file.
+        output_dir (str): Directory for the results.
+        progress (callable, optional): Progress callback.
+        fingerprint_index (FingerprintIndex, optional): Index for --dedupe.
+        governor (MemoryGovernor, optional): Memory budget for separation.
+        spectrogram_cache (SpectrogramCache, optional): Cache for --tag.
+        keep_source (bool): Leave the WAV in place (with --save-masks, it is
+                            otherwise moved into the masks folder).
+
+    Returns:
+        str: The stems directory.
+    """
+    # Get the filename without extension to use as output directory name
+    filename = os.path.splitext(os.path.basename(audio_path))[0]
+    stems_output_dir = os.path.join(output_dir, f"{filename}_stems")
+    os.makedirs(stems_output_dir, exist_ok=True)
+    # A single stem count keeps the flat output layout
+    num_stems = options.num_stems[0] if len(options.num_stems) == 1 else options.num_stems
     
-    # Hidden testing arguments (not shown in help)
-    parser.add_argument("--test", action="store_true", help=argparse.SUPPRESS, 
-                        default=False)
-    parser.add_argument("--test-file", help=argparse.SUPPRESS)
+    # Extract stems using Spleeter with specified stem count
+    print("Processing audio with Spleeter...")
+    extract_stems(
+        audio_path, 
+        stems_output_dir, 
+        stem_number=num_stems,
+        stems=options.only,
+        instrumental=options.instrumental,
+        progress=progress,
+        fingerprint_index=fingerprint_index,
+        scratch_dir=options.scratch_dir,
+        governor=governor,
+        spectrogram_cache=spectrogram_cache,
+        save_masks=options.save_masks,
+        checkpoint=options.resumable
+    )
+    if spectrogram_cache is not None:
+        write_tags(spectrogram_cache, audio_path, stems_output_dir, options.num_stems)
+    if options.save_masks:
+        # The download is temporary; keep it with the masks for re-rendering
+        stem_numbers = list(dict.fromkeys(options.num_stems))
+        for index, number in enumerate(stem_numbers):
+            masks_dir = os.path.join(stems_output_dir, MASKS_DIR)
+            if len(stem_numbers) > 1:
+                masks_dir = os.path.join(stems_output_dir, f"{number}stems", MASKS_DIR)
+            attach_source(masks_dir, audio_path,
+                          copy=keep_source or index < len(stem_numbers) - 1)
+    return stems_output_dir
+
+def process_outputs(options, output_dir, start=None, end=None, progress=None,
+                    metadata_cache=None, **kwargs):
+    """
+    Produces several outputs of options.link (-a, -v and -s together) from one download.
+
+    With -v, the WAV and the stems are derived from the video download, and
+    the separation runs while the MP4 is still being encoded (see
+    `download_media`).
+
+    Args:
+        options (argparse.Namespace): Parsed command-line options.
+        output_dir (str): Directory for the results.
+        start (float, optional): Start of the time range in seconds.
+        end (float, optional): End of the time range in seconds.
+        progress (callable, optional): Progress callback.
+        metadata_cache (MetadataCache, optional): Cache of video metadata.
+        **kwargs: Other `separate_download` arguments.
+
+    Returns:
+        int: Exit code.
+    """
+    separate = None
+    if options.stems:
+        def separate(audio_path):
+            separate_download(options, audio_path, output_dir, progress=progress,
+                              keep_source=options.audio, **kwargs)
     
-    options = parser.parse_args()
+    try:
+        # Download next to the outputs, so finished files are moved with a rename
+        with staging_dir(output_dir, options.scratch_dir) as scratch:
+            if options.video:
+                print("Downloading video (audio is derived from the same download)...")
+                video_file, audio_file = download_media(options.link, scratch, start=start,
+                                                        end=end, progress=progress,
+                                                        metadata_cache=metadata_cache,
+                                                        on_audio=separate)
+                video_output = os.path.join(output_dir, os.path.basename(video_file))
+                commit_file(video_file, video_output)
+                print(f"Video saved at: {video_output}")
+            else:
+                print("Downloading audio...")
+                audio_file = download_audio(options.link, scratch, start=start, end=end,
+                                            progress=progress, metadata_cache=metadata_cache)
+                if separate is not None:
+                    separate(audio_file)
+            if options.audio:
+                audio_output = os.path.join(output_dir, os.path.basename(audio_file))
+                commit_file(audio_file, audio_output)
+                print(f"Audio saved at: {audio_output}")
+    except Exception as e:
+        print(f"Error during processing: {str(e)}")
+        return 1
+    return 0
+
+def process_link(options, output_dir, start=None, end=None, progress=None, metadata_cache=None,
+                 fingerprint_index=None, governor=None, spectrogram_cache=None):
+    """
+    Downloads and/or separates options.link according to the options.
+
+    Args:
+        options (argparse.Namespace): Parsed command-line options.
+        output_dir (str): Directory for the results.
+        start (float, optional): Start of the time range in seconds.
+        end (float, optional): End of the time range in seconds.
+        progress (callable, optional): Progress callback.
+        metadata_cache (MetadataCache, optional): Cache of video metadata.
+        fingerprint_index (FingerprintIndex, optional): Index for --dedupe.
+        governor (MemoryGovernor, optional): Memory budget for separation.
+        spectrogram_cache (SpectrogramCache, optional): Cache for --tag.
+
+    Returns:
+        int: Exit code.
+    """
+    duration = None if end is None else end - (start or 0)
+    # A single stem count keeps the flat output layout
+    num_stems = options.num_stems[0] if len(options.num_stems) == 1 else options.num_stems
     
-    # Determine the output directory (default: Downloads folder)
-    if options.output_dir:
-        output_dir = options.output_dir
-    else:
-        # Platform-specific Downloads folder
-        if platform.system() == "Windows":
-            # On Windows, use the user's Downloads folder
-            output_dir = os.path.join(os.path.expanduser("~"), "Downloads")
-            if not os.path.exists(output_dir):
-                # Fallback to Documents folder if Downloads doesn't exist
-                output_dir = os.path.join(os.path.expanduser("~"), "Documents")
-        else:
-            # macOS and Linux
-            output_dir = os.path.join(os.path.expanduser("~"), "Downloads")
+    if (options.audio + options.video + options.stems > 1 and not options.test
+            and not os.path.exists(options.link)):
+        # Several outputs of one link share a single download
+        return process_outputs(options, output_dir, start=start, end=end, progress=progress,
+                               metadata_cache=metadata_cache,
+                               fingerprint_index=fingerprint_index, governor=governor,
+                               spectrogram_cache=spectrogram_cache)
     
     if options.audio:
         # Test mode with audio download
@@ -81,7 +432,8 @@ def main():
                 
         # Standard mode - download audio
         print("Downloading audio...")
-        audio_file = download_audio(options.link, output_dir)
+        audio_file = download_audio(options.link, output_dir, start=start, end=end,
+                                    progress=progress, metadata_cache=metadata_cache)
         if audio_file and os.path.exists(audio_file):
             print(f"Audio saved at: {audio_file}")
         else:
@@ -109,13 +461,30 @@ def main():
         
         # Standard mode - download video
         print("Downloading video...")
-        video_file = download_video(options.link, output_dir)
+        video_file = download_video(options.link, output_dir, start=start, end=end,
+                                    progress=progress, metadata_cache=metadata_cache)
         if video_file and os.path.exists(video_file):
             print(f"Video saved at: {video_file}")
         else:
             print("Video download failed.")
             return 1
     
+    elif options.stems and os.path.isdir(options.link):
+        # A local folder of samples is separated with batched inference
+        audio_files = sorted(
+            os.path.join(options.link, name) for name in os.listdir(options.link)
+            if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+        )
+        if not audio_files:
+            print(f"No audio files found in {options.link}")
+            return 1
+        try:
+            separate_files(options, audio_files, output_dir, progress=progress,
+                           governor=governor)
+        except Exception as e:
+            print(f"Error during processing: {str(e)}")
+            return 1
+    
     elif options.stems:
         # Test mode uses a provided test file instead of downloading
         if options.test and options.test_file:
@@ -137,8 +506,22 @@ def main():
                 extract_stems(
                     final_audio_path, 
                     stems_output_dir, 
-                    stem_number=options.num_stems
+                    stem_number=num_stems,
+                    offset=start,
+                    duration=duration,
+                    stems=options.only,
+                    instrumental=options.instrumental,
+                    progress=progress,
+                    fingerprint_index=fingerprint_index,
+                    scratch_dir=options.scratch_dir,
+                    governor=governor,
+                    spectrogram_cache=spectrogram_cache,
+                    save_masks=options.save_masks,
+                    checkpoint=options.resumable
                 )
+                if spectrogram_cache is not None:
+                    write_tags(spectrogram_cache, final_audio_path, stems_output_dir,
+                               options.num_stems)
                 # File is provided externally, no cleanup needed
                 print("Test completed successfully.")
                 return 0
@@ -149,41 +532,28 @@ def main():
         # Standard mode - download and process
         print("Downloading audio for stem separation...")
         
-        # Use a well-defined temp directory for download only
-        temp_audio_dir = tempfile.gettempdir()  
-        final_audio_path = None
-        
+        # Download next to the outputs so nothing crosses filesystems
         try:
-            print(f"Downloading audio to: {temp_audio_dir} ...")
-            final_audio_path = download_audio(options.link, temp_audio_dir)
-            
-            # Ensure the file exists and is not empty
-            if not final_audio_path or not os.path.exists(final_audio_path) or os.path.getsize(final_audio_path) == 0:
-                raise ValueError("Download failed or file is empty.")
-            
-            print(f"Audio downloaded to temp file: {final_audio_path}")
-            
-            # Get the filename without extension to use as output directory name
-            filename = os.path.splitext(os.path.basename(final_audio_path))[0]
-            stems_output_dir = os.path.join(output_dir, f"{filename}_stems")
-            os.makedirs(stems_output_dir, exist_ok=True)
-            
-            # Extract stems using Spleeter with specified stem count
-            print("Processing audio with Spleeter...")
-            extract_stems(
-                final_audio_path, 
-                stems_output_dir, 
-                stem_number=options.num_stems
-            )
-            # Don't repeat the success message, it's already printed in extract_stems()
+            with staging_dir(output_dir, options.scratch_dir) as scratch:
+                print(f"Downloading audio to: {scratch} ...")
+                # Only the requested section is downloaded, so the whole file is separated
+                final_audio_path = download_audio(options.link, scratch, start=start, end=end,
+                                                  progress=progress, metadata_cache=metadata_cache)
+                
+                # Ensure the file exists and is not empty
+                if not final_audio_path or not os.path.exists(final_audio_path) or os.path.getsize(final_audio_path) == 0:
+                    raise ValueError("Download failed or file is empty.")
+                
+                print(f"Audio downloaded to temp file: {final_audio_path}")
+                separate_download(options, final_audio_path, output_dir, progress=progress,
+                                  fingerprint_index=fingerprint_index, governor=governor,
+                                  spectrogram_cache=spectrogram_cache)
+                # Don't repeat the success message, it's already printed in extract_stems()
+            # The staging folder, with the temporary audio file, is removed on exit
+            print("Temporary audio file removed.")
         except Exception as e:
             print(f"Error during processing: {str(e)}")
             return 1
-        finally:
-            # Cleanup the temporary audio file
-            if final_audio_path and os.path.exists(final_audio_path):
-                os.remove(final_audio_path)
-                print("Temporary audio file removed.")
     else:
         # Test mode with audio download
         if options.test and options.test_file:
@@ -203,7 +573,8 @@ def main():
         
         # Default to audio download if no option is selected
         print("Downloading audio (default)...")
-        audio_file = download_audio(options.link, output_dir)
+        audio_file = download_audio(options.link, output_dir, start=start, end=end,
+                                    progress=progress, metadata_cache=metadata_cache)
         if audio_file and os.path.exists(audio_file):
             print(f"Audio saved at: {audio_file}")
         else:
@@ -213,5 +584,379 @@ def main():
     # If we reached here, everything worked
     return 0
 
+def run_batch_file(options, output_dir, metadata_cache=None, **kwargs):
+    """
+    Processes every link or path of a --batch-file, in scheduled order.
+
+    Args:
+        options (argparse.Namespace): Parsed command-line options.
+        output_dir (str): Directory for the results.
+        metadata_cache (MetadataCache, optional): Cache of video metadata.
+        **kwargs: Other `process_link` arguments.
+
+    Returns:
+        int: Exit code (1 if any job failed).
+    """
+    try:
+        jobs = read_batch_file(options.batch_file)
+    except (OSError, ValueError) as e:
+        print(f"Error reading batch file: {str(e)}")
+        return 1
+    if not jobs:
+        print(f"No jobs found in {options.batch_file}")
+        return 1
+    
+    def handler(job):
+        job_options = argparse.Namespace(**vars(options))
+        job_options.link = job.source
+        print(f"\n▶ {job.source}")
+        if process_link(job_options, output_dir, metadata_cache=metadata_cache, **kwargs):
+            raise RuntimeError("processing failed")
+    
+    outcomes = run_jobs(jobs, handler, policy=options.schedule, metadata_cache=metadata_cache)
+    failed = [job for job, _, error, _ in outcomes if error is not None]
+    mean_completion = sum(outcome[3] for outcome in outcomes) / len(outcomes)
+    print(f"✅ {len(outcomes) - len(failed)}/{len(outcomes)} jobs completed "
+          f"(mean completion time {mean_completion:.0f}s)")
+    for job in failed:
+        print(f"  Failed: {job.source}")
+    return 1 if failed else 0
+
+def separate_files(options, audio_files, output_dir, progress=None, governor=None):
+    """
+    Separates local audio files with batched inference (a folder passed as LINK).
+
+    Each file's stems go to "<output_dir>/<name>_stems"; with several stem
+    counts, to a "<n>stems" subfolder of it, like a single file's stems.
+
+    Args:
+        options (argparse.Namespace): Parsed command-line options.
+        audio_files (list): Paths to the audio files.
+        output_dir (str): Directory for the stem folders.
+        progress (callable, optional): Progress callback.
+        governor (MemoryGovernor, optional): Memory budget for separation.
+    """
+    stem_numbers = list(dict.fromkeys(options.num_stems))
+    for number in stem_numbers:
+        stems_dirs = None
+        if len(stem_numbers) > 1:
+            stems_dirs = [
+                os.path.join(output_dir, f"{os.path.splitext(os.path.basename(path))[0]}_stems",
+                             f"{number}stems")
+                for path in audio_files
+            ]
+        separate_batch(
+            audio_files,
+            output_dir,
+            stem_number=number,
+            stems=options.only,
+            instrumental=options.instrumental,
+            pack=options.pack,
+            progress=progress,
+            governor=governor,
+            stems_dirs=stems_dirs
+        )
+
+def run_sync(options, output_dir, metadata_cache=None, governor=None, progress=None,
+             **kwargs):
+    """
+    Processes the new or changed items of a playlist or folder (--sync, --watch).
+
+    Args:
+        options (argparse.Namespace): Parsed command-line options.
+        output_dir (str): Directory for the results.
+        metadata_cache (MetadataCache, optional): Cache of video metadata.
+        governor (MemoryGovernor, optional): Memory budget for separation.
+        progress (callable, optional): Progress callback.
+        **kwargs: Other `process_link` arguments.
+
+    Returns:
+        int: Exit code (1 if any item failed).
+    """
+    source = options.link
+    state_path = options.sync_state or default_state_path(source, output_dir)
+    try:
+        state = SyncState(state_path)
+    except (OSError, ValueError) as e:
+        print(f"Error reading sync state {state_path}: {str(e)}")
+        return 1
+    
+    if os.path.isdir(source):
+        def separate(audio_files):
+            separate_files(options, audio_files, output_dir, progress=progress,
+                           governor=governor)
+        
+        def sync_once():
+            # Failed files are retried by the next sync
+            processed, failed = sync_folder(source, separate, state,
+                                            extensions=AUDIO_EXTENSIONS)
+            if processed or failed:
+                print(f"✅ {len(processed)}/{len(processed) + len(failed)} new files processed")
+            return failed
+    else:
+        def handler(url):
+            item_options = argparse.Namespace(**vars(options))
+            item_options.link = url
+            print(f"\n▶ {url}")
+            if process_link(item_options, output_dir, metadata_cache=metadata_cache,
+                            governor=governor, progress=progress, **kwargs):
+                raise RuntimeError("processing failed")
+        
+        def sync_once():
+            processed, failed = sync_playlist(source, handler, state)
+            if processed or failed:
+                print(f"✅ {len(processed)}/{len(processed) + len(failed)} new items processed")
+            return failed
+    
+    if options.watch:
+        print(f"Watching {source} every {options.watch:g}s (Ctrl+C to stop)")
+        try:
+            watch(sync_once, options.watch)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+        return 0
+    try:
+        failed = sync_once()
+    except Exception as e:
+        print(f"Error during sync: {str(e)}")
+        return 1
+    return 1 if failed else 0
+
+def main():
+    """
+    Main function to handle downloading and processing of video/audio.
+    """
+    parser = argparse.ArgumentParser(
+        description="Download and process audio from a link.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    
+    # Required argument: the YouTube link
+    parser.add_argument("link", nargs="?", help="Link to download video/audio from")
+    parser.add_argument("--batch-file",
+                        help="Process every link or path listed in this file (one per line, "
+                             "optionally followed by priority=N and submitter=NAME)")
+    parser.add_argument("--schedule", choices=POLICIES, default=DEFAULT_POLICY,
+                        help="Order of --batch-file jobs: input order (fifo), shortest first "
+                             "(sjf), by priority, or fair share between submitters (fair)")
+    parser.add_argument("--sync", action="store_true",
+                        help="Only process the items of the playlist or folder LINK that are new "
+                             "or changed since the last --sync run")
+    parser.add_argument("--sync-state",
+                        help="State file of --sync (default: a hidden file in the output directory)")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="Like --sync, then sync again every SECONDS until interrupted")
+    
+    # Optional arguments for different operations
+    parser.add_argument("-v", "--video", action="store_true", help="Download Video")
+    parser.add_argument("-a", "--audio", action="store_true", help="Download Audio")
+    parser.add_argument("-s", "--stems", action="store_true", help="Download Audio & Extract Stems")
+    parser.add_argument("-o", "--output-dir", dest="output_dir", help="Specify output directory")
+    parser.add_argument("-n", "--num-stems", dest="num_stems", type=int, default=[2], nargs="+",
+                       choices=[2, 4, 5], help="Number of stems to extract (2, 4, or 5); "
+                       "several counts (e.g. -n 2 4 5) share one decode and are saved to separate folders")
+    
+    # Optional stem selection, so unused stems are never computed or written
+    parser.add_argument("--only", type=parse_stem_list,
+                        help="Only extract these stems (comma-separated, e.g. vocals,drums)")
+    parser.add_argument("--instrumental", action="store_true",
+                        help="Extract an instrumental (all non-vocal stems summed)")
+    
+    # Optional time range, so only a section of the track is downloaded and processed
+    parser.add_argument("--start", type=parse_time, help="Start time (seconds or [hh:]mm:ss)")
+    range_group = parser.add_mutually_exclusive_group()
+    range_group.add_argument("--end", type=parse_time, help="End time (seconds or [hh:]mm:ss)")
+    range_group.add_argument("--duration", type=parse_time, help="Duration (seconds or [hh:]mm:ss)")
+    
+    parser.add_argument("--progress", choices=["text", "json"], default="text",
+                        help="Progress output: console text, or JSON lines on stderr "
+                        "(bytes downloaded, audio seconds processed, real-time factor, ETA)")
+    
+    parser.add_argument("--stdout", action="store_true",
+                        help="Write the audio (or, with -s, a single stem) to stdout instead of a file")
+    parser.add_argument("--stdout-format", choices=["wav", "raw"], default="wav",
+                        help="Stream container for --stdout: WAV or headerless PCM")
+    parser.add_argument("--sample-format", choices=["s16le", "s24le", "f32le"], default="s16le",
+                        help="Sample format for --stdout and for PCM read from stdin")
+    
+    # Streaming separation of PCM on stdin (LINK "-")
+    parser.add_argument("--channels", type=int, default=2,
+                        help="Channels of the 44.1 kHz PCM read from stdin with LINK -")
+    parser.add_argument("--block-seconds", type=float, default=1.0,
+                        help="With LINK -: length of the blocks stems are produced in")
+    parser.add_argument("--lookahead", type=float, default=0.5,
+                        help="With LINK -: seconds of audio after each block the model sees "
+                             "(adds to the latency, improves quality)")
+    parser.add_argument("--save-masks", action="store_true",
+                        help="With -s: also save the separation masks, for re-rendering with --render")
+    parser.add_argument("--resumable", action="store_true",
+                        help="With -s: separate in chunks and checkpoint each one, so running the "
+                             "same command again after an interruption resumes where it stopped")
+    parser.add_argument("--render", action="store_true",
+                        help="Treat LINK as a masks folder saved with --save-masks and re-render "
+                             "stems from it without the model (--only accepts sums like drums+bass)")
+    parser.add_argument("--render-format", choices=["wav", "flac", "ogg"], default="wav",
+                        help="File format for --render")
+    parser.add_argument("--sample-rate", type=int,
+                        help="Sample rate for --render (default: that of the separation)")
+    parser.add_argument("--pack", action="store_true",
+                        help="With -s on a folder: let short files share model segments (faster "
+                             "for one-shots, but files packed together bleed into each other's stems)")
+    parser.add_argument("--tag", action="store_true",
+                        help="With -s: write the tempo and key of the mix and each stem to tags.json")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Reuse stems of previously separated, near-identical audio "
+                        "(matched by audio fingerprint)")
+    parser.add_argument("--info", action="store_true",
+                        help="Print the video's metadata and planned output path (or a local file's "
+                             "probe) as JSON, without downloading; with -s, also the separation plan")
+    parser.add_argument("--no-metadata-cache", dest="metadata_cache", action="store_false",
+                        help="Always re-extract video metadata instead of using the local cache")
+    parser.add_argument("--memory-budget", type=parse_memory_size,
+                        help="RAM available to stem separation, e.g. 8G (default: $PT_MEMORY_BUDGET, "
+                             "else 70%% of system memory). Longer inputs are separated in chunks")
+    parser.add_argument("--scratch-dir",
+                        help="Directory for intermediate files (default: $PT_SCRATCH_DIR, else a "
+                             "hidden folder in the output directory). Use the same filesystem "
+                             "as the output so results are moved with a rename")
+    parser.add_argument("--resample-quality", choices=list(QUALITIES),
+                        help="Filter used to convert inputs that aren't at 44.1 kHz (default: "
+                             "$PT_RESAMPLE_QUALITY, else standard); fast trades accuracy for speed")
+    
+    # Hidden testing arguments (not shown in help)
+    parser.add_argument("--test", action="store_true", help=argparse.SUPPRESS, 
+                        default=False)
+    parser.add_argument("--test-file", help=argparse.SUPPRESS)
+    
+    options = parser.parse_args()
+    if not options.link and not options.batch_file:
+        parser.error("a LINK or --batch-file is required")
+    if options.link and options.batch_file:
+        parser.error("LINK and --batch-file are mutually exclusive")
+    if options.batch_file and (options.info or options.render or options.stdout):
+        parser.error("--batch-file can't be combined with --info, --render or --stdout")
+    if options.sync or options.watch is not None:
+        if options.batch_file or options.info or options.render or options.stdout:
+            parser.error("--sync can't be combined with --batch-file, --info, --render or --stdout")
+        if options.link and os.path.isdir(options.link) and not options.stems:
+            parser.error("--sync on a folder requires -s")
+        if options.watch is not None and options.watch <= 0:
+            parser.error("--watch must be a positive number of seconds")
+    if options.stems and options.link and os.path.isdir(options.link) and not options.render:
+        # Folders are separated whole with batched inference
+        unsupported = [flag for flag, value in (
+            ("--start", options.start), ("--end", options.end), ("--duration", options.duration),
+            ("--tag", options.tag), ("--save-masks", options.save_masks),
+            ("--resumable", options.resumable), ("--dedupe", options.dedupe),
+        ) if value not in (None, False)]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} can't be used with a folder")
+    
+    # Resolve the requested time range into start/end and offset/duration
+    start = options.start
+    end = options.end
+    if options.duration is not None:
+        end = (start or 0) + options.duration
+    if end is not None and end <= (start or 0):
+        parser.error("--end must be after --start")
+    duration = None if end is None else end - (start or 0)
+    
+    progress = json_lines_callback() if options.progress == "json" else None
+    
+    # Determine the output directory (default: Downloads folder)
+    if options.output_dir:
+        output_dir = options.output_dir
+    else:
+        # Platform-specific Downloads folder
+        if platform.system() == "Windows":
+            # On Windows, use the user's Downloads folder
+            output_dir = os.path.join(os.path.expanduser("~"), "Downloads")
+            if not os.path.exists(output_dir):
+                # Fallback to Documents folder if Downloads doesn't exist
+                output_dir = os.path.join(os.path.expanduser("~"), "Documents")
+        else:
+            # macOS and Linux
+            output_dir = os.path.join(os.path.expanduser("~"), "Downloads")
+    
+    metadata_cache = MetadataCache() if options.metadata_cache else None
+    fingerprint_index = FingerprintIndex() if options.dedupe else None
+    governor = MemoryGovernor(options.memory_budget) if options.memory_budget else None
+    if options.resample_quality:
+        set_audio_adapter(SoundfileAdapter(resample_quality=options.resample_quality))
+    spectrogram_cache = SpectrogramCache() if options.tag else None
+    
+    if options.info:
+        # Metadata-only fast path: plan the work without downloading anything
+        try:
+            if os.path.exists(options.link):
+                media = probe_file(options.link)
+                result = dict(media.to_dict(), path=os.path.abspath(options.link))
+            else:
+                with tempfile.TemporaryDirectory() as scratch:
+                    # Without the shared cache, extract once for this run and throw it away
+                    cache = metadata_cache or MetadataCache(scratch)
+                    info = fetch_info(options.link, cache)
+                    kind = "video" if options.video else "audio"
+                    planned_path = plan_output_path(options.link, output_dir, kind=kind,
+                                                    metadata_cache=cache)
+                    media = probe_link(options.link, cache)
+                result = {
+                    "id": info.get("id"),
+                    "title": info.get("title"),
+                    "duration": info.get("duration"),
+                    "output_path": planned_path,
+                }
+            if options.stems:
+                # What separating it would take, per stem count
+                result["separation"] = {
+                    str(number): plan_separation(media, number, offset=start,
+                                                 duration=duration, governor=governor)
+                    for number in dict.fromkeys(options.num_stems)
+                }
+            print(json.dumps(result, indent=2))
+            return 0
+        except Exception as e:
+            print(f"Error fetching metadata: {str(e)}")
+            return 1
+    
+    if options.render:
+        try:
+            render_stems = list(options.only or [])
+            if options.instrumental:
+                render_stems.append(INSTRUMENTAL)
+            render_from_masks(
+                options.link,
+                options.output_dir,
+                stems=render_stems or None,
+                sample_rate=options.sample_rate,
+                file_format=options.render_format,
+                sample_format=options.sample_format
+            )
+            return 0
+        except Exception as e:
+            print(f"Error during rendering: {str(e)}")
+            return 1
+    
+    if options.link == "-" and options.stems:
+        return separate_stdin(options, output_dir)
+    
+    if options.stdout:
+        return stream_to_stdout(options, start=start, end=end, metadata_cache=metadata_cache)
+    
+    if options.sync or options.watch:
+        return run_sync(options, output_dir, start=start, end=end, progress=progress,
+                        metadata_cache=metadata_cache, fingerprint_index=fingerprint_index,
+                        governor=governor, spectrogram_cache=spectrogram_cache)
+    
+    if options.batch_file:
+        return run_batch_file(options, output_dir, start=start, end=end, progress=progress,
+                              metadata_cache=metadata_cache, fingerprint_index=fingerprint_index,
+                              governor=governor, spectrogram_cache=spectrogram_cache)
+    
+    return process_link(options, output_dir, start=start, end=end, progress=progress,
+                        metadata_cache=metadata_cache, fingerprint_index=fingerprint_index,
+                        governor=governor, spectrogram_cache=spectrogram_cache)
+
+
 if __name__ == "__main__":
     sys.exit(main())
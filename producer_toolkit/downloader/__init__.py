@@ -4,6 +4,9 @@ Downloader module for Producer Toolkit.
 Provides functionality for downloading audio and video from YouTube.
 """
 
-from .download import download_audio, download_video
+from .download import (download_audio, download_video, download_media, plan_output_path,
+                       stream_audio)
+from .metadata import MetadataCache, fetch_info
 
-__all__ = ["download_audio", "download_video"]
+__all__ = ["download_audio", "download_video", "download_media", "plan_output_path",
+           "stream_audio", "MetadataCache", "fetch_info"]
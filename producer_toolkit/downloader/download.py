@@ -1,17 +1,72 @@
+import concurrent.futures
+import contextlib
 import os
 import shutil
+import subprocess
+import tempfile
 import yt_dlp
+from yt_dlp.utils import download_range_func
 
-def download_video(url, output_path=None):
+from ..progress import yt_dlp_hook, postprocessor_hook
+from .metadata import fetch_info
+
+
+def _section_options(start=None, end=None):
     """
-    Downloads a YouTube video in MP4 format with the highest available quality.
+    Builds the yt-dlp options that restrict a download to a time range.
+
+    yt-dlp hands the range to ffmpeg, which seeks in the remote stream so only
+    the requested section is fetched and transcoded.
+
+    Args:
+        start (float, optional): Start of the section in seconds.
+        end (float, optional): End of the section in seconds (default: end of media).
+
+    Returns:
+        dict: Extra yt-dlp options (empty when no range is requested).
+    """
+    if start is None and end is None:
+        return {}
+    start = start or 0
+    end = float('inf') if end is None else end
+    if end <= start:
+        raise ValueError(f"End time ({end}) must be after start time ({start}).")
+    return {
+        'download_ranges': download_range_func(None, [(start, end)]),
+        # Cut on exact timestamps rather than the nearest keyframe
+        'force_keyframes_at_cuts': True,
+    }
+
+
+def _progress_options(progress=None):
+    """
+    Builds the yt-dlp options that forward download and transcode progress.
+
+    Args:
+        progress (callable, optional): Progress callback (see producer_toolkit.progress).
+
+    Returns:
+        dict: Extra yt-dlp options (empty when no callback is given).
+    """
+    if progress is None:
+        return {}
+    return {
+        'progress_hooks': [yt_dlp_hook(progress)],
+        'postprocessor_hooks': [postprocessor_hook(progress)],
+        # The callback replaces yt-dlp's console progress bar
+        'noprogress': True,
+    }
+
+
+def _video_options(output_path=None):
+    """
+    Builds the yt-dlp options for an MP4 video download.
 
     Args:
-        url (str): YouTube video URL.
         output_path (str, optional): Custom file path or directory (default: video title).
 
     Returns:
-        str: Path to the downloaded MP4 file.
+        tuple: (yt-dlp options, output path template).
     """
     if output_path is None:
         output_path = '%(title)s.mp4'  # Default filename
@@ -34,23 +89,18 @@ def download_video(url, output_path=None):
             '-movflags', '+faststart'
         ],
     }
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
-    
-    return output_path
+    return ydl_opts, output_path
 
 
-def download_audio(url, output_path=None):
+def _audio_options(output_path=None):
     """
-    Downloads a YouTube video's audio and converts it to WAV.
+    Builds the yt-dlp options for a WAV audio download.
 
     Args:
-        url (str): YouTube video URL.
         output_path (str, optional): Custom file path or directory (default: video title).
 
     Returns:
-        str: Path to the downloaded WAV file.
+        tuple: (yt-dlp options, return path template ending in .wav).
     """
     if output_path is None:
         output_path = '%(title)s'  # Without extension
@@ -59,8 +109,6 @@ def download_audio(url, output_path=None):
     elif os.path.isdir(output_path):
         # If output_path is a directory, build the output path
         output_path = os.path.join(output_path, '%(title)s')
-        # And store the directory for the return value
-        output_dir = output_path
         return_path = output_path + '.wav'
     else:
         # If a specific filename was given
@@ -82,16 +130,327 @@ def download_audio(url, output_path=None):
         # Dynamically find ffmpeg path
         'ffmpeg_location': shutil.which('ffmpeg'),
     }
+    return ydl_opts, return_path
+
+
+def _download_with(ydl, url, metadata_cache=None):
+    """
+    Downloads a URL on an existing YoutubeDL instance.
+
+    With a metadata cache, the cached info is reused so the extractor does
+    not run again; if its format URLs have expired, the info is extracted
+    afresh and the cache updated.
+
+    Args:
+        ydl (yt_dlp.YoutubeDL): Configured downloader.
+        url (str): YouTube video URL.
+        metadata_cache (MetadataCache, optional): Cache of info dictionaries.
+
+    Returns:
+        dict: The processed info dictionary.
+    """
+    if metadata_cache is None:
+        return ydl.extract_info(url, download=True)
+
+    info = fetch_info(url, metadata_cache, ydl=ydl)
+    try:
+        return ydl.process_ie_result(dict(info), download=True)
+    except yt_dlp.utils.DownloadError:
+        info = ydl.extract_info(url, download=True)
+        metadata_cache.put(url, ydl.sanitize_info(info, remove_private_keys=True))
+        return info
+
+
+def _downloaded_path(info_dict, fallback):
+    """
+    Returns the final path of a download from its info dictionary.
+
+    Args:
+        info_dict (dict): Processed info dictionary returned by yt-dlp.
+        fallback (str): Path template to fill in when yt-dlp did not report a path.
+
+    Returns:
+        str: Path to the downloaded (and post-processed) file.
+    """
+    if not info_dict:
+        return fallback
+    downloads = info_dict.get('requested_downloads') or []
+    if downloads and downloads[-1].get('filepath'):
+        return downloads[-1]['filepath']
+    # Get the actual title to build the correct return path
+    if 'title' in info_dict and '%(title)s' in fallback:
+        # Replace the template with the actual title
+        return fallback.replace('%(title)s', info_dict['title'])
+    return fallback
+
+
+def _download_audio_with(ydl, url, return_path, metadata_cache=None):
+    """
+    Runs an audio download on an existing YoutubeDL instance.
+
+    Args:
+        ydl (yt_dlp.YoutubeDL): Downloader configured with `_audio_options`.
+        url (str): YouTube video URL.
+        return_path (str): Return path template from `_audio_options`.
+        metadata_cache (MetadataCache, optional): Cache of info dictionaries.
+
+    Returns:
+        str: Path to the downloaded WAV file.
+    """
+    return _downloaded_path(_download_with(ydl, url, metadata_cache), return_path)
+
+
+def plan_output_path(url, output_path=None, kind='audio', metadata_cache=None):
+    """
+    Computes where a download would be saved, without downloading it.
+
+    Uses only the video's metadata (from the cache when available), so it
+    is cheap enough to plan and dedupe batches of links.
+
+    Args:
+        url (str): YouTube video URL.
+        output_path (str, optional): Custom file path or directory (default: video title).
+        kind (str): "audio" (WAV) or "video" (MP4).
+        metadata_cache (MetadataCache, optional): Cache of info dictionaries.
+
+    Returns:
+        str: The planned output file path.
+    """
+    if kind == 'audio':
+        ydl_opts, _ = _audio_options(output_path)
+    else:
+        ydl_opts, _ = _video_options(output_path)
+    ydl_opts.update({'quiet': True, 'no_warnings': True})
 
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info_dict = ydl.extract_info(url, download=True)
-        # Get the actual title to build the correct return path
-        if info_dict and 'title' in info_dict:
-            # Replace the template with the actual title
-            if '%(title)s' in return_path:
-                return_path = return_path.replace('%(title)s', info_dict['title'])
-
-    return return_path
+        info = fetch_info(url, metadata_cache, ydl=ydl)
+        path = ydl.prepare_filename(info)
+    # FFmpegExtractAudio appends the .wav extension to the extension-less template
+    return path + '.wav' if kind == 'audio' else path
+
+
+def download_video(url, output_path=None, start=None, end=None, progress=None,
+                   metadata_cache=None):
+    """
+    Downloads a YouTube video in MP4 format with the highest available quality.
+
+    Args:
+        url (str): YouTube video URL.
+        output_path (str, optional): Custom file path or directory (default: video title).
+        start (float, optional): Only download from this time (in seconds).
+        end (float, optional): Only download up to this time (in seconds).
+        progress (callable, optional): Receives progress event dictionaries
+                                       (see producer_toolkit.progress).
+        metadata_cache (MetadataCache, optional): Reuse cached video metadata instead
+                                                  of running the extractor again.
+
+    Returns:
+        str: Path to the downloaded MP4 file.
+    """
+    ydl_opts, output_path = _video_options(output_path)
+    ydl_opts.update(_section_options(start, end))
+    ydl_opts.update(_progress_options(progress))
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        return _downloaded_path(_download_with(ydl, url, metadata_cache), output_path)
+
+
+def download_audio(url, output_path=None, start=None, end=None, progress=None,
+                   metadata_cache=None):
+    """
+    Downloads a YouTube video's audio and converts it to WAV.
+
+    Args:
+        url (str): YouTube video URL.
+        output_path (str, optional): Custom file path or directory (default: video title).
+        start (float, optional): Only download from this time (in seconds).
+        end (float, optional): Only download up to this time (in seconds).
+        progress (callable, optional): Receives progress event dictionaries
+                                       (see producer_toolkit.progress).
+        metadata_cache (MetadataCache, optional): Reuse cached video metadata instead
+                                                  of running the extractor again.
+
+    Returns:
+        str: Path to the downloaded WAV file.
+    """
+    ydl_opts, return_path = _audio_options(output_path)
+    ydl_opts.update(_section_options(start, end))
+    ydl_opts.update(_progress_options(progress))
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        return _download_audio_with(ydl, url, return_path, metadata_cache)
+
+
+def _extract_wav(source_path, wav_path):
+    """
+    Converts a downloaded audio or video file to the WAV format of `download_audio`.
+
+    Args:
+        source_path (str): Downloaded file with an audio stream.
+        wav_path (str): Path of the WAV file to write.
+    """
+    command = [
+        shutil.which('ffmpeg') or 'ffmpeg', '-nostdin', '-loglevel', 'error', '-y',
+        '-i', source_path, '-vn',
+        '-ar', '44100', '-ac', '2', '-c:a', 'pcm_s24le',
+        wav_path,
+    ]
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+
+
+def download_media(url, output_dir, start=None, end=None, progress=None, metadata_cache=None,
+                   on_audio=None):
+    """
+    Downloads a video once and derives both the MP4 and the WAV from that fetch.
+
+    yt-dlp fetches the video and audio streams in one run. As soon as the
+    audio stream is on disk, it is converted to WAV in a background thread
+    and `on_audio` is called with the WAV path, while yt-dlp is still
+    muxing and re-encoding the MP4, so e.g. stem separation overlaps with
+    the video encode. When the video has no separate audio stream, the WAV
+    is taken from the finished MP4 instead.
+
+    Args:
+        url (str): YouTube video URL.
+        output_dir (str): Directory for both files (named after the video title).
+        start (float, optional): Only download from this time (in seconds).
+        end (float, optional): Only download up to this time (in seconds).
+        progress (callable, optional): Receives progress event dictionaries
+                                       (see producer_toolkit.progress).
+        metadata_cache (MetadataCache, optional): Reuse cached video metadata instead
+                                                  of running the extractor again.
+        on_audio (callable, optional): Called with the WAV path once it is written,
+                                       in the background thread.
+
+    Returns:
+        tuple: (path to the MP4 file, path to the WAV file).
+    """
+    ydl_opts, video_template = _video_options(output_dir)
+    # Keep the separate streams after merging: the audio one becomes the WAV
+    ydl_opts['keepvideo'] = True
+    ydl_opts.update(_section_options(start, end))
+    ydl_opts.update(_progress_options(progress))
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                     thread_name_prefix='pt-media-audio')
+    audio_future = None
+    stream_files = []
+
+    def derive_audio(source_path, wav_path):
+        _extract_wav(source_path, wav_path)
+        if on_audio is not None:
+            on_audio(wav_path)
+        return wav_path
+
+    def on_stream_finished(status):
+        nonlocal audio_future
+        if status.get('status') != 'finished':
+            return
+        stream_files.append(status['filename'])
+        stream = status.get('info_dict') or {}
+        if audio_future is None and stream.get('vcodec') == 'none':
+            # Strip the ".f<format id>.<ext>" of yt-dlp's per-stream file name
+            base = os.path.splitext(status['filename'])[0]
+            suffix = f".f{stream.get('format_id')}"
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+            audio_future = executor.submit(derive_audio, status['filename'], base + '.wav')
+
+    ydl_opts['progress_hooks'] = ydl_opts.get('progress_hooks', []) + [on_stream_finished]
+
+    video_path = None
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            video_path = _downloaded_path(_download_with(ydl, url, metadata_cache),
+                                          video_template)
+        if audio_future is None:
+            audio_future = executor.submit(derive_audio, video_path,
+                                           os.path.splitext(video_path)[0] + '.wav')
+        audio_path = audio_future.result()
+    finally:
+        executor.shutdown(wait=True)
+        for path in stream_files:
+            # The kept streams, not the merged MP4 (the only file when nothing was merged)
+            if video_path is None or os.path.abspath(path) != os.path.abspath(video_path):
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+    return video_path, audio_path
+
+
+def _best_audio_format(info):
+    """Picks the highest-bitrate audio-only format of a video (or the video's own URL)."""
+    audio_formats = [
+        f for f in info.get('formats') or []
+        if f.get('url') and f.get('acodec') not in (None, 'none') and f.get('vcodec') in (None, 'none')
+    ]
+    if audio_formats:
+        return max(audio_formats, key=lambda f: f.get('abr') or f.get('tbr') or 0)
+    return info
+
+
+def stream_audio(url, stream, start=None, end=None, sample_rate=44100, channels=2,
+                 sample_format='s16le', container='wav', metadata_cache=None):
+    """
+    Streams a video's audio as PCM to a binary stream while it downloads.
+
+    Nothing is written to disk: ffmpeg reads the remote audio and its
+    decoded output is copied to `stream` as it is produced.
+
+    Args:
+        url (str): YouTube video URL.
+        stream (file): Binary stream to write to (e.g. sys.stdout.buffer).
+        start (float, optional): Only stream from this time (in seconds).
+        end (float, optional): Only stream up to this time (in seconds).
+        sample_rate (int): Output sample rate. Default is 44100 Hz.
+        channels (int): Output channel count. Default is 2 (stereo).
+        sample_format (str): "s16le", "s24le" or "f32le".
+        container (str): "wav" for a WAV stream or "raw" for bare PCM.
+        metadata_cache (MetadataCache, optional): Reuse cached video metadata.
+    """
+    if container not in ('wav', 'raw'):
+        raise ValueError(f"Unsupported container: {container}")
+
+    info = fetch_info(url, metadata_cache)
+    audio_format = _best_audio_format(info)
+    headers = audio_format.get('http_headers') or info.get('http_headers') or {}
+
+    command = [shutil.which('ffmpeg') or 'ffmpeg', '-nostdin', '-loglevel', 'error']
+    if headers:
+        command += ['-headers', ''.join(f"{key}: {value}\r\n" for key, value in headers.items())]
+    if start:
+        command += ['-ss', str(start)]
+    command += ['-i', audio_format['url'], '-vn']
+    if end is not None:
+        command += ['-t', str(end - (start or 0))]
+    command += [
+        '-ar', str(sample_rate), '-ac', str(channels),
+        '-c:a', f'pcm_{sample_format}',
+        '-f', 'wav' if container == 'wav' else sample_format,
+        'pipe:1',
+    ]
+
+    # ffmpeg's messages go to a temporary file: a pipe nobody reads while the
+    # audio is copied would fill up and block ffmpeg
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors)
+        finished = False
+        try:
+            shutil.copyfileobj(process.stdout, stream, 64 * 1024)
+            stream.flush()
+            finished = True
+        finally:
+            if not finished:
+                # The reader went away (BrokenPipeError) or the copy failed:
+                # stop ffmpeg rather than waiting for the whole download
+                process.terminate()
+            process.stdout.close()
+            returncode = process.wait()
+        if returncode != 0:
+            errors.seek(0)
+            message = errors.read().decode(errors='replace').strip()
+            raise RuntimeError(f"ffmpeg failed: {message}")
 
 
 def test():
@@ -0,0 +1,151 @@
+"""
+Metadata cache for yt-dlp info lookups.
+
+Extracting a video's info (title, duration, formats) is a large fixed cost
+per link. The cache stores the info JSON on disk, keyed by a normalized
+video ID, so repeated runs can plan output paths, dedupe jobs and start
+downloads without running the extractor again.
+"""
+
+import json
+import os
+import re
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import yt_dlp
+
+from ..staging import atomic_path
+
+# Format URLs returned by YouTube expire after about six hours
+DEFAULT_TTL = 6 * 60 * 60
+
+_YOUTUBE_ID_PATTERNS = [
+    re.compile(r'(?:youtube(?:-nocookie)?\.com/(?:watch\?(?:.*&)?v=|embed/|shorts/|live/|v/))([\w-]{11})'),
+    re.compile(r'youtu\.be/([\w-]{11})'),
+]
+
+
+def default_cache_dir():
+    """Returns the default metadata cache directory (under $XDG_CACHE_HOME or ~/.cache)."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'producer-toolkit', 'info')
+
+
+def normalize_url(url):
+    """
+    Returns a stable cache key for a URL.
+
+    YouTube links in any of their forms (watch, youtu.be, shorts, embed)
+    map to "youtube:<video id>". Other URLs are normalized by lowercasing
+    the scheme and host, sorting the query and dropping the fragment.
+
+    Args:
+        url (str): Video URL.
+
+    Returns:
+        str: The cache key.
+    """
+    for pattern in _YOUTUBE_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return f"youtube:{match.group(1)}"
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+
+
+def info_key(info):
+    """Returns the cache key for an extracted info dictionary ("<extractor>:<id>")."""
+    extractor = (info.get('extractor_key') or info.get('extractor') or 'generic').lower()
+    return f"{extractor}:{info.get('id')}"
+
+
+class MetadataCache:
+    """
+    On-disk cache of yt-dlp info dictionaries with a time-to-live.
+
+    Args:
+        cache_dir (str, optional): Where info JSON files are stored
+                                   (default: see `default_cache_dir`).
+        ttl (float): Seconds after which an entry is considered stale.
+    """
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.ttl = ttl
+
+    def _path(self, key):
+        filename = re.sub(r'[^\w.-]', '_', key)[:200] + '.json'
+        return os.path.join(self.cache_dir, filename)
+
+    def get(self, url, max_age=None):
+        """
+        Looks up the cached info for a URL.
+
+        Args:
+            url (str): Video URL.
+            max_age (float, optional): Override of the cache TTL, in seconds.
+
+        Returns:
+            dict: The info dictionary, or None when missing or stale.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        try:
+            with open(self._path(normalize_url(url)), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('fetched_at', 0) > max_age:
+            return None
+        return entry.get('info')
+
+    def put(self, url, info):
+        """
+        Stores a (sanitized) info dictionary under the URL and the video ID.
+
+        Args:
+            url (str): Video URL the info was extracted from.
+            info (dict): Info dictionary from yt-dlp.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        data = json.dumps({'fetched_at': time.time(), 'info': info})
+        for key in {normalize_url(url), info_key(info)}:
+            # Written to a unique temporary file and renamed, so readers never
+            # see partial JSON and concurrent writers don't share a temp file
+            with atomic_path(self._path(key)) as tmp_path:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+
+
+def fetch_info(url, cache=None, ydl=None):
+    """
+    Returns a video's metadata without downloading it.
+
+    Served from the cache when a fresh entry exists; otherwise the
+    extractor runs once and the result is cached.
+
+    Args:
+        url (str): Video URL.
+        cache (MetadataCache, optional): Cache to use. If None, the extractor
+                                         always runs and nothing is stored.
+        ydl (yt_dlp.YoutubeDL, optional): Existing downloader to extract with.
+
+    Returns:
+        dict: The info dictionary (title, id, duration, formats, ...).
+    """
+    if cache is not None:
+        info = cache.get(url)
+        if info is not None:
+            return info
+
+    if ydl is None:
+        with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as own_ydl:
+            info = own_ydl.sanitize_info(own_ydl.extract_info(url, download=False),
+                                         remove_private_keys=True)
+    else:
+        info = ydl.sanitize_info(ydl.extract_info(url, download=False),
+                                 remove_private_keys=True)
+    if cache is not None:
+        cache.put(url, info)
+    return info
@@ -4,6 +4,22 @@ Processor module for Producer Toolkit.
 Provides functionality for audio processing and stem separation using Spleeter.
 """
 
-from .spleeter_processor import extract_stems
+from .spleeter_processor import extract_stems, stream_stem
+from .audio import AudioAdapter, load_audio, set_audio_adapter
+from .batch import separate_batch
+from .fingerprint import FingerprintIndex, compute_fingerprint
+from .memory import MemoryGovernor, estimate_peak_memory
+from .probe import probe_file, probe_files, plan_separation
+from .resample import conform
+from .spectrogram import Spectrogram, SpectrogramCache
+from .analysis import analyze, tag_stems
+from .masks import render_from_masks
+from .streaming import StreamingSeparator, separate_stream
 
-__all__ = ["extract_stems"]
+__all__ = ["extract_stems", "stream_stem", "separate_batch",
+           "AudioAdapter", "load_audio", "set_audio_adapter",
+           "FingerprintIndex", "compute_fingerprint",
+           "MemoryGovernor", "estimate_peak_memory",
+           "probe_file", "probe_files", "plan_separation", "conform",
+           "Spectrogram", "SpectrogramCache", "analyze", "tag_stems",
+           "render_from_masks", "StreamingSeparator", "separate_stream"]
@@ -0,0 +1,97 @@
+"""
+Tempo and key estimation from cached spectrograms.
+
+The estimators take a `Spectrogram` (see producer_toolkit.processor.spectrogram),
+so stems separated with a `SpectrogramCache` can be tagged without decoding
+or transforming the audio again.
+"""
+
+import numpy as np
+
+# Krumhansl-Kessler key profiles, starting on the tonic
+_MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+_MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+_PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+
+def estimate_tempo(spectrogram):
+    """
+    Estimates the tempo of a spectrogram.
+
+    Args:
+        spectrogram (Spectrogram): Spectrogram of the mix or a stem.
+
+    Returns:
+        float: Tempo in beats per minute.
+    """
+    import librosa
+
+    mel = librosa.feature.melspectrogram(S=spectrogram.power, sr=spectrogram.sample_rate)
+    onset_envelope = librosa.onset.onset_strength(S=librosa.power_to_db(mel),
+                                                  sr=spectrogram.sample_rate,
+                                                  hop_length=spectrogram.frame_step)
+    tempo = librosa.beat.tempo(onset_envelope=onset_envelope, sr=spectrogram.sample_rate,
+                               hop_length=spectrogram.frame_step)
+    return float(tempo[0])
+
+
+def estimate_key(spectrogram):
+    """
+    Estimates the key of a spectrogram by matching its chroma to key profiles.
+
+    Args:
+        spectrogram (Spectrogram): Spectrogram of the mix or a (pitched) stem.
+
+    Returns:
+        str: Key such as "A minor", or None for silent input.
+    """
+    import librosa
+
+    chroma = librosa.feature.chroma_stft(S=spectrogram.power, sr=spectrogram.sample_rate,
+                                         n_fft=spectrogram.frame_length)
+    profile = chroma.mean(axis=1)
+    if not profile.any():
+        return None
+    best_score, best_key = -np.inf, None
+    for mode, template in (('major', _MAJOR_PROFILE), ('minor', _MINOR_PROFILE)):
+        for tonic in range(12):
+            score = np.corrcoef(profile, np.roll(template, tonic))[0, 1]
+            if score > best_score:
+                best_score, best_key = score, f"{_PITCH_CLASSES[tonic]} {mode}"
+    return best_key
+
+
+def analyze(spectrogram):
+    """
+    Returns the tempo and key of a spectrogram.
+
+    Args:
+        spectrogram (Spectrogram): Spectrogram of the mix or a stem.
+
+    Returns:
+        dict: {"tempo": beats per minute, "key": key name or None}.
+    """
+    return {
+        "tempo": round(estimate_tempo(spectrogram), 2),
+        "key": estimate_key(spectrogram),
+    }
+
+
+def tag_stems(cache, audio_path, stem_number=None):
+    """
+    Analyzes the mix and every cached stem of an audio file.
+
+    Args:
+        cache (SpectrogramCache): Cache filled by `extract_stems`.
+        audio_path (str): The separated audio file.
+        stem_number (int, optional): Stem count of the model whose stems to analyze.
+
+    Returns:
+        dict: Mapping of "mix" and each stem name to its `analyze` result.
+    """
+    tags = {}
+    for name in cache.names(audio_path, stem_number):
+        spectrogram = cache.get(audio_path, name, stem_number)
+        if spectrogram is not None:  # May have been evicted meanwhile
+            tags[name] = analyze(spectrogram)
+    return tags
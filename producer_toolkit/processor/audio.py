@@ -0,0 +1,292 @@
+"""
+Audio loading helpers for the processor.
+
+Decoding goes through an audio adapter. The default one reads uncompressed
+and lossless files (WAV, FLAC, AIFF...) in-process with libsndfile, seeking
+straight to the requested segment and resampling in-process when needed
+(see producer_toolkit.processor.resample), and hands everything else (MP3,
+AAC, Opus...) to an ffmpeg subprocess. Inputs with more than two channels
+are mixed down to stereo, the layout the models use. Another adapter can
+be installed with `set_audio_adapter`, e.g. to decode from a network store.
+
+`load_audio(..., mmap=True)` memory-maps PCM and float WAV files instead
+(see `MappedWaveform`), so long inputs are decoded window by window.
+"""
+
+import mmap
+import struct
+import threading
+
+import ffmpeg
+import numpy as np
+import soundfile as sf
+
+from .probe import probe_file
+from .resample import conform
+
+# Containers libsndfile decodes in-process (PCM, float or FLAC samples)
+IN_PROCESS_FORMATS = {'WAV', 'WAVEX', 'W64', 'RF64', 'AIFF', 'CAF', 'FLAC'}
+
+# WAV containers and sample formats that can be memory-mapped: bytes per
+# sample, and the scale turning them into floats like ffmpeg's f32le output
+_MAPPABLE_FORMATS = {'WAV', 'WAVEX', 'RF64'}
+_MAPPABLE_SUBTYPES = {
+    'PCM_16': (2, 1.0 / 2 ** 15),
+    'PCM_24': (3, 1.0 / 2 ** 31),  # Placed in the top bytes of an int32
+    'PCM_32': (4, 1.0 / 2 ** 31),
+    'FLOAT': (4, None),
+}
+
+
+class AudioAdapter:
+    """
+    Decodes audio files into float32 waveforms.
+
+    Subclasses implement `load`; install one with `set_audio_adapter`.
+    """
+
+    def load(self, audio_path, offset=None, duration=None, sample_rate=44100):
+        """
+        Decodes (a segment of) an audio file.
+
+        Args:
+            audio_path (str): Path to the input audio file.
+            offset (float, optional): Start of the segment in seconds.
+            duration (float, optional): Length of the segment in seconds (default: until the end).
+            sample_rate (int): Sample rate to decode to.
+
+        Returns:
+            numpy.ndarray: Waveform of shape (samples, channels).
+        """
+        raise NotImplementedError
+
+
+class FFmpegAdapter(AudioAdapter):
+    """Decodes any format ffmpeg supports, in a subprocess."""
+
+    def load(self, audio_path, offset=None, duration=None, sample_rate=44100):
+        # The channel count comes from the (cached) header probe, not another ffprobe run
+        n_channels = probe_file(audio_path).channels
+        if not n_channels:
+            raise ValueError(f"No audio stream found in {audio_path}")
+
+        # Unlike Spleeter's default adapter, the offset and duration are applied
+        # on the ffmpeg input so only the requested segment is decoded
+        input_kwargs = {}
+        if offset:
+            input_kwargs['ss'] = offset
+        if duration is not None:
+            input_kwargs['t'] = duration
+        output_kwargs = {}
+        if n_channels > 2:
+            output_kwargs['ac'] = n_channels = 2
+
+        buffer, _ = (
+            ffmpeg
+            .input(audio_path, **input_kwargs)
+            .output('pipe:', format='f32le', ar=sample_rate, **output_kwargs)
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+        return np.frombuffer(buffer, dtype='<f4').reshape(-1, n_channels)
+
+
+class SoundfileAdapter(AudioAdapter):
+    """
+    Decodes uncompressed and lossless files in-process with libsndfile.
+
+    Files at another sample rate are resampled in-process (see
+    `processor.resample.resample`), and files with more than two channels
+    are mixed down to stereo.
+
+    Args:
+        fallback (AudioAdapter, optional): Adapter for other formats
+                                           (default: an FFmpegAdapter).
+        resample_quality (str, optional): "fast", "standard" or "high"
+                                          (default: $PT_RESAMPLE_QUALITY, else "standard").
+    """
+
+    def __init__(self, fallback=None, resample_quality=None):
+        self.fallback = fallback or FFmpegAdapter()
+        self.resample_quality = resample_quality
+
+    def load(self, audio_path, offset=None, duration=None, sample_rate=44100):
+        try:
+            audio_file = sf.SoundFile(audio_path)
+        except RuntimeError:  # Not a format libsndfile reads
+            return self.fallback.load(audio_path, offset, duration, sample_rate)
+        with audio_file:
+            if audio_file.format not in IN_PROCESS_FORMATS:
+                return self.fallback.load(audio_path, offset, duration, sample_rate)
+            # The segment is located at the file's own rate
+            file_rate = audio_file.samplerate
+            start = min(int(round((offset or 0) * file_rate)), audio_file.frames)
+            frames = -1 if duration is None else int(round(duration * file_rate))
+            audio_file.seek(start)
+            # Same scaling as ffmpeg's f32le output (integer PCM divided by 2^(bits-1))
+            waveform = audio_file.read(frames, dtype='float32', always_2d=True)
+        channels = 2 if waveform.shape[1] > 2 else None
+        return conform(waveform, file_rate, sample_rate, channels=channels,
+                       quality=self.resample_quality)
+
+
+class MappedWaveform:
+    """
+    A memory-mapped WAV file that decodes windows of samples on demand.
+
+    Behaves like a read-only float32 array of shape (samples, channels) for
+    the operations the processor uses: `shape`, `len()` and slicing along
+    the first axis, which returns a float32 array. Float files are returned
+    as views of the mapping, without a copy; integer PCM is converted one
+    window at a time, so memory use follows the window and not the file.
+
+    Use `map_wav` to create one.
+    """
+
+    dtype = np.dtype('float32')
+    ndim = 2
+
+    def __init__(self, raw, subtype, start=0, stop=None):
+        self._raw = raw
+        self._subtype = subtype
+        self._start = start
+        self._stop = len(raw) if stop is None else min(stop, len(raw))
+
+    @property
+    def shape(self):
+        return (max(self._stop - self._start, 0), self._raw.shape[1])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("MappedWaveform only supports contiguous slices")
+        start, stop, _ = key.indices(len(self))
+        stop = max(stop, start)
+        window = self._raw[self._start + start:self._start + stop]
+        return self._decode(window)
+
+    def __array__(self, dtype=None):
+        waveform = self[:]
+        return waveform if dtype is None else waveform.astype(dtype)
+
+    def _decode(self, window):
+        width, scale = _MAPPABLE_SUBTYPES[self._subtype]
+        if scale is None:
+            return window
+        if width == 3:
+            # Little-endian 24-bit samples into the top three bytes of an int32
+            samples = np.zeros(window.shape[:2] + (4,), dtype=np.uint8)
+            samples[..., 1:] = window
+            window = samples.view('<i4')[..., 0]
+        return window.astype(np.float32) * np.float32(scale)
+
+
+def _data_chunk_offset(audio_path):
+    """Returns the byte offset of the sample data of a RIFF/RF64 WAV file."""
+    with open(audio_path, 'rb') as f:
+        header = f.read(12)
+        if header[:4] not in (b'RIFF', b'RF64') or header[8:12] != b'WAVE':
+            return None
+        position = 12
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = struct.unpack('<4sI', chunk)
+            if chunk_id == b'data':
+                return position + 8
+            # Chunks are padded to an even size
+            position += 8 + size + (size & 1)
+            f.seek(position)
+
+
+def map_wav(audio_path, offset=None, duration=None, sample_rate=44100):
+    """
+    Memory-maps (a segment of) a WAV file.
+
+    Args:
+        audio_path (str): Path to the WAV file.
+        offset (float, optional): Start of the segment in seconds.
+        duration (float, optional): Length of the segment in seconds (default: until the end).
+        sample_rate (int): Sample rate the caller needs.
+
+    Returns:
+        MappedWaveform: The segment, or None when the file can't be mapped
+                        (not a PCM/float WAV, at another sample rate, or
+                        with more than two channels).
+    """
+    try:
+        info = sf.info(audio_path)
+    except RuntimeError:
+        return None
+    if (info.format not in _MAPPABLE_FORMATS or info.subtype not in _MAPPABLE_SUBTYPES
+            or info.samplerate != sample_rate or info.channels > 2 or info.frames == 0):
+        return None
+    data_offset = _data_chunk_offset(audio_path)
+    if data_offset is None:
+        return None
+    width = _MAPPABLE_SUBTYPES[info.subtype][0]
+    if width == 3:
+        dtype, shape = np.uint8, (info.frames, info.channels, 3)
+    else:
+        dtype = '<f4' if info.subtype == 'FLOAT' else f'<i{width}'
+        shape = (info.frames, info.channels)
+    raw = np.memmap(audio_path, dtype=dtype, mode='r', offset=data_offset, shape=shape)
+    if hasattr(raw, '_mmap') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+        # Windows are read front to back: let the kernel read ahead and drop pages behind
+        raw._mmap.madvise(mmap.MADV_SEQUENTIAL)
+    start = min(int(round((offset or 0) * sample_rate)), info.frames)
+    stop = None if duration is None else start + int(round(duration * sample_rate))
+    return MappedWaveform(raw, info.subtype, start, stop)
+
+
+_adapter = None
+_adapter_lock = threading.Lock()
+
+
+def get_audio_adapter():
+    """Returns the adapter used by `load_audio` (a SoundfileAdapter by default)."""
+    global _adapter
+    with _adapter_lock:
+        if _adapter is None:
+            _adapter = SoundfileAdapter()
+        return _adapter
+
+
+def set_audio_adapter(adapter):
+    """
+    Installs the adapter used by `load_audio` for the whole process.
+
+    Args:
+        adapter (AudioAdapter): The adapter, or None to restore the default.
+    """
+    global _adapter
+    with _adapter_lock:
+        _adapter = adapter
+
+
+def load_audio(audio_path, offset=None, duration=None, sample_rate=44100, mmap=False):
+    """
+    Decodes (a segment of) an audio file into a float32 waveform.
+
+    Only the requested segment is decoded, in-process for WAV, FLAC and AIFF
+    files already at `sample_rate` (see `get_audio_adapter`).
+
+    Args:
+        audio_path (str): Path to the input audio file.
+        offset (float, optional): Start of the segment in seconds.
+        duration (float, optional): Length of the segment in seconds (default: until the end).
+        sample_rate (int): Sample rate to decode to. Default is 44100 Hz.
+        mmap (bool): Return a MappedWaveform for WAV files that allow it, so
+                     the samples are decoded window by window when sliced.
+
+    Returns:
+        numpy.ndarray: Waveform of shape (samples, channels) (or a MappedWaveform).
+    """
+    if mmap:
+        mapped = map_wav(audio_path, offset=offset, duration=duration, sample_rate=sample_rate)
+        if mapped is not None:
+            return mapped
+    return get_audio_adapter().load(audio_path, offset=offset, duration=duration,
+                                    sample_rate=sample_rate)
@@ -0,0 +1,255 @@
+"""
+Batched stem separation for many short inputs.
+
+Spleeter cuts the mix spectrogram into fixed segments of T frames and runs
+the model on them as one batch, each segment independently. Separating a
+folder of one-shots one file at a time therefore pays the per-call
+overhead (and a mostly padded segment) for every file.
+
+Here the spectrograms of many inputs are laid out in a single
+spectrogram instead, each input starting on a segment boundary. Each
+batch of segments is one model invocation, and the results are split
+back per input, so every input gets the same masks as when separated on
+its own.
+
+Packing (pack=True) also lets short inputs share segments (first-fit by
+length, separated by a few silent frames). It trades isolation for speed:
+the model sees a whole segment at once, so the stems of inputs sharing a
+segment are influenced by each other (cross-talk), not only by the silent
+gap between them.
+
+The layout is planned from the file headers, and each batch is decoded
+only when the memory governor admits it. Inputs longer than one batch
+(or whose length the header doesn't give) are separated on their own,
+in chunks if the budget requires it, as `extract_stems` does.
+"""
+
+import math
+import os
+
+import numpy as np
+import soundfile as sf
+
+from ..progress import ProgressTracker
+from ..staging import atomic_path
+from .audio import load_audio
+from .memory import default_governor, estimate_peak_memory
+from .probe import probe_files
+from .spleeter_processor import (
+    _compute_stft, _create_separator, _extract, _masked_spectrograms, _render_sources,
+    _resolve_outputs,
+)
+
+# Silent frames between short inputs that share a segment
+DEFAULT_GAP_FRAMES = 8
+
+# Segments per model invocation (512-frame segments, about 12 s of audio each)
+DEFAULT_MAX_SEGMENTS = 32
+
+# Frames added to each input's planned length, since headers (compressed
+# formats, resampling) can be off by a few samples
+_SLACK_FRAMES = 2
+
+
+def _plan_layout(frame_counts, segment_frames, gap_frames=DEFAULT_GAP_FRAMES, pack=False):
+    """
+    Places inputs in a batch spectrogram.
+
+    Args:
+        frame_counts (list): Number of STFT frames of each input.
+        segment_frames (int): Frames per model segment (Spleeter's T).
+        gap_frames (int): Silent frames between inputs sharing a segment.
+        pack (bool): Whether short inputs may share a segment. If False,
+                     every input starts on a segment boundary.
+
+    Returns:
+        list: Units of work, each a tuple (number of segments,
+              [(input index, frame offset within the unit), ...]).
+    """
+    order = sorted(range(len(frame_counts)), key=lambda i: frame_counts[i], reverse=True)
+    units = []
+    open_units = []  # [unit, frames used] for shared single-segment units
+    for index in order:
+        frames = frame_counts[index]
+        if pack and frames <= segment_frames:
+            # First fit; the longest-first order keeps similar lengths together
+            for entry in open_units:
+                unit, used = entry
+                if used + gap_frames + frames <= segment_frames:
+                    unit[1].append((index, used + gap_frames))
+                    entry[1] = used + gap_frames + frames
+                    break
+            else:
+                unit = (1, [(index, 0)])
+                units.append(unit)
+                open_units.append([unit, frames])
+        else:
+            units.append((max(math.ceil(frames / segment_frames), 1), [(index, 0)]))
+    return units
+
+
+def _batches(units, max_segments=DEFAULT_MAX_SEGMENTS):
+    """Groups consecutive units into batches of at most max_segments segments."""
+    batch, size = [], 0
+    for unit in units:
+        if batch and size + unit[0] > max_segments:
+            yield batch
+            batch, size = [], 0
+        batch.append(unit)
+        size += unit[0]
+    if batch:
+        yield batch
+
+
+def _planned_frames(info, params, sample_rate):
+    """Returns the STFT frames planned for a probed input, or None if its length is unknown."""
+    if info.duration is None:
+        return None
+    samples = int(math.ceil(info.duration * sample_rate))
+    # Spleeter's STFT pads N samples on both sides and doesn't center frames
+    return (samples + params["frame_length"]) // params["frame_step"] + 1 + _SLACK_FRAMES
+
+
+def _separate_batch(separator, audio_paths, output_dir, stems=None, instrumental=False,
+                    gap_frames=DEFAULT_GAP_FRAMES, max_segments=DEFAULT_MAX_SEGMENTS,
+                    pack=False, progress=None, governor=None, stems_dirs=None):
+    """
+    Runs `separate_batch` with an already created separator.
+
+    See `separate_batch` for the meaning of the arguments. `stems_dirs`
+    optionally gives the stem folder of each input, instead of
+    "<output_dir>/<name>_stems".
+    """
+    params = separator._params
+    sample_rate = separator._sample_rate
+    segment_frames = params["T"]
+    stem_number = len(params["instrument_list"])
+    requested = stems
+    stems, needed = _resolve_outputs(params["instrument_list"], stems, instrumental)
+    if governor is None:
+        governor = default_governor()
+
+    def stems_dir(index):
+        if stems_dirs:
+            return stems_dirs[index]
+        filename = os.path.splitext(os.path.basename(audio_paths[index]))[0]
+        return os.path.join(output_dir, f"{filename}_stems")
+
+    # The layout is planned from the file headers; each batch is decoded
+    # only once the governor admits it
+    infos = probe_files(audio_paths)
+    frame_counts = [_planned_frames(info, params, sample_rate) for info in infos]
+    known = [index for index, frames in enumerate(frame_counts) if frames is not None]
+    units = [
+        (num_segments, [(known[member], offset) for member, offset in members])
+        for num_segments, members in _plan_layout([frame_counts[i] for i in known],
+                                                  segment_frames, gap_frames, pack)
+    ]
+    # Inputs longer than a batch (or of unknown length) are separated on their
+    # own, chunked within the memory budget like extract_stems does
+    single = [index for index, frames in enumerate(frame_counts) if frames is None]
+    single += [members[0][0] for num_segments, members in units if num_segments > max_segments]
+    units = [unit for unit in units if unit[0] <= max_segments]
+
+    # Inputs separated on their own report their progress themselves
+    total_seconds = sum(infos[index].duration for index in range(len(infos))
+                        if index not in single)
+    tracker = ProgressTracker(progress, 'separate', total=total_seconds)
+    output_dirs = [None] * len(audio_paths)
+    bins = params["frame_length"] // 2 + 1
+
+    for batch in _batches(units, max_segments):
+        # Lay the inputs of this batch out in one zero-padded spectrogram
+        placements = []
+        offset = 0
+        for num_segments, members in batch:
+            for index, unit_offset in members:
+                placements.append((index, offset + unit_offset))
+            offset += num_segments * segment_frames
+        # The decoded inputs of the batch are at most as long as its layout
+        peak = estimate_peak_memory(offset * params["frame_step"], 2, stem_number)
+        with governor.reserve(peak):
+            packed = np.zeros((offset, bins, 2), dtype=np.complex64)
+            placed = []
+            for index, start in placements:
+                waveform = load_audio(audio_paths[index], sample_rate=sample_rate)
+                stft = _compute_stft(separator, waveform)
+                if stft.shape[0] > frame_counts[index]:
+                    # Longer than its header said: it would overlap its neighbour
+                    single.append(index)
+                    tracker.update(total=tracker.total - infos[index].duration)
+                    continue
+                packed[start:start + stft.shape[0]] = stft
+                placed.append((index, start, stft.shape[0], waveform.shape[0]))
+                del stft, waveform
+
+            masked = _masked_spectrograms(separator, packed, needed)
+            del packed
+
+            for index, start, frames, length in placed:
+                clip_masked = {inst: spec[start:start + frames] for inst, spec in masked.items()}
+                sources = _render_sources(separator, clip_masked, stems, instrumental, length)
+                output_dirs[index] = _write_batch_item(sources, stems_dir(index), sample_rate)
+                tracker.advance(length / sample_rate)
+
+    for index in sorted(single):
+        output_dirs[index] = _extract([separator], [stem_number], audio_paths[index],
+                                      stems_dir(index), stems=requested,
+                                      instrumental=instrumental, progress=progress,
+                                      governor=governor)
+    tracker.finish()
+    return output_dirs
+
+
+def _write_batch_item(sources, stems_dir, sample_rate):
+    """Writes the stems of one input to "<stems_dir>/<stem>.wav"."""
+    os.makedirs(stems_dir, exist_ok=True)
+    for stem, waveform in sources.items():
+        # Written in-process: spawning an encoder per file would dominate for one-shots
+        with atomic_path(os.path.join(stems_dir, f"{stem}.wav")) as tmp_path:
+            sf.write(tmp_path, waveform, sample_rate, subtype='PCM_16')
+    return stems_dir
+
+
+def separate_batch(audio_paths, output_dir, stem_number=2, stems=None, instrumental=False,
+                   gap_frames=DEFAULT_GAP_FRAMES, max_segments=DEFAULT_MAX_SEGMENTS,
+                   pack=False, progress=None, governor=None, stems_dirs=None):
+    """
+    Separates many (short) audio files with as few model invocations as possible.
+
+    Each input's stems are saved in "<output_dir>/<name>_stems" (or in
+    `stems_dirs`) as 16-bit WAV files, written in-process rather than
+    through ffmpeg like the stems of `extract_stems`. Short inputs sharing a
+    segment (pack=True) influence each other's separation; see the module
+    documentation.
+
+    Args:
+        audio_paths (list): Paths to the input audio files.
+        output_dir (str): Directory where the stem folders are created.
+        stem_number (int): Number of stems (2, 4, or 5). Default is 2 stems.
+        stems (list, optional): Only write these stems (default: all).
+        instrumental (bool): Also write "instrumental.wav" (all non-vocal stems summed).
+        gap_frames (int): Silent STFT frames between inputs sharing a segment.
+        max_segments (int): Maximum number of model segments per invocation
+                            (bounds memory use).
+        pack (bool): Let short inputs share a segment, which is faster but lets
+                     them bleed into each other's stems (default: each file is
+                     separated as it would be on its own).
+        progress (callable, optional): Receives progress event dictionaries.
+        governor (MemoryGovernor, optional): Admits each batch against a memory
+                                             budget (default: the process-wide governor).
+        stems_dirs (list, optional): Stem folder of each input, in the order of
+                                     `audio_paths` (default: "<output_dir>/<name>_stems").
+
+    Returns:
+        list: The stem directory of each input, in the order of `audio_paths`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    separator = _create_separator(stem_number)
+    print(f"Processing {len(audio_paths)} files in batches... (this may take a moment)")
+    output_dirs = _separate_batch(separator, list(audio_paths), output_dir, stems=stems,
+                                  instrumental=instrumental, gap_frames=gap_frames,
+                                  max_segments=max_segments, pack=pack, progress=progress,
+                                  governor=governor, stems_dirs=stems_dirs)
+    print(f"✅ Split {len(audio_paths)} files into stems")
+    return output_dirs
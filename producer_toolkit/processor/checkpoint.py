@@ -0,0 +1,151 @@
+"""
+Chunk-level checkpoints for long separations.
+
+A resumable separation runs chunk by chunk (see `_separate_chunked`) and
+records every finished chunk in a checkpoint folder on the output's
+filesystem:
+
+    chunk-<i>-<stem>.wav   the chunk's stems, already converted to PCM
+    context.npy            the masked frames the next chunk's overlap-add needs
+    checkpoint.json        the job signature, the number of finished chunks
+                           and the STFT frame the next chunk starts at
+
+checkpoint.json is rewritten last, after the chunk's files are in place, so
+it only ever counts complete chunks. A restarted job with the same
+signature continues from the recorded frame with the saved context; the
+stems are assembled from the PCM of every chunk, so they are byte-identical
+to those of an uninterrupted run. The chunk size isn't part of the
+signature: a job restarted with another memory budget resumes with chunks
+of its own size.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import soundfile as sf
+
+from ..staging import atomic_path, scratch_root
+
+MANIFEST = "checkpoint.json"
+CONTEXT = "context.npy"
+
+# Chunk length of resumable separations (at most this much work is redone)
+DEFAULT_CHECKPOINT_SECONDS = 300
+
+
+def checkpoint_dir(output_dir, stem_number, scratch_dir=None):
+    """
+    Returns the checkpoint folder of a separation into output_dir.
+
+    The name is derived from the output, so a restarted job finds it again.
+
+    Args:
+        output_dir (str): Directory the stems are written to.
+        stem_number (int): Stem count of the model.
+        scratch_dir (str, optional): Scratch directory (see producer_toolkit.staging).
+
+    Returns:
+        str: Path of the checkpoint folder.
+    """
+    key = f"{os.path.abspath(output_dir)}|{stem_number}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(scratch_root(output_dir, scratch_dir), f".pt-checkpoint-{digest}")
+
+
+class ChunkCheckpoint:
+    """
+    Records the progress of a chunked separation.
+
+    Args:
+        directory (str): Checkpoint folder (see `checkpoint_dir`).
+        signature (dict): Everything the output depends on (input audio, model,
+                          stems). A checkpoint with another signature is discarded.
+    """
+
+    def __init__(self, directory, signature):
+        self.directory = directory
+        self.signature = signature
+
+    def _chunk_path(self, index, name):
+        return os.path.join(self.directory, f"chunk-{index:05d}-{name}.wav")
+
+    def resume(self):
+        """
+        Loads the checkpoint left by an interrupted run of the same job.
+
+        Returns:
+            tuple: (number of finished chunks, STFT frame the next chunk starts
+                   at, masked context frames per instrument or None when
+                   starting from the beginning).
+        """
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                manifest = json.load(f)
+            if manifest["signature"] == self.signature and manifest["completed"] > 0:
+                context = np.load(os.path.join(self.directory, CONTEXT), allow_pickle=False)
+                previous = dict(zip(manifest["instruments"], context))
+                print(f"Resuming from checkpoint: {manifest['completed']} chunk(s) done")
+                return manifest["completed"], manifest["next_frame"], previous
+        except (OSError, ValueError, KeyError):
+            pass
+        # Nothing usable: start over in a clean folder
+        self.discard()
+        os.makedirs(self.directory, exist_ok=True)
+        return 0, 0, None
+
+    def save_chunk(self, index, next_frame, sources, previous, sample_rate):
+        """
+        Stores a finished chunk and marks it complete.
+
+        Args:
+            index (int): Index of the chunk.
+            next_frame (int): STFT frame the next chunk starts at.
+            sources (dict): Waveform of each output for this chunk.
+            previous (dict): Masked frames the next chunk needs, per instrument.
+            sample_rate (int): Sample rate of the waveforms.
+        """
+        for name, waveform in sources.items():
+            with atomic_path(self._chunk_path(index, name)) as tmp_path:
+                sf.write(tmp_path, waveform, sample_rate, subtype='PCM_16')
+        instruments = list(previous)
+        with atomic_path(os.path.join(self.directory, CONTEXT)) as tmp_path:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.stack([previous[inst] for inst in instruments]))
+        with atomic_path(os.path.join(self.directory, MANIFEST)) as tmp_path:
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    "signature": self.signature,
+                    "completed": index + 1,
+                    "next_frame": next_frame,
+                    "instruments": instruments,
+                }, f, indent=2)
+
+    def assemble(self, names, output_dir, num_chunks, sample_rate, channels):
+        """
+        Concatenates the chunks of each output into "<output_dir>/<name>.wav".
+
+        The PCM samples are copied as they are, so the files don't depend on
+        where the job was interrupted.
+
+        Args:
+            names (list): Output names.
+            output_dir (str): Directory the stems are written to.
+            num_chunks (int): Number of chunks.
+            sample_rate (int): Sample rate of the stems.
+            channels (int): Number of channels of the stems.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        for name in names:
+            with atomic_path(os.path.join(output_dir, f"{name}.wav")) as tmp_path:
+                with sf.SoundFile(tmp_path, 'w', sample_rate, channels,
+                                  subtype='PCM_16') as output:
+                    for index in range(num_chunks):
+                        output.write(sf.read(self._chunk_path(index, name), dtype='int16',
+                                                   always_2d=True)[0])
+
+    def discard(self):
+        """Deletes the checkpoint folder."""
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,366 @@
+"""
+Audio fingerprints for detecting duplicate inputs.
+
+The same song often arrives through different links, re-uploads or local
+files. A fingerprint is computed from a downsampled spectrogram of the
+decoded audio: for every frame, 32 bits record whether the energy
+difference between adjacent frequency bands rises or falls over time.
+These bits survive re-encoding, resampling and volume changes, so two
+copies of a track have a low bit error rate (BER) between their
+fingerprints while different tracks sit around 0.5.
+
+A `FingerprintIndex` stores the fingerprints of separated tracks with the
+folder their stems were written to, so `extract_stems` can reuse those
+stems instead of separating the same audio again. Copies rarely decode
+to the same number of samples (encoders add priming and padding, uploads
+add silence), so tracks of about the same duration are compared with a
+time offset, and the stored stems are shifted, trimmed and padded to line
+up with the new input (see `align_offset` and `reuse_stems`).
+"""
+
+import contextlib
+import math
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import soundfile as sf
+
+from ..staging import atomic_path
+
+# Fingerprints are computed on mono audio at this rate
+FINGERPRINT_RATE = 5512
+FRAME_SIZE = 2048
+HOP_SIZE = 256
+# 33 log-spaced bands between these frequencies give 32 difference bits
+MIN_FREQUENCY = 300.0
+MAX_FREQUENCY = 2000.0
+NUM_BANDS = 33
+
+# Bit error rate below which two fingerprints are considered the same audio
+DEFAULT_THRESHOLD = 0.2
+# Largest misalignment searched when comparing (about 5 seconds)
+DEFAULT_MAX_SHIFT = int(5 * FINGERPRINT_RATE / HOP_SIZE)
+# Indexed tracks whose duration differs from the input's by more than this aren't compared
+DEFAULT_DURATION_TOLERANCE = 1.0
+# Length of the excerpt cross-correlated to align reused stems to the sample
+_ALIGN_SECONDS = 4.0
+
+_BLOCK_FRAMES = 1024
+# Input samples decoded at a time when downsampling
+_BLOCK_SAMPLES = 1 << 20
+
+
+def _band_matrix():
+    """Returns the (bins, bands) matrix summing FFT bins into log-spaced bands."""
+    frequencies = np.fft.rfftfreq(FRAME_SIZE, 1.0 / FINGERPRINT_RATE)
+    edges = np.geomspace(MIN_FREQUENCY, MAX_FREQUENCY, NUM_BANDS + 1)
+    band = np.searchsorted(edges, frequencies, side='right') - 1
+    matrix = np.zeros((len(frequencies), NUM_BANDS), dtype=np.float32)
+    valid = (band >= 0) & (band < NUM_BANDS)
+    matrix[np.nonzero(valid)[0], band[valid]] = 1.0
+    return matrix
+
+
+_BANDS = _band_matrix()
+_WINDOW = np.hanning(FRAME_SIZE).astype(np.float32)
+
+
+def _downsample(waveform, sample_rate):
+    """
+    Mixes to mono and resamples to FINGERPRINT_RATE (box filter + interpolation).
+
+    The input is read block by block, each with enough neighbouring samples
+    for the filter and interpolation, so a memory-mapped waveform is never
+    decoded whole; the result is the same as processing it at once.
+    """
+    length = waveform.shape[0]
+    factor = sample_rate / FINGERPRINT_RATE
+    # A moving average is a crude but cheap anti-aliasing filter, enough for fingerprints
+    width = int(round(factor)) if factor > 1 else 1
+    kernel = np.full(width, 1.0 / width, dtype=np.float32)
+    margin = width + 1
+    positions = np.arange(int(length / factor), dtype=np.float64) * factor
+    signal = np.empty(len(positions), dtype=np.float32)
+    for start in range(0, length, _BLOCK_SAMPLES):
+        stop = min(start + _BLOCK_SAMPLES, length)
+        first, last = np.searchsorted(positions, [start, stop])
+        if first == last:
+            continue
+        low, high = max(start - margin, 0), min(stop + margin, length)
+        block = np.asarray(waveform[low:high], dtype=np.float32)
+        mono = block.mean(axis=1) if block.ndim == 2 else block
+        if width > 1:
+            mono = np.convolve(mono, kernel, mode='same')
+        signal[first:last] = np.interp(positions[first:last], np.arange(low, high), mono)
+    return signal
+
+
+def compute_fingerprint(waveform, sample_rate):
+    """
+    Computes the fingerprint of a waveform.
+
+    Args:
+        waveform (numpy.ndarray): Waveform of shape (samples,) or (samples, channels),
+                                  or a memory-mapped waveform (see processor.audio),
+                                  which is decoded block by block.
+        sample_rate (int): Sample rate of the waveform.
+
+    Returns:
+        numpy.ndarray: One uint32 sub-fingerprint per frame (about 21 per second).
+    """
+    signal = _downsample(waveform, sample_rate)
+    if len(signal) < FRAME_SIZE + HOP_SIZE:
+        return np.zeros(0, dtype=np.uint32)
+    frames = np.lib.stride_tricks.sliding_window_view(signal, FRAME_SIZE)[::HOP_SIZE]
+
+    energies = np.empty((len(frames), NUM_BANDS), dtype=np.float32)
+    for start in range(0, len(frames), _BLOCK_FRAMES):
+        block = frames[start:start + _BLOCK_FRAMES] * _WINDOW
+        power = np.abs(np.fft.rfft(block, axis=1)) ** 2
+        energies[start:start + _BLOCK_FRAMES] = power.astype(np.float32) @ _BANDS
+
+    band_diff = energies[:, :-1] - energies[:, 1:]
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    packed = np.packbits(bits, axis=1, bitorder='little')
+    return packed.view('<u4').ravel().astype(np.uint32)
+
+
+def bit_error_rate(a, b, max_shift=DEFAULT_MAX_SHIFT, min_overlap=0.5):
+    """
+    Compares two fingerprints, allowing for a time offset between them.
+
+    Args:
+        a (numpy.ndarray): First fingerprint.
+        b (numpy.ndarray): Second fingerprint.
+        max_shift (int): Largest offset (in frames) to search.
+        min_overlap (float): Minimum overlap, as a fraction of the shorter fingerprint.
+
+    Returns:
+        tuple: The lowest bit error rate found (0 = identical, ~0.5 = unrelated),
+               and the offset in frames where it was found (positive when the
+               audio of `a` starts later than that of `b`).
+    """
+    shortest = min(len(a), len(b))
+    if shortest == 0:
+        return 1.0, 0
+    needed = max(int(shortest * min_overlap), 1)
+    best, best_shift = 1.0, 0
+    # Smallest offsets first, so ties keep the closest alignment
+    for shift in sorted(range(-max_shift, max_shift + 1), key=abs):
+        a_start, b_start = max(shift, 0), max(-shift, 0)
+        length = min(len(a) - a_start, len(b) - b_start)
+        if length < needed:
+            continue
+        diff = a[a_start:a_start + length] ^ b[b_start:b_start + length]
+        errors = np.unpackbits(diff.view(np.uint8)).sum()
+        if errors / (32.0 * length) < best:
+            best, best_shift = errors / (32.0 * length), shift
+    return best, best_shift
+
+
+def _mono(block):
+    return block.mean(axis=1) if block.ndim == 2 else block
+
+
+def align_offset(waveform, sample_rate, stem_paths, offset):
+    """
+    Refines the offset of a fingerprint match to the sample.
+
+    Fingerprint offsets are only accurate to a frame (about 46 ms). An
+    excerpt of the input is cross-correlated with the sum of the stored
+    stems, which follows the mix they were separated from, within two
+    frames either side of the fingerprint's offset.
+
+    Args:
+        waveform (numpy.ndarray): Input of shape (samples, channels), or a
+                                  memory-mapped waveform (see processor.audio).
+        sample_rate (int): Sample rate of the input and of the stems.
+        stem_paths (list): Stored stem files.
+        offset (int): Offset from the fingerprints in samples: input sample n
+                      matches stored sample n - offset.
+
+    Returns:
+        int: The refined offset in samples.
+    """
+    from scipy.signal import correlate
+
+    search = 2 * int(math.ceil(HOP_SIZE * sample_rate / FINGERPRINT_RATE))
+    length = min(int(_ALIGN_SECONDS * sample_rate), waveform.shape[0])
+    start = (waveform.shape[0] - length) // 2
+    excerpt = _mono(np.asarray(waveform[start:start + length], dtype=np.float32))
+    # Stored samples [first, first + len(reference)) cover every candidate offset
+    first = start - offset - search
+    reference = np.zeros(length + 2 * search, dtype=np.float32)
+    for path in stem_paths:
+        with sf.SoundFile(path) as stem:
+            low, high = max(first, 0), min(first + len(reference), stem.frames)
+            if high <= low:
+                continue
+            stem.seek(low)
+            data = stem.read(high - low, dtype='float32', always_2d=True)
+        reference[low - first:high - first] += _mono(data)
+    if not reference.any() or not excerpt.any():
+        return offset
+    scores = correlate(reference, excerpt, mode='valid', method='fft')
+    return offset + search - int(np.argmax(scores))
+
+
+def default_index_path():
+    """Returns the default index location (under $XDG_CACHE_HOME or ~/.cache)."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'producer-toolkit', 'fingerprints.sqlite')
+
+
+class FingerprintIndex:
+    """
+    Local index of separated tracks, keyed by audio fingerprint.
+
+    Args:
+        path (str, optional): SQLite database file (default: see `default_index_path`).
+        threshold (float): Maximum bit error rate for two inputs to match.
+    """
+
+    def __init__(self, path=None, threshold=DEFAULT_THRESHOLD):
+        self.path = path or default_index_path()
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS stems ("
+                " id INTEGER PRIMARY KEY,"
+                " duration REAL NOT NULL,"
+                " stem_number INTEGER NOT NULL,"
+                " stems_dir TEXT NOT NULL,"
+                " fingerprint BLOB NOT NULL,"
+                " created REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS stems_lookup ON stems (stem_number, duration)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:  # Commits on success, rolls back on error
+                yield db
+        finally:
+            db.close()
+
+    def lookup(self, fingerprint, duration, stem_number, files,
+               tolerance=DEFAULT_DURATION_TOLERANCE):
+        """
+        Finds previously separated stems for near-identical audio.
+
+        Entries whose duration is within `tolerance` of the input's are
+        compared, closest duration first, allowing for a time offset
+        between the two copies.
+
+        Args:
+            fingerprint (numpy.ndarray): Fingerprint of the input.
+            duration (float): Duration of the input in seconds.
+            stem_number (int): Stem count of the model.
+            files (list): Stem files that must exist in the stored folder.
+            tolerance (float): Largest duration difference in seconds.
+
+        Returns:
+            tuple: (folder containing the stems, offset in seconds of the input's
+                   audio relative to the stored one), or None if there is no match.
+        """
+        with self._lock, self._connect() as db:
+            rows = db.execute(
+                "SELECT id, stems_dir, fingerprint FROM stems"
+                " WHERE stem_number = ? AND duration BETWEEN ? AND ?"
+                " ORDER BY ABS(duration - ?), created DESC",
+                (stem_number, duration - tolerance, duration + tolerance, duration),
+            ).fetchall()
+            for row_id, stems_dir, blob in rows:
+                if not all(os.path.isfile(os.path.join(stems_dir, f)) for f in files):
+                    if not os.path.isdir(stems_dir):
+                        # The stems were moved or deleted; forget them
+                        db.execute("DELETE FROM stems WHERE id = ?", (row_id,))
+                    continue
+                stored = np.frombuffer(blob, dtype='<u4')
+                error_rate, shift = bit_error_rate(fingerprint, stored)
+                if error_rate <= self.threshold:
+                    return stems_dir, shift * HOP_SIZE / FINGERPRINT_RATE
+        return None
+
+    def add(self, fingerprint, duration, stem_number, stems_dir):
+        """
+        Records the stems folder of a separated input.
+
+        Args:
+            fingerprint (numpy.ndarray): Fingerprint of the input.
+            duration (float): Duration of the input in seconds.
+            stem_number (int): Stem count of the model.
+            stems_dir (str): Folder the stems were written to.
+        """
+        if len(fingerprint) == 0:
+            return
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT INTO stems (duration, stem_number, stems_dir, fingerprint, created)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (duration, stem_number, os.path.abspath(stems_dir),
+                 np.asarray(fingerprint, dtype='<u4').tobytes(), time.time()),
+            )
+
+
+def _shift_stem(src_path, dst_path, offset, length):
+    """Writes a stem delayed by `offset` samples (advanced if negative) and cut or padded to `length`."""
+    with sf.SoundFile(src_path) as src:
+        with atomic_path(dst_path) as tmp_path:
+            with sf.SoundFile(tmp_path, 'w', src.samplerate, src.channels, src.subtype,
+                              format=src.format) as dst:
+                silence = np.zeros((min(max(offset, 0), length), src.channels), np.float32)
+                dst.write(silence)
+                src.seek(min(max(-offset, 0), src.frames))
+                remaining = length - len(silence)
+                while remaining > 0:
+                    block = src.read(min(_BLOCK_SAMPLES, remaining), dtype='float32',
+                                     always_2d=True)
+                    if not len(block):
+                        break
+                    dst.write(block)
+                    remaining -= len(block)
+                dst.write(np.zeros((remaining, src.channels), np.float32))
+
+
+def reuse_stems(source_dir, files, output_dir, offset=0, length=None):
+    """
+    Places previously separated stems in output_dir, lined up with a new input.
+
+    Stems of an aligned input of the same length are hard-linked (or copied);
+    otherwise they are shifted by `offset` and trimmed or padded with silence
+    to the input's length.
+
+    Args:
+        source_dir (str): Folder containing the existing stems.
+        files (list): Stem file names to reuse.
+        output_dir (str): Destination folder.
+        offset (int): Offset in samples: input sample n matches stored sample n - offset.
+        length (int, optional): Length of the new input in samples (default: the stored length).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for name in files:
+        src_path = os.path.join(source_dir, name)
+        dst_path = os.path.join(output_dir, name)
+        stored = sf.info(src_path).frames
+        target = stored if length is None else length
+        if offset or target != stored:
+            _shift_stem(src_path, dst_path, offset, target)
+            print(f"✓ Reused {name} (aligned)")
+            continue
+        if os.path.abspath(src_path) == os.path.abspath(dst_path):
+            continue
+        if os.path.exists(dst_path):
+            os.remove(dst_path)
+        try:
+            os.link(src_path, dst_path)
+        except OSError:
+            shutil.copy2(src_path, dst_path)
+        print(f"✓ Reused {name}")
@@ -0,0 +1,278 @@
+"""
+Export of separation masks and re-rendering of stems from them.
+
+Spleeter estimates a soft mask per instrument and multiplies it with the
+mix STFT. With `save_masks=True`, `extract_stems` stores these masks as
+float16 .npy files (memory-mappable) in a "masks" folder next to the stems,
+with a manifest describing the source audio and STFT parameters.
+
+`render_from_masks` then regenerates stems, instrumental or custom mixes
+(e.g. "drums+bass"), at another sample rate or in another format, with just
+an STFT of the source and an inverse STFT per output: no model pass.
+"""
+
+import contextlib
+import json
+import os
+import shutil
+
+import numpy as np
+import soundfile as sf
+
+from ..staging import atomic_path, commit_file
+from .audio import load_audio
+from .resample import resample
+
+MANIFEST = "manifest.json"
+MASK_DTYPE = np.float16
+MASKS_DIR = "masks"
+
+# Subtypes written for each sample format (see processor.pcm)
+_SUBTYPES = {'s16le': 'PCM_16', 's24le': 'PCM_24', 'f32le': 'FLOAT'}
+_FORMATS = ('wav', 'flac', 'ogg')
+
+
+def _window(frame_length):
+    # Periodic Hann window, as used by Spleeter
+    return np.hanning(frame_length + 1)[:-1]
+
+
+def compute_stft(waveform, frame_length, frame_step):
+    """
+    Computes the STFT of a waveform exactly as Spleeter's librosa backend does.
+
+    Args:
+        waveform (numpy.ndarray): Waveform of shape (samples, channels).
+        frame_length (int): FFT size in samples.
+        frame_step (int): Hop between frames in samples.
+
+    Returns:
+        numpy.ndarray: Complex STFT of shape (frames, bins, channels).
+    """
+    import librosa
+
+    padding = np.zeros((frame_length, waveform.shape[1]), dtype=waveform.dtype)
+    padded = np.concatenate([padding, waveform, padding])
+    return np.stack([
+        librosa.stft(np.asfortranarray(padded[:, c]), n_fft=frame_length,
+                     hop_length=frame_step, window=_window(frame_length), center=False).T
+        for c in range(padded.shape[1])
+    ], axis=-1)
+
+
+def inverse_stft(stft, frame_length, frame_step, length):
+    """
+    Inverts an STFT computed by `compute_stft`.
+
+    Args:
+        stft (numpy.ndarray): Complex STFT of shape (frames, bins, channels).
+        frame_length (int): FFT size in samples.
+        frame_step (int): Hop between frames in samples.
+        length (int): Number of samples of the output.
+
+    Returns:
+        numpy.ndarray: Waveform of shape (length, channels).
+    """
+    import librosa
+
+    return np.stack([
+        librosa.istft(stft[:, :, c].T, hop_length=frame_step, window=_window(frame_length),
+                      center=False, length=length + 2 * frame_length)[frame_length:frame_length + length]
+        for c in range(stft.shape[-1])
+    ], axis=-1)
+
+
+def compute_masks(stft, masked):
+    """
+    Recovers the soft masks from the mix STFT and the masked STFTs.
+
+    Args:
+        stft (numpy.ndarray): Mix STFT.
+        masked (dict): Masked STFT per instrument.
+
+    Returns:
+        dict: Mask per instrument, in [0, 1], with the shape of `stft`.
+    """
+    magnitude = np.abs(stft)
+    silent = magnitude == 0
+    magnitude[silent] = 1
+    return {
+        inst: np.clip(np.abs(spec) / magnitude, 0, 1) * ~silent
+        for inst, spec in masked.items()
+    }
+
+
+class MaskWriter:
+    """Writes masks frame range by frame range into memory-mapped .npy files."""
+
+    def __init__(self, arrays):
+        self._arrays = arrays
+
+    def write(self, first_frame, stft, masked):
+        """
+        Stores the masks of frames [first_frame, first_frame + len(stft)).
+
+        Args:
+            first_frame (int): Index of the first frame.
+            stft (numpy.ndarray): Mix STFT of these frames.
+            masked (dict): Masked STFT per instrument for these frames.
+        """
+        for inst, mask in compute_masks(stft, masked).items():
+            self._arrays[inst][first_frame:first_frame + len(mask)] = mask
+
+
+@contextlib.contextmanager
+def mask_writer(masks_dir, manifest, num_frames, num_bins, channels=2):
+    """
+    Creates the mask files of a separation and commits them on success.
+
+    The manifest is written last, so a masks folder with a manifest is complete.
+
+    Args:
+        masks_dir (str): Folder the masks are written to.
+        manifest (dict): Description of the separation (see `extract_stems`).
+        num_frames (int): Number of STFT frames.
+        num_bins (int): Number of frequency bins.
+        channels (int): Number of channels.
+
+    Yields:
+        MaskWriter: Writer for the masks of manifest["instruments"].
+    """
+    os.makedirs(masks_dir, exist_ok=True)
+    arrays = {}
+    with contextlib.ExitStack() as files:
+        for inst in manifest["instruments"]:
+            tmp_path = files.enter_context(atomic_path(os.path.join(masks_dir, f"{inst}.npy")))
+            arrays[inst] = np.lib.format.open_memmap(
+                tmp_path, mode='w+', dtype=MASK_DTYPE, shape=(num_frames, num_bins, channels)
+            )
+        yield MaskWriter(arrays)
+        for array in arrays.values():
+            array.flush()
+        # Release the mappings before the files are renamed into place
+        arrays.clear()
+    _write_manifest(masks_dir, dict(manifest, dtype=np.dtype(MASK_DTYPE).name))
+
+
+def load_manifest(masks_dir):
+    """Reads the manifest of a masks folder."""
+    path = os.path.join(masks_dir, MANIFEST)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"No masks found in {masks_dir} (missing {MANIFEST})")
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(masks_dir, manifest):
+    with atomic_path(os.path.join(masks_dir, MANIFEST)) as tmp_path:
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+
+def attach_source(masks_dir, audio_path, copy=False):
+    """
+    Stores the source audio in a masks folder, for sources that are temporary.
+
+    Args:
+        masks_dir (str): Masks folder written by `extract_stems(save_masks=True)`.
+        audio_path (str): The separated audio file.
+        copy (bool): Copy the file instead of moving it.
+    """
+    manifest = load_manifest(masks_dir)
+    name = "source" + os.path.splitext(audio_path)[1]
+    if copy:
+        with atomic_path(os.path.join(masks_dir, name)) as tmp_path:
+            shutil.copyfile(audio_path, tmp_path)
+    else:
+        commit_file(audio_path, os.path.join(masks_dir, name))
+    # Relative paths are resolved against the masks folder
+    manifest["audio_path"] = name
+    _write_manifest(masks_dir, manifest)
+
+
+def _output_mask(masks, name, instruments):
+    """Returns the mask of an output: a stem, "instrumental" or a sum such as "drums+bass"."""
+    if name == "instrumental":
+        parts = [inst for inst in instruments if inst != "vocals"]
+    else:
+        parts = name.split('+')
+    unknown = [part for part in parts if part not in masks]
+    if unknown:
+        raise ValueError(
+            f"Unknown stem(s) {', '.join(unknown)}; "
+            f"the masks cover: {', '.join(instruments)}"
+        )
+    mask = np.zeros(masks[parts[0]].shape, dtype=np.float32)
+    for part in parts:
+        mask += masks[part]
+    return mask
+
+
+def render_from_masks(masks_dir, output_dir=None, stems=None, sample_rate=None,
+                      file_format='wav', sample_format='s16le', audio_path=None):
+    """
+    Regenerates stems from saved masks without running the model.
+
+    Args:
+        masks_dir (str): Masks folder written by `extract_stems(save_masks=True)`.
+        output_dir (str, optional): Where to write the stems (default: the
+                                    folder containing masks_dir).
+        stems (list, optional): Outputs to render: stem names, "instrumental", or
+                                sums of stems such as "drums+bass" (default:
+                                every stem of the model).
+        sample_rate (int, optional): Sample rate of the outputs (default: the
+                                     separation's, 44100 Hz).
+        file_format (str): "wav", "flac" or "ogg".
+        sample_format (str): "s16le", "s24le" or "f32le" (ignored for ogg).
+        audio_path (str, optional): Source audio, if it moved since the separation.
+
+    Returns:
+        list: Paths of the rendered files.
+    """
+    if file_format not in _FORMATS:
+        raise ValueError(f"Unsupported format: {file_format} (use {', '.join(_FORMATS)})")
+    if sample_format not in _SUBTYPES:
+        raise ValueError(f"Unsupported sample format: {sample_format}")
+    subtype = 'VORBIS' if file_format == 'ogg' else _SUBTYPES[sample_format]
+    if not sf.check_format(file_format.upper(), subtype):
+        raise ValueError(f"{file_format} files can't store {sample_format} samples")
+
+    manifest = load_manifest(masks_dir)
+    if output_dir is None:
+        output_dir = os.path.dirname(os.path.abspath(masks_dir))
+    instruments = manifest["instruments"]
+    stems = list(stems or instruments)
+    source_rate = manifest["sample_rate"]
+    frame_length, frame_step = manifest["frame_length"], manifest["frame_step"]
+    length = manifest["length"]
+
+    if audio_path is None:
+        audio_path = os.path.join(masks_dir, manifest["audio_path"])
+    waveform = load_audio(audio_path, offset=manifest.get("offset"),
+                          duration=manifest.get("duration"), sample_rate=source_rate)
+    if waveform.shape[0] != length:
+        raise ValueError(
+            f"Source audio has {waveform.shape[0]} samples, the masks expect {length}; "
+            "was it modified since the separation?"
+        )
+    if waveform.shape[1] == 1:
+        waveform = np.repeat(waveform, 2, axis=1)
+    stft = compute_stft(waveform[:, :2], frame_length, frame_step)
+
+    masks = {
+        inst: np.load(os.path.join(masks_dir, f"{inst}.npy"), mmap_mode='r')
+        for inst in instruments
+    }
+    target_rate = sample_rate or source_rate
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for name in stems:
+        source = inverse_stft(stft * _output_mask(masks, name, instruments),
+                              frame_length, frame_step, length)
+        source = resample(source, source_rate, target_rate)
+        path = os.path.join(output_dir, f"{name}.{file_format}")
+        with atomic_path(path) as tmp_path:
+            sf.write(tmp_path, source, target_rate, subtype=subtype, format=file_format.upper())
+        print(f"✓ Rendered {os.path.basename(path)}")
+        paths.append(path)
+    return paths
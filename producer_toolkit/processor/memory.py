@@ -0,0 +1,219 @@
+"""
+Memory budgeting for separation jobs.
+
+Spleeter runs the whole spectrogram through the model at once, so the peak
+memory of a job grows linearly with the length of the input and the number
+of stems: a long mix with the 5-stem model can need tens of gigabytes.
+
+`estimate_peak_memory` predicts the peak of a job from its length, channel
+count and stem count. A `MemoryGovernor` admits jobs against a RAM budget
+(jobs wait in order until enough of the budget is free), and
+`extract_stems` switches to chunked processing when a single job would
+exceed the budget on its own.
+
+The budget defaults to 70% of the host's memory (or of the container's
+cgroup limit), and can be set with the PT_MEMORY_BUDGET environment
+variable, e.g. "8G".
+"""
+
+import collections
+import contextlib
+import os
+import re
+import threading
+
+MEMORY_BUDGET_ENV = "PT_MEMORY_BUDGET"
+
+# Share of the total memory used as the default budget
+DEFAULT_BUDGET_FRACTION = 0.7
+# Budget used when the total memory cannot be determined
+FALLBACK_BUDGET = 4 * 1024 ** 3
+
+# TensorFlow runtime and graph, independent of the input length
+BASE_BYTES = 512 * 1024 ** 2
+# Weights of one instrument's U-Net
+MODEL_BYTES_PER_STEM = 32 * 1024 ** 2
+# Per sample frame of audio: the stereo mix STFT (2 channels x 2049 complex64
+# bins every 1024 samples)
+STFT_BYTES_PER_SAMPLE = 32
+# Per sample frame and instrument: the U-Net activations (kept for the skip
+# connections), the masked STFT and the output waveform
+STEM_BYTES_PER_SAMPLE = 160 + 32 + 8
+
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+def parse_size(value):
+    """
+    Parses a memory size such as "512M", "8G" or "1.5g" (plain numbers are bytes).
+
+    Args:
+        value (str): The size.
+
+    Returns:
+        int: The size in bytes.
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*', str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid memory size: {value!r} (use e.g. 512M or 8G)")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+
+def _cgroup_limit():
+    """Returns the memory limit of the current cgroup, or None."""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # "max" (v2) or a huge number (v1) mean there is no limit
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    return None
+
+
+def total_memory():
+    """
+    Returns the memory available to this process in bytes.
+
+    Returns:
+        int: The smaller of the physical memory and the cgroup limit, or None
+             if neither can be determined.
+    """
+    try:
+        physical = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        physical = None
+    limits = [limit for limit in (physical, _cgroup_limit()) if limit]
+    return min(limits) if limits else None
+
+
+def default_budget():
+    """Returns the budget from PT_MEMORY_BUDGET, else a share of the total memory."""
+    if os.environ.get(MEMORY_BUDGET_ENV):
+        return parse_size(os.environ[MEMORY_BUDGET_ENV])
+    total = total_memory()
+    if total is None:
+        return FALLBACK_BUDGET
+    return int(total * DEFAULT_BUDGET_FRACTION)
+
+
+def estimate_peak_memory(num_samples, channels=2, stem_number=2, chunk_samples=None,
+                         mapped=False):
+    """
+    Estimates the peak memory of separating an input.
+
+    Args:
+        num_samples (int): Length of the input in sample frames.
+        channels (int): Number of channels of the decoded input.
+        stem_number (int): Stem count of the model.
+        chunk_samples (int, optional): Length of the chunks the input is processed
+                                       in (default: the whole input at once).
+        mapped (bool): Whether the input is memory-mapped (see
+                       processor.audio.MappedWaveform), so only the current
+                       chunk is decoded in memory.
+
+    Returns:
+        int: The estimated peak in bytes.
+    """
+    if chunk_samples is None:
+        chunk_samples = num_samples
+    chunk_samples = min(chunk_samples, num_samples)
+    # The decoded input is kept whole unless mapped; everything else scales with the chunk
+    input_samples = chunk_samples if mapped else num_samples
+    return (
+        BASE_BYTES + stem_number * MODEL_BYTES_PER_STEM
+        + input_samples * channels * 4
+        + chunk_samples * (STFT_BYTES_PER_SAMPLE + stem_number * STEM_BYTES_PER_SAMPLE)
+    )
+
+
+def max_chunk_samples(budget, num_samples, channels=2, stem_number=2, mapped=False):
+    """
+    Returns the longest chunk whose estimated peak fits in the budget.
+
+    Args:
+        budget (int): Memory budget in bytes.
+        num_samples (int): Length of the input in sample frames.
+        channels (int): Number of channels of the decoded input.
+        stem_number (int): Stem count of the model.
+        mapped (bool): Whether the input is memory-mapped.
+
+    Returns:
+        int: Chunk length in sample frames (0 if not even the fixed costs fit).
+    """
+    fixed = estimate_peak_memory(num_samples, channels, stem_number, chunk_samples=0,
+                                 mapped=mapped)
+    per_sample = STFT_BYTES_PER_SAMPLE + stem_number * STEM_BYTES_PER_SAMPLE
+    if mapped:
+        per_sample += channels * 4
+    return max((budget - fixed) // per_sample, 0)
+
+
+class MemoryGovernor:
+    """
+    Admits jobs against a memory budget.
+
+    Jobs reserve their estimated peak before running and wait, first come
+    first served, until it fits next to the jobs already running. A job
+    larger than the whole budget runs once nothing else does.
+
+    Args:
+        budget (int or str, optional): Budget in bytes, or a size such as "8G"
+                                       (default: see `default_budget`).
+    """
+
+    def __init__(self, budget=None):
+        if isinstance(budget, str):
+            budget = parse_size(budget)
+        self.budget = budget or default_budget()
+        self._in_use = 0
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+
+    @property
+    def in_use(self):
+        """Bytes currently reserved by running jobs."""
+        return self._in_use
+
+    @contextlib.contextmanager
+    def reserve(self, nbytes):
+        """
+        Blocks until nbytes fit in the budget, and holds them until the block exits.
+
+        Args:
+            nbytes (int): Estimated peak memory of the job.
+        """
+        nbytes = min(nbytes, self.budget)
+        ticket = object()
+        with self._condition:
+            self._queue.append(ticket)
+            try:
+                self._condition.wait_for(
+                    lambda: self._queue[0] is ticket and self._in_use + nbytes <= self.budget
+                )
+            finally:
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+            self._in_use += nbytes
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_use -= nbytes
+                self._condition.notify_all()
+
+
+# Jobs of the module-level functions share one governor per process
+_default_governor = None
+_default_governor_lock = threading.Lock()
+
+
+def default_governor():
+    """Returns the process-wide governor (created on first use)."""
+    global _default_governor
+    with _default_governor_lock:
+        if _default_governor is None:
+            _default_governor = MemoryGovernor()
+        return _default_governor
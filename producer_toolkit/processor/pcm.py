@@ -0,0 +1,142 @@
+"""
+Raw PCM / WAV stream writing.
+
+Used to send audio to stdout (or any binary stream) so `pt` can be chained
+into ffmpeg, sox and other tools without temporary files.
+"""
+
+import struct
+
+import numpy as np
+
+# Sample formats use ffmpeg's names: (bytes per sample, WAV format tag)
+SAMPLE_FORMATS = {
+    's16le': (2, 1),
+    's24le': (3, 1),
+    'f32le': (4, 3),
+}
+
+# Full scale of the integer formats. The same factor is used both ways (like
+# ffmpeg), so converting PCM to float and back gives the same bytes
+_SCALES = {
+    's16le': 1 << 15,
+    's24le': 1 << 23,
+}
+
+# Data size written in the header when the stream length is unknown
+_UNKNOWN_SIZE = 0xFFFFFFFF
+
+
+def wav_header(sample_rate, channels, sample_format='s16le', num_frames=None):
+    """
+    Builds a WAV header for the given format.
+
+    Args:
+        sample_rate (int): Sample rate in Hz.
+        channels (int): Number of channels.
+        sample_format (str): One of "s16le", "s24le" or "f32le".
+        num_frames (int, optional): Number of frames that will follow. When
+                                    unknown, the sizes are set to the maximum
+                                    value, which streaming readers accept.
+
+    Returns:
+        bytes: The 44-byte RIFF/WAVE header.
+    """
+    sample_width, format_tag = SAMPLE_FORMATS[sample_format]
+    block_align = channels * sample_width
+    if num_frames is None:
+        data_size = riff_size = _UNKNOWN_SIZE
+    else:
+        data_size = num_frames * block_align
+        riff_size = min(36 + data_size, _UNKNOWN_SIZE)
+    return (
+        b'RIFF' + struct.pack('<I', riff_size) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, format_tag, channels, sample_rate,
+                                sample_rate * block_align, block_align, sample_width * 8)
+        + b'data' + struct.pack('<I', min(data_size, _UNKNOWN_SIZE))
+    )
+
+
+def to_pcm_bytes(waveform, sample_format='s16le'):
+    """
+    Converts a float waveform to interleaved little-endian PCM bytes.
+
+    Integer samples are rounded and clipped to the format's range, so 1.0
+    gives the largest positive value.
+
+    Args:
+        waveform (numpy.ndarray): Samples in [-1, 1] of shape (frames, channels).
+        sample_format (str): One of "s16le", "s24le" or "f32le".
+
+    Returns:
+        bytes: Interleaved PCM data.
+    """
+    if sample_format == 'f32le':
+        return np.ascontiguousarray(waveform, dtype='<f4').tobytes()
+    if sample_format not in _SCALES:
+        raise ValueError(f"Unsupported sample format: {sample_format}")
+    scale = _SCALES[sample_format]
+    ints = np.clip(np.rint(np.asarray(waveform, dtype=np.float64) * scale), -scale, scale - 1)
+    if sample_format == 's16le':
+        return ints.astype('<i2').tobytes()
+    # Keep the three low bytes of each little-endian 32-bit sample
+    return ints.astype('<i4').view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+
+
+def from_pcm_bytes(data, channels, sample_format='s16le'):
+    """
+    Converts interleaved little-endian PCM bytes to a float waveform.
+
+    Args:
+        data (bytes): Interleaved PCM data (a whole number of frames).
+        channels (int): Number of channels.
+        sample_format (str): One of "s16le", "s24le" or "f32le".
+
+    Returns:
+        numpy.ndarray: float32 samples of shape (frames, channels).
+    """
+    if sample_format == 'f32le':
+        samples = np.frombuffer(data, dtype='<f4')
+    elif sample_format == 's16le':
+        samples = np.frombuffer(data, dtype='<i2').astype(np.float32) / _SCALES['s16le']
+    elif sample_format == 's24le':
+        # Place the three bytes in the upper part of a 32-bit sample to keep the sign
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        ints = np.zeros((len(raw), 4), dtype=np.uint8)
+        ints[:, 1:] = raw
+        samples = (ints.view('<i4').ravel() >> 8).astype(np.float32) / _SCALES['s24le']
+    else:
+        raise ValueError(f"Unsupported sample format: {sample_format}")
+    return samples.astype(np.float32, copy=False).reshape(-1, channels)
+
+
+class PCMWriter:
+    """
+    Writes audio blocks to a binary stream as raw PCM or WAV.
+
+    Args:
+        stream (file): Binary stream to write to (e.g. sys.stdout.buffer).
+        sample_rate (int): Sample rate in Hz.
+        channels (int): Number of channels.
+        sample_format (str): One of "s16le", "s24le" or "f32le".
+        container (str): "wav" to start with a WAV header, or "raw" for bare PCM.
+        num_frames (int, optional): Total frames, if known, for an exact WAV header.
+    """
+
+    def __init__(self, stream, sample_rate, channels, sample_format='s16le',
+                 container='wav', num_frames=None):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unsupported sample format: {sample_format}")
+        self.stream = stream
+        self.sample_format = sample_format
+        if container == 'wav':
+            self.stream.write(wav_header(sample_rate, channels, sample_format, num_frames))
+        elif container != 'raw':
+            raise ValueError(f"Unsupported container: {container}")
+
+    def write(self, block):
+        """Writes a block of shape (frames, channels)."""
+        self.stream.write(to_pcm_bytes(block, self.sample_format))
+
+    def flush(self):
+        self.stream.flush()
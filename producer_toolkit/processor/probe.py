@@ -0,0 +1,310 @@
+"""
+Cached media probing for work planning.
+
+Duration, sample rate and channel count decide how a job is run (whole or
+in chunks, with or without resampling) and how long it will take, but
+until now they were only known after decoding. `probe_file` reads them
+from the file header instead: libsndfile for the formats it handles, with
+ffprobe as the fallback. Results are cached in a small SQLite database,
+keyed by path, size and modification time, so probing a library of
+thousands of files again takes a stat per file. Links are probed through
+the yt-dlp metadata cache (see producer_toolkit.downloader.metadata).
+
+`plan_separation` turns a probe into the decisions `extract_stems` would
+make: peak memory, chunk length and whether the input gets resampled.
+"""
+
+import contextlib
+import os
+import sqlite3
+import threading
+
+import soundfile as sf
+
+from .memory import default_governor, estimate_peak_memory, max_chunk_samples
+
+# Spleeter models work at this rate; other inputs are resampled while decoding
+MODEL_SAMPLE_RATE = 44100
+# Spleeter's segment length in samples (T=512 frames of 1024 samples)
+_SEGMENT_SAMPLES = 512 * 1024
+# Containers (as probed by libsndfile) that extract_stems memory-maps
+_MAPPED_CODECS = {'wav', 'wavex', 'rf64'}
+
+
+class MediaInfo:
+    """
+    Audio properties of a file or link.
+
+    Args:
+        duration (float): Length in seconds (None if unknown).
+        sample_rate (int): Sample rate in Hz (None if unknown).
+        channels (int): Number of audio channels (None if unknown).
+        codec (str, optional): Codec or container format name.
+    """
+
+    def __init__(self, duration, sample_rate, channels, codec=None):
+        self.duration = duration
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.codec = codec
+
+    def to_dict(self):
+        return {
+            "duration": self.duration,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "codec": self.codec,
+        }
+
+    def __repr__(self):
+        return (f"MediaInfo(duration={self.duration}, sample_rate={self.sample_rate}, "
+                f"channels={self.channels}, codec={self.codec!r})")
+
+
+def default_probe_path():
+    """Returns the default probe cache location (under $XDG_CACHE_HOME or ~/.cache)."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'producer-toolkit', 'probes.sqlite')
+
+
+class ProbeCache:
+    """
+    Cache of file probes, keyed by absolute path, size and modification time.
+
+    Entries are kept in memory for the process and persisted to SQLite; if
+    the database can't be opened, the cache is memory-only, and if a read or
+    write fails (e.g. another process holds the lock), files are probed again
+    rather than failing the job.
+
+    Args:
+        path (str, optional): SQLite database file (default: see `default_probe_path`).
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_probe_path()
+        self._lock = threading.Lock()
+        self._memory = {}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with self._connect() as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS probes ("
+                    " path TEXT PRIMARY KEY,"
+                    " size INTEGER NOT NULL,"
+                    " mtime_ns INTEGER NOT NULL,"
+                    " duration REAL,"
+                    " sample_rate INTEGER,"
+                    " channels INTEGER,"
+                    " codec TEXT)"
+                )
+        except (OSError, sqlite3.Error):
+            self.path = None
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:  # Commits on success, rolls back on error
+                yield db
+        finally:
+            db.close()
+
+    def get_many(self, keys):
+        """
+        Looks up probes.
+
+        Args:
+            keys (list): (absolute path, size, mtime_ns) tuples.
+
+        Returns:
+            dict: MediaInfo of each key found.
+        """
+        found = {key: self._memory[key] for key in keys if key in self._memory}
+        missing = [key for key in keys if key not in found]
+        if missing and self.path is not None:
+            try:
+                with self._lock, self._connect() as db:
+                    for key in missing:
+                        row = db.execute(
+                            "SELECT duration, sample_rate, channels, codec FROM probes"
+                            " WHERE path = ? AND size = ? AND mtime_ns = ?", key,
+                        ).fetchone()
+                        if row is not None:
+                            found[key] = self._memory[key] = MediaInfo(*row)
+            except sqlite3.Error:
+                # Locked or unreadable database: the missing files are probed again
+                pass
+        return found
+
+    def put_many(self, entries):
+        """
+        Stores probes.
+
+        Args:
+            entries (dict): MediaInfo per (absolute path, size, mtime_ns) key.
+        """
+        self._memory.update(entries)
+        if not entries or self.path is None:
+            return
+        try:
+            with self._lock, self._connect() as db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO probes"
+                    " (path, size, mtime_ns, duration, sample_rate, channels, codec)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [key + (info.duration, info.sample_rate, info.channels, info.codec)
+                     for key, info in entries.items()],
+                )
+        except sqlite3.Error:
+            # Locked, read-only or full: the probes stay cached in memory only
+            pass
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_probe_cache():
+    """Returns the process-wide probe cache (created on first use)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ProbeCache()
+        return _default_cache
+
+
+def _read_header(path):
+    """Probes a file without caching: libsndfile header first, then ffprobe."""
+    try:
+        info = sf.info(path)
+        return MediaInfo(info.duration, info.samplerate, info.channels, info.format.lower())
+    except RuntimeError:  # Not a format libsndfile reads (mp3 on old versions, m4a...)
+        pass
+    import ffmpeg
+
+    probe = ffmpeg.probe(path)
+    audio_streams = [s for s in probe.get('streams', []) if s.get('codec_type') == 'audio']
+    if not audio_streams:
+        raise ValueError(f"No audio stream found in {path}")
+    stream = audio_streams[0]
+    duration = stream.get('duration') or probe.get('format', {}).get('duration')
+    return MediaInfo(
+        float(duration) if duration is not None else None,
+        int(stream['sample_rate']) if stream.get('sample_rate') else None,
+        int(stream['channels']) if stream.get('channels') else None,
+        stream.get('codec_name'),
+    )
+
+
+def probe_files(paths, cache=None):
+    """
+    Probes many audio files, reading only the headers of files not cached yet.
+
+    Args:
+        paths (list): Paths to audio files.
+        cache (ProbeCache, optional): Cache to use (default: the process-wide cache).
+
+    Returns:
+        list: The MediaInfo of each path, in order.
+    """
+    cache = cache or default_probe_cache()
+    keys = []
+    for path in paths:
+        stat = os.stat(path)
+        keys.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    found = cache.get_many(keys)
+    probed = {}
+    for path, key in zip(paths, keys):
+        if key not in found and key not in probed:
+            probed[key] = _read_header(path)
+    cache.put_many(probed)
+    found.update(probed)
+    return [found[key] for key in keys]
+
+
+def probe_file(path, cache=None):
+    """
+    Probes an audio file (see `probe_files`).
+
+    Args:
+        path (str): Path to the audio file.
+        cache (ProbeCache, optional): Cache to use (default: the process-wide cache).
+
+    Returns:
+        MediaInfo: Duration, sample rate and channels of the file.
+    """
+    return probe_files([path], cache)[0]
+
+
+def probe_link(url, metadata_cache=None):
+    """
+    Probes a link through its (cached) yt-dlp metadata, without downloading.
+
+    The sample rate and channels are those of the best audio format, when
+    the extractor reports them.
+
+    Args:
+        url (str): Video URL.
+        metadata_cache (MetadataCache, optional): Cache of video metadata.
+
+    Returns:
+        MediaInfo: Properties of the link's audio.
+    """
+    from ..downloader.metadata import fetch_info
+
+    info = fetch_info(url, metadata_cache)
+    audio_formats = [f for f in info.get('formats') or [] if f.get('acodec') not in (None, 'none')]
+    best = max(audio_formats, key=lambda f: f.get('abr') or 0, default=info)
+    return MediaInfo(info.get('duration'), best.get('asr'), best.get('audio_channels'),
+                     best.get('acodec'))
+
+
+def plan_separation(info, stem_number=2, offset=None, duration=None, governor=None):
+    """
+    Predicts how `extract_stems` will run on an input, from its probe.
+
+    Args:
+        info (MediaInfo): Probe of the input.
+        stem_number (int): Stem count of the model.
+        offset (float, optional): Start of the separated segment in seconds.
+        duration (float, optional): Length of the separated segment in seconds.
+        governor (MemoryGovernor, optional): Memory budget (default: the process-wide governor).
+
+    Returns:
+        dict: "seconds" of audio separated, whether the input is "resampled",
+              estimated "peak_memory" in bytes, and "chunk_seconds" (None when
+              the input is separated at once). None values mean unknown.
+    """
+    governor = governor or default_governor()
+    seconds = info.duration
+    if seconds is not None:
+        seconds = max(seconds - (offset or 0), 0)
+        if duration is not None:
+            seconds = min(seconds, duration)
+    elif duration is not None:
+        seconds = duration
+    plan = {
+        "seconds": seconds,
+        "resampled": None if info.sample_rate is None else info.sample_rate != MODEL_SAMPLE_RATE,
+        "peak_memory": None,
+        "chunk_seconds": None,
+    }
+    if seconds is None:
+        return plan
+    samples = int(seconds * MODEL_SAMPLE_RATE)
+    # WAV files at the model rate are memory-mapped (see processor.audio.map_wav)
+    mapped = (info.codec in _MAPPED_CODECS and info.sample_rate == MODEL_SAMPLE_RATE
+              and (info.channels or 2) <= 2)
+    # Inputs with more channels are mixed down to stereo while decoding
+    channels = min(info.channels or 2, 2)
+    peak = estimate_peak_memory(samples, channels, stem_number, mapped=mapped)
+    if peak > governor.budget:
+        # Same rule as extract_stems: chunks of whole model segments that fit the budget
+        chunk = max_chunk_samples(governor.budget, samples, channels, stem_number,
+                                  mapped=mapped)
+        chunk = max(chunk // _SEGMENT_SAMPLES, 1) * _SEGMENT_SAMPLES
+        peak = estimate_peak_memory(samples, channels, stem_number, chunk_samples=chunk,
+                                    mapped=mapped)
+        plan["chunk_seconds"] = chunk / MODEL_SAMPLE_RATE
+    plan["peak_memory"] = peak
+    return plan
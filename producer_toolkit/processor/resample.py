@@ -0,0 +1,140 @@
+"""
+Sample rate and channel layout conversion.
+
+Spleeter models work on 44.1 kHz stereo. Studio files at 48 or 96 kHz used
+to go through an ffmpeg subprocess just to be resampled; `conform` does it
+in-process instead, with a polyphase filter (scipy's `resample_poly`)
+applied to every channel at once. Inputs already at the target rate and
+layout are returned as they are, without a copy.
+
+The filter length is set by a quality level:
+
+    fast      short filter, for previews and drafts
+    standard  scipy's default filter
+    high      long filter with a sharper cutoff, for masters
+
+The level defaults to "standard" and can be set with the
+PT_RESAMPLE_QUALITY environment variable.
+"""
+
+import math
+import os
+
+import numpy as np
+
+RESAMPLE_QUALITY_ENV = "PT_RESAMPLE_QUALITY"
+
+# Filter half-length in taps per phase, and beta of its Kaiser window
+QUALITIES = {
+    'fast': (4, 5.0),
+    'standard': (10, 5.0),
+    'high': (32, 9.0),
+}
+DEFAULT_QUALITY = 'standard'
+
+# Downmix of 5.1 (FL, FR, FC, LFE, BL, BR) to stereo, like ffmpeg's default
+# matrix: the centre and surrounds at -3 dB, the LFE dropped
+_SQRT_HALF = math.sqrt(0.5)
+_DOWNMIX_5_1 = np.array([
+    [1.0, 0.0],
+    [0.0, 1.0],
+    [_SQRT_HALF, _SQRT_HALF],
+    [0.0, 0.0],
+    [_SQRT_HALF, 0.0],
+    [0.0, _SQRT_HALF],
+], dtype=np.float32)
+
+
+def default_quality():
+    """Returns the quality level from PT_RESAMPLE_QUALITY, else "standard"."""
+    return os.environ.get(RESAMPLE_QUALITY_ENV) or DEFAULT_QUALITY
+
+
+def resample(waveform, orig_sr, target_sr, quality=None):
+    """
+    Resamples a waveform with a polyphase filter.
+
+    Args:
+        waveform (numpy.ndarray): Waveform of shape (samples, channels).
+        orig_sr (int): Sample rate of the waveform.
+        target_sr (int): Sample rate to convert to.
+        quality (str, optional): "fast", "standard" or "high" (default: see `default_quality`).
+
+    Returns:
+        numpy.ndarray: The resampled float32 waveform (the input itself if the rates match).
+    """
+    if orig_sr == target_sr:
+        return waveform
+    quality = quality or default_quality()
+    if quality not in QUALITIES:
+        raise ValueError(f"Unknown resampling quality: {quality} (use {', '.join(QUALITIES)})")
+    from scipy.signal import firwin, resample_poly
+
+    divisor = math.gcd(orig_sr, target_sr)
+    up, down = target_sr // divisor, orig_sr // divisor
+    half_length, beta = QUALITIES[quality]
+    max_rate = max(up, down)
+    # Low-pass at the lower of the two Nyquist frequencies
+    taps = firwin(2 * half_length * max_rate + 1, 1.0 / max_rate, window=('kaiser', beta))
+    resampled = resample_poly(waveform, up, down, axis=0, window=taps)
+    return resampled.astype(np.float32, copy=False)
+
+
+def convert_channels(waveform, channels):
+    """
+    Converts a waveform to another channel count.
+
+    Mono is duplicated or mixed down by averaging; 5.1 is mixed down to
+    stereo with the usual matrix, and other layouts by averaging their
+    even channels to the left and odd ones to the right.
+
+    Args:
+        waveform (numpy.ndarray): Waveform of shape (samples, channels).
+        channels (int): Channel count to convert to (1 or 2).
+
+    Returns:
+        numpy.ndarray: The converted waveform (the input itself if the counts match).
+    """
+    source = waveform.shape[1]
+    if source == channels:
+        return waveform
+    if channels == 1:
+        return waveform.mean(axis=1, keepdims=True, dtype=np.float32)
+    if channels != 2:
+        raise ValueError(f"Can't convert {source} channels to {channels}")
+    if source == 1:
+        return np.repeat(waveform, 2, axis=1)
+    if source == 6:
+        matrix = _DOWNMIX_5_1
+    else:
+        matrix = np.zeros((source, 2), dtype=np.float32)
+        matrix[0::2, 0] = 1.0
+        matrix[1::2, 1] = 1.0
+    # Normalize so a full-scale signal in every channel doesn't clip
+    matrix = matrix / matrix.sum(axis=0)
+    return (waveform @ matrix).astype(np.float32, copy=False)
+
+
+def conform(waveform, sample_rate, target_sr, channels=None, quality=None):
+    """
+    Converts a waveform to a sample rate and channel count.
+
+    Channels are removed before resampling and added after it, so the
+    filter runs on as few channels as possible.
+
+    Args:
+        waveform (numpy.ndarray): Waveform of shape (samples, channels).
+        sample_rate (int): Sample rate of the waveform.
+        target_sr (int): Sample rate to convert to.
+        channels (int, optional): Channel count to convert to (default: unchanged).
+        quality (str, optional): Resampling quality (see `resample`).
+
+    Returns:
+        numpy.ndarray: The converted waveform (the input itself if nothing changes).
+    """
+    if channels is not None and channels < waveform.shape[1]:
+        waveform = convert_channels(waveform, channels)
+    waveform = resample(waveform, sample_rate, target_sr, quality)
+    if channels is not None:
+        waveform = convert_channels(waveform, channels)
+    return waveform
@@ -0,0 +1,148 @@
+"""
+Cache of the spectrograms computed during separation.
+
+Separation computes the STFT of the mix and a masked STFT for every stem.
+Passing a `SpectrogramCache` to `extract_stems` keeps them, so follow-on
+analysis (tempo, key, onsets...) can use the magnitude and phase directly
+instead of decoding the stems and transforming them again.
+
+Example:
+    cache = SpectrogramCache()
+    extract_stems("song.wav", "stems", stem_number=4, spectrogram_cache=cache)
+    drums = cache.get("song.wav", "drums", stem_number=4)
+    tempo = estimate_tempo(drums)
+"""
+
+import collections
+import os
+import threading
+
+import numpy as np
+
+# Name under which the mix spectrogram is stored
+MIX = "mix"
+
+
+class Spectrogram:
+    """
+    A stereo STFT with the parameters it was computed with.
+
+    Args:
+        stft (numpy.ndarray): Complex STFT of shape (frames, bins, channels).
+        sample_rate (int): Sample rate of the audio.
+        frame_length (int): FFT size in samples.
+        frame_step (int): Hop between frames in samples.
+    """
+
+    def __init__(self, stft, sample_rate, frame_length, frame_step):
+        self.stft = stft
+        self.sample_rate = sample_rate
+        self.frame_length = frame_length
+        self.frame_step = frame_step
+
+    @property
+    def nbytes(self):
+        return self.stft.nbytes
+
+    @property
+    def magnitude(self):
+        """Magnitude of the channel mix, shaped (bins, frames) like librosa's STFTs."""
+        return np.abs(self.stft).mean(axis=-1).T
+
+    @property
+    def power(self):
+        """Power of the channel mix, shaped (bins, frames)."""
+        return (np.abs(self.stft) ** 2).mean(axis=-1).T
+
+    @property
+    def phase(self):
+        """Phase of each channel, shaped (frames, bins, channels)."""
+        return np.angle(self.stft)
+
+
+class SpectrogramCache:
+    """
+    Keeps the spectrograms of recent separations in memory.
+
+    Entries are keyed by audio file, name ("mix" or a stem) and the stem
+    count of the model. The least recently used entries are dropped when
+    `max_bytes` is exceeded. Chunked separations (see the memory budget)
+    are not cached, since they exist precisely to avoid holding the whole
+    spectrogram.
+
+    Args:
+        max_bytes (int, optional): Upper bound on the cached data (default: unbounded).
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(audio_path, name, stem_number):
+        # The mix spectrogram doesn't depend on the model
+        return (os.path.abspath(audio_path), name, None if name == MIX else stem_number)
+
+    def put(self, audio_path, name, spectrogram, stem_number=None):
+        """
+        Stores a spectrogram.
+
+        Args:
+            audio_path (str): Audio file the spectrogram was computed from.
+            name (str): "mix" or the name of a stem.
+            spectrogram (Spectrogram): The spectrogram.
+            stem_number (int, optional): Stem count of the model (for stems).
+        """
+        key = self._key(audio_path, name, stem_number)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old.nbytes
+            self._entries[key] = spectrogram
+            self._size += spectrogram.nbytes
+            while self.max_bytes is not None and self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+
+    def get(self, audio_path, name=MIX, stem_number=None):
+        """
+        Returns a cached spectrogram.
+
+        Args:
+            audio_path (str): Audio file the spectrogram was computed from.
+            name (str): "mix" or the name of a stem.
+            stem_number (int, optional): Stem count of the model (for stems).
+
+        Returns:
+            Spectrogram: The spectrogram, or None if it isn't cached.
+        """
+        key = self._key(audio_path, name, stem_number)
+        with self._lock:
+            spectrogram = self._entries.get(key)
+            if spectrogram is not None:
+                self._entries.move_to_end(key)
+            return spectrogram
+
+    def names(self, audio_path, stem_number=None):
+        """Returns the names cached for an audio file ("mix" first, then the stems)."""
+        path = os.path.abspath(audio_path)
+        with self._lock:
+            return [
+                name for (key_path, name, number) in self._entries
+                if key_path == path and (name == MIX or number == stem_number)
+            ]
+
+    def discard(self, audio_path):
+        """Drops every spectrogram of an audio file, once its analysis is done."""
+        path = os.path.abspath(audio_path)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path]:
+                self._size -= self._entries.pop(key).nbytes
+
+    def clear(self):
+        """Drops every cached spectrogram."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
@@ -1,7 +1,9 @@
 import os
 import sys
 import shutil
+import hashlib
 import logging
+import contextlib
 from pathlib import Path
 
 # Set model path before importing Spleeter
@@ -16,18 +18,390 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # 0=debug, 1=info, 2=warning, 3=error
 logging.getLogger('tensorflow').setLevel(logging.ERROR)
 
 # Now import Spleeter after environment variables are set
+import numpy as np
+import soundfile as sf
 from spleeter.separator import Separator
 
-def extract_stems(audio_path, output_dir, stem_number=2, models_dir=None):
+from ..progress import ProgressTracker
+from .audio import load_audio
+from .probe import probe_file, plan_separation
+from .pcm import PCMWriter
+from .fingerprint import align_offset, compute_fingerprint, reuse_stems
+from .spectrogram import MIX, Spectrogram
+from .masks import MASKS_DIR, mask_writer
+from .memory import default_governor, estimate_peak_memory, max_chunk_samples
+from .checkpoint import ChunkCheckpoint, checkpoint_dir, DEFAULT_CHECKPOINT_SECONDS
+from ..staging import staging_dir, commit_file, atomic_path
+
+# Name of the output that sums every non-vocal stem
+INSTRUMENTAL = "instrumental"
+# Samples hashed at a time for checkpoint signatures (about 24s at 44.1kHz)
+_HASH_BLOCK_SAMPLES = 1 << 20
+
+
+def _resolve_outputs(instruments, stems=None, instrumental=False):
+    """
+    Works out which model outputs are needed for the requested stems.
+
+    Args:
+        instruments (list): Instruments produced by the model.
+        stems (list, optional): Stems to write. If None, every stem is written
+                                (unless only the instrumental is requested).
+        instrumental (bool): Whether to also write the sum of all non-vocal stems.
+
+    Returns:
+        tuple: (stems to write, instruments the model needs to compute).
+    """
+    if stems is None:
+        stems = [] if instrumental else list(instruments)
+    unknown = [stem for stem in stems if stem not in instruments]
+    if unknown:
+        raise ValueError(
+            f"Unknown stem(s) {', '.join(unknown)}; "
+            f"this model produces: {', '.join(instruments)}"
+        )
+    needed = set(stems)
+    if instrumental:
+        needed.update(inst for inst in instruments if inst != "vocals")
+    return list(stems), [inst for inst in instruments if inst in needed]
+
+
+def _compute_stft(separator, waveform):
+    """
+    Computes the stereo mix STFT the model expects.
+
+    All Spleeter configurations share the same STFT parameters, so the
+    result can be reused across separators.
+
+    Args:
+        separator (Separator): Spleeter separator using the librosa STFT backend.
+        waveform (numpy.ndarray): Waveform of shape (samples, channels).
+
+    Returns:
+        numpy.ndarray: Complex STFT of shape (frames, bins, 2).
+    """
+    stft = separator._stft(waveform)
+    if stft.shape[-1] == 1:
+        stft = np.concatenate([stft, stft], axis=-1)
+    elif stft.shape[-1] > 2:
+        stft = stft[:, :, :2]
+    return stft
+
+
+def _masked_spectrograms(separator, stft, instruments, audio_descriptor=""):
+    """
+    Runs the model on a mix STFT and returns the masked STFT of each instrument.
+
+    Only the requested instruments are fetched from the graph, so the
+    masking of the others is skipped.
+
+    Args:
+        separator (Separator): Spleeter separator using the librosa STFT backend.
+        stft (numpy.ndarray): Mix STFT of shape (frames, bins, 2).
+        instruments (list): Instruments to compute.
+        audio_descriptor (str): Identifier of the audio, passed to the model.
+
+    Returns:
+        dict: Mapping of instrument to masked STFT (same shape as `stft`).
+    """
+    with separator._tf_graph.as_default():
+        features = separator._get_features()
+        builder = separator._get_builder()
+        return separator._get_session().run(
+            {inst: builder.outputs[inst] for inst in instruments},
+            feed_dict=separator._get_input_provider().get_feed_dict(
+                features, stft, audio_descriptor
+            ),
+        )
+
+
+def _render_sources(separator, masked, stems, instrumental, length):
+    """
+    Inverts masked STFTs into waveforms for the requested stems.
+
+    Args:
+        separator (Separator): Spleeter separator using the librosa STFT backend.
+        masked (dict): Masked STFT per instrument (see `_masked_spectrograms`).
+        stems (list): Stems to invert.
+        instrumental (bool): Whether to also sum and invert the non-vocal stems.
+        length (int): Length of the output waveforms in samples.
+
+    Returns:
+        dict: Mapping of stem name to waveform.
+    """
+    sources = {
+        stem: separator._stft(masked[stem], inverse=True, length=length)
+        for stem in stems
+    }
+    if instrumental:
+        accompaniment = sum(spec for inst, spec in masked.items() if inst != "vocals")
+        sources[INSTRUMENTAL] = separator._stft(accompaniment, inverse=True, length=length)
+    return sources
+
+
+def _separate(separator, waveform, stems=None, instrumental=False, audio_descriptor="",
+              stft=None):
+    """
+    Separates a waveform, computing only the requested stems.
+
+    The mix STFT is computed once in numpy and only the masked spectrograms
+    of the needed instruments are fetched from the model, so unwanted stems
+    are never masked or inverted. The instrumental is summed in the
+    spectrogram domain and inverted once.
+
+    Args:
+        separator (Separator): Spleeter separator using the librosa STFT backend.
+        waveform (numpy.ndarray): Waveform of shape (samples, channels).
+        stems (list, optional): Stems to return (default: all).
+        instrumental (bool): Whether to also return the instrumental mix.
+        audio_descriptor (str): Identifier of the audio, passed to the model.
+        stft (numpy.ndarray, optional): Precomputed mix STFT (see `_compute_stft`).
+
+    Returns:
+        dict: Mapping of stem name to waveform.
+    """
+    instruments = separator._params["instrument_list"]
+    stems, needed = _resolve_outputs(instruments, stems, instrumental)
+    if stft is None:
+        stft = _compute_stft(separator, waveform)
+    masked = _masked_spectrograms(separator, stft, needed, audio_descriptor)
+    return _render_sources(separator, masked, stems, instrumental, waveform.shape[0])
+
+
+def _stft_frames(separator, waveform, first, last, offset=0):
+    """
+    Computes frames [first, last) of a signal's STFT from the samples they cover.
+
+    Spleeter's STFT pads frame_length samples on both sides and doesn't
+    center frames: frame k covers samples [k * step - length, k * step).
+
+    Args:
+        separator (Separator): Spleeter separator using the librosa STFT backend.
+        waveform (numpy.ndarray): The signal from sample `offset` on, of shape
+                                  (samples, channels). Later samples are taken as zero.
+        first (int): First frame to compute.
+        last (int): Frame after the last one to compute.
+        offset (int): Index of waveform's first sample in the signal.
+
+    Returns:
+        numpy.ndarray: Complex STFT frames of shape (last - first, bins, 2).
+    """
+    frame_length, frame_step = separator._params["frame_length"], separator._params["frame_step"]
+    start = max(first * frame_step - frame_length, 0)
+    end = last * frame_step
+    chunk = waveform[start - offset:max(end - offset, 0)]
+    if len(chunk) < end - start:
+        # Zero-fill past the end of the signal
+        chunk = np.concatenate([
+            chunk, np.zeros((end - start - len(chunk), waveform.shape[1]), dtype=waveform.dtype)
+        ])
+    skip = (first * frame_step - start) // frame_step
+    return _compute_stft(separator, chunk)[skip:skip + last - first]
+
+
+def _separate_chunked(separator, waveform, output_dir, chunk_segments, stems=None,
+                      instrumental=False, audio_descriptor="", on_chunk=None,
+                      mask_manifest=None, checkpoint=None):
+    """
+    Separates a waveform chunk by chunk and writes the stems as it goes.
+
+    Chunks start on model segment boundaries, and each one is given the
+    preceding samples and masked frames its STFT and overlap-add depend on,
+    so the result matches separating the whole waveform at once while only
+    one chunk's spectrograms are in memory.
+
+    Args:
+        separator (Separator): Spleeter separator using the librosa STFT backend.
+        waveform (numpy.ndarray): Waveform of shape (samples, channels).
+        output_dir (str): Directory where "<stem>.wav" files are written.
+        chunk_segments (int): Model segments (T frames each) per chunk.
+        stems (list, optional): Stems to write (default: all).
+        instrumental (bool): Whether to also write the instrumental mix.
+        audio_descriptor (str): Identifier of the audio, passed to the model.
+        on_chunk (callable, optional): Called with the seconds of audio written after each chunk.
+        mask_manifest (dict, optional): Also save the masks of every instrument,
+                                        described by this manifest (see `_mask_manifest`).
+        checkpoint (ChunkCheckpoint, optional): Record finished chunks there and
+                                                resume after the last one it holds.
+                                                Not combinable with mask_manifest.
+
+    Returns:
+        list: Names of the written stems.
+    """
+    params = separator._params
+    frame_length, frame_step = params["frame_length"], params["frame_step"]
+    # Frames overlapping a sample, i.e. the context each chunk needs from the previous one
+    context = frame_length // frame_step
+    sample_rate = separator._sample_rate
+    stems, needed = _resolve_outputs(params["instrument_list"], stems, instrumental)
+    names = stems + ([INSTRUMENTAL] if instrumental else [])
+    if mask_manifest is not None:
+        needed = list(params["instrument_list"])
+
+    length = waveform.shape[0]
+    # Number of frames of Spleeter's padded, uncentered STFT (see `_stft_frames`)
+    total_frames = (length + frame_length) // frame_step + 1
+    chunk_frames = chunk_segments * params["T"]
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Chunks finished by an interrupted run, and the frame the next one starts at
+    completed, resume_frame, previous = 0, 0, {}
+    if checkpoint is not None:
+        completed, resume_frame, loaded = checkpoint.resume()
+        if completed:
+            previous = loaded
+            if on_chunk is not None:
+                on_chunk((resume_frame - context) * frame_step / sample_rate)
+
+    with contextlib.ExitStack() as files:
+        masks = None
+        if mask_manifest is not None:
+            masks = files.enter_context(mask_writer(
+                os.path.join(output_dir, MASKS_DIR), mask_manifest, total_frames,
+                frame_length // 2 + 1,
+            ))
+        writers = {}
+        index = completed
+        for first in range(resume_frame, total_frames, chunk_frames):
+            last = min(first + chunk_frames, total_frames)
+            out_start = (first - context) * frame_step if first else 0
+            out_end = length if last == total_frames else (last - context) * frame_step
+
+            stft = _stft_frames(separator, waveform, first, last)
+            masked = _masked_spectrograms(separator, stft, needed, audio_descriptor)
+            if masks is not None:
+                masks.write(first, stft, masked)
+
+            # Prepend the previous chunk's last frames so the overlap-add is complete
+            spectrograms = {
+                inst: np.concatenate([previous[inst], spec]) if previous else spec
+                for inst, spec in masked.items()
+            }
+            sources = _render_sources(separator, spectrograms, stems, instrumental,
+                                      out_end - out_start)
+            previous = {inst: spec[-context:] for inst, spec in masked.items()}
+
+            if checkpoint is not None:
+                checkpoint.save_chunk(index, last, {name: sources[name] for name in names},
+                                      previous, sample_rate)
+            else:
+                for name in names:
+                    if name not in writers:
+                        tmp_path = files.enter_context(
+                            atomic_path(os.path.join(output_dir, f"{name}.wav"))
+                        )
+                        writers[name] = files.enter_context(
+                            sf.SoundFile(tmp_path, 'w', sample_rate, sources[name].shape[1],
+                                         subtype='PCM_16')
+                        )
+                    writers[name].write(sources[name])
+            if on_chunk is not None:
+                on_chunk((out_end - out_start) / sample_rate)
+            index += 1
+
+    if checkpoint is not None:
+        checkpoint.assemble(names, output_dir, index, sample_rate, 2)
+        checkpoint.discard()
+
+    for name in names:
+        print(f"✓ Created {name}.wav")
+    return names
+
+
+def _create_separator(stem_number):
+    """Creates a Spleeter separator for the given stem count."""
+    return Separator(
+        f'spleeter:{stem_number}stems',
+        multiprocess=True,  # Set to True for faster processing if your system supports it
+        stft_backend="librosa"  # STFT in numpy so it can be shared and unwanted stems skipped
+    )
+
+
+def _write_stems(separator, sources, audio_path, output_dir, scratch_dir=None):
+    """
+    Saves separated sources into output_dir as <stem>.wav files.
+
+    The files are encoded in a private staging directory on the output's
+    filesystem and then renamed into place, so they appear atomically.
+
+    Args:
+        separator (Separator): Separator used to encode the files.
+        sources (dict): Mapping of stem name to waveform.
+        audio_path (str): Path of the input audio (used to name Spleeter's output folder).
+        output_dir (str): Directory where the stems are saved.
+        scratch_dir (str, optional): Where to stage the files (default: inside output_dir).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # Spleeter will create subdirectories inside the staging directory when saving
+    with staging_dir(output_dir, scratch_dir) as temp_output:
+        separator.save_to_file(sources, audio_path, temp_output)
+        
+        # Get the filename from the audio path
+        filename = os.path.splitext(os.path.basename(audio_path))[0]
+        
+        # Move files from nested directory structure directly to output_dir
+        source_dir = os.path.join(temp_output, filename)
+        
+        if os.path.exists(source_dir):
+            for stem_file in os.listdir(source_dir):
+                # Commit each stem file to the output directory
+                src_path = os.path.join(source_dir, stem_file)
+                dst_path = os.path.join(output_dir, stem_file)
+                commit_file(src_path, dst_path)
+                print(f"✓ Created {os.path.basename(dst_path)}")
+
+
+def extract_stems(audio_path, output_dir, stem_number=2, models_dir=None,
+                  offset=None, duration=None, stems=None, instrumental=False,
+                  progress=None, fingerprint_index=None, scratch_dir=None,
+                  governor=None, spectrogram_cache=None, save_masks=False, checkpoint=False,
+                  checkpoint_seconds=DEFAULT_CHECKPOINT_SECONDS):
     """
     Splits the audio file into stems using Spleeter.
     
+    Several stem counts can be given at once (e.g. [2, 4, 5]); the audio is
+    then decoded and transformed only once, and each configuration is saved
+    in its own "<n>stems" subdirectory of output_dir.
+    
     Args:
         audio_path (str): Path to the input audio file (WAV format expected).
         output_dir (str): Directory where the separated stems will be saved.
-        stem_number (int): Number of stems (e.g., 2, 4, or 5). Default is 2 stems.
+        stem_number (int or list): Number of stems (e.g., 2, 4, or 5), or a list
+                                   of stem counts. Default is 2 stems.
         models_dir (str, optional): Directory where Spleeter models should be stored.
                                    If None, defaults to 'models' in the project root.
+        offset (float, optional): Start of the segment to separate, in seconds.
+        duration (float, optional): Length of the segment to separate, in seconds.
+                                    If None, separates until the end of the file.
+        stems (list, optional): Only write these stems (e.g. ["vocals", "drums"]).
+                                If None, every stem of the model is written.
+        instrumental (bool): Also write "instrumental.wav", the sum of all
+                             non-vocal stems. When set without `stems`, only
+                             the instrumental is written.
+        progress (callable, optional): Receives progress event dictionaries for the
+                                       decode, separate and write stages
+                                       (see producer_toolkit.progress).
+        fingerprint_index (FingerprintIndex, optional): Index of previously separated
+                                       audio. When the input matches an entry, its
+                                       stems are reused instead of separating again.
+        scratch_dir (str, optional): Where intermediate files are staged. Defaults
+                                     to a hidden directory inside output_dir, so
+                                     results are committed with a rename.
+        governor (MemoryGovernor, optional): Admits the job against a memory budget
+                                     (default: the process-wide governor). Inputs
+                                     too long for the budget are separated in chunks.
+        spectrogram_cache (SpectrogramCache, optional): Receives the mix STFT and the
+                                     masked STFT of each written stem, for reuse by
+                                     analysis (see producer_toolkit.processor.analysis).
+        save_masks (bool): Also save the masks of every instrument (float16 .npy) in a
+                           "masks" folder, to re-render stems later without the
+                           model (see producer_toolkit.processor.masks).
+        checkpoint (bool): Separate in chunks of checkpoint_seconds and record each
+                           finished chunk, so an interrupted run started again with
+                           the same arguments resumes after the last one (see
+                           producer_toolkit.processor.checkpoint).
+        checkpoint_seconds (float): Chunk length of checkpointed separations.
     
     Returns:
         str: The output directory where stems are saved.
@@ -39,38 +413,238 @@ def extract_stems(audio_path, output_dir, stem_number=2, models_dir=None):
     if models_dir is None:
         models_dir = os.environ.get('MODEL_PATH')
     
-    # Initialize Spleeter with the specified number of stems
-    separator = Separator(
-        f'spleeter:{stem_number}stems',
-        multiprocess=True,  # Set to True for faster processing if your system supports it
-        stft_backend="tensorflow"
-    )
-    
-    print(f"Processing stems... (this may take a moment)")
+    stem_numbers = _stem_numbers(stem_number)
     
-    # Create a temporary directory for initial output
-    temp_output = os.path.join(output_dir, "_temp_spleeter")
-    os.makedirs(temp_output, exist_ok=True)
+    # Initialize Spleeter with the specified number(s) of stems
+    separators = [_create_separator(number) for number in stem_numbers]
     
-    # Perform separation; Spleeter will create subdirectories inside temp_output
-    separator.separate_to_file(audio_path, temp_output)
+    return _extract(separators, stem_numbers, audio_path, output_dir,
+                    offset=offset, duration=duration, stems=stems,
+                    instrumental=instrumental, progress=progress,
+                    fingerprint_index=fingerprint_index, scratch_dir=scratch_dir,
+                    governor=governor, spectrogram_cache=spectrogram_cache,
+                    save_masks=save_masks, checkpoint=checkpoint,
+                    checkpoint_seconds=checkpoint_seconds)
+
+
+def _stem_numbers(stem_number):
+    """Normalizes a stem count or list of stem counts into a list without duplicates."""
+    if isinstance(stem_number, int):
+        return [stem_number]
+    return list(dict.fromkeys(stem_number))
+
+
+def _extract(separators, stem_numbers, audio_path, output_dir, offset=None, duration=None,
+             stems=None, instrumental=False, progress=None, fingerprint_index=None,
+             scratch_dir=None, governor=None, spectrogram_cache=None, save_masks=False,
+             checkpoint=False, checkpoint_seconds=DEFAULT_CHECKPOINT_SECONDS):
+    """
+    Runs `extract_stems` with already created separators (one per stem count).
+
+    See `extract_stems` for the meaning of the arguments.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if governor is None:
+        governor = default_governor()
+    if checkpoint and save_masks:
+        print("Checkpoints are not available when saving masks, separating without")
+        checkpoint = False
     
-    # Get the filename from the audio path
-    filename = os.path.splitext(os.path.basename(audio_path))[0]
+    print(f"Processing stems... (this may take a moment)")
     
-    # Move files from nested directory structure directly to output_dir
-    source_dir = os.path.join(temp_output, filename)
+    # The header probe gives the amount of work up front, so progress has an ETA from the start
+    planned = plan_separation(probe_file(audio_path), offset=offset, duration=duration)["seconds"]
     
-    if os.path.exists(source_dir):
-        for stem_file in os.listdir(source_dir):
-            # Move each stem file to the output directory
-            src_path = os.path.join(source_dir, stem_file)
-            dst_path = os.path.join(output_dir, stem_file)
-            shutil.move(src_path, dst_path)
-            print(f"✓ Created {os.path.basename(dst_path)}")
+    # Decode only the requested segment and compute its STFT once for all models.
+    # WAV inputs are memory-mapped, so chunked runs only decode the current chunk
+    tracker = ProgressTracker(progress, 'decode', total=planned)
+    sample_rate = separators[0]._sample_rate
+    waveform = load_audio(audio_path, offset=offset, duration=duration,
+                          sample_rate=sample_rate, mmap=True)
+    mapped = not isinstance(waveform, np.ndarray)
+    audio_seconds = waveform.shape[0] / sample_rate
+    tracker.total = audio_seconds
+    tracker.finish()
     
-    # Clean up temp directory
-    shutil.rmtree(temp_output, ignore_errors=True)
+    tracker = ProgressTracker(progress, 'separate', total=audio_seconds * len(separators))
+    stft = None
+    fingerprint = None
+    if fingerprint_index is not None:
+        fingerprint = compute_fingerprint(waveform, sample_rate)
     
-    print(f"✅ Audio successfully split into {stem_number} stems")
-    return output_dir
\ No newline at end of file
+    for number, separator in zip(stem_numbers, separators):
+        if len(stem_numbers) == 1:
+            stems_dir = output_dir
+        else:
+            stems_dir = os.path.join(output_dir, f"{number}stems")
+        
+        mask_manifest = None
+        if save_masks:
+            mask_manifest = _mask_manifest(separator, number, audio_path, offset, duration,
+                                           waveform.shape[0])
+        
+        if fingerprint_index is not None and not save_masks:
+            # Reuse the stems of a near-identical input separated before
+            names, _ = _resolve_outputs(separator._params["instrument_list"], stems, instrumental)
+            files = [f"{name}.wav" for name in names + ([INSTRUMENTAL] if instrumental else [])]
+            match = fingerprint_index.lookup(fingerprint, audio_seconds, number, files)
+            if match:
+                match_dir, shift = match
+                print(f"Found matching audio, reusing stems from {match_dir}")
+                # Line the stored stems up with this input, to the sample
+                shift = align_offset(waveform, sample_rate,
+                                     [os.path.join(match_dir, name) for name in files],
+                                     int(round(shift * sample_rate)))
+                reuse_stems(match_dir, files, stems_dir, offset=shift, length=waveform.shape[0])
+                tracker.advance(audio_seconds, stem_number=number, reused=True)
+                continue
+        
+        peak = estimate_peak_memory(waveform.shape[0], waveform.shape[1], number,
+                                    mapped=mapped)
+        if peak > governor.budget or checkpoint:
+            # Too long to separate at once within the budget, or resumable: go chunk by chunk
+            segment_samples = separator._params["T"] * separator._params["frame_step"]
+            chunk_samples = max_chunk_samples(governor.budget, waveform.shape[0],
+                                              waveform.shape[1], number, mapped=mapped)
+            chunk_segments = max(chunk_samples // segment_samples, 1)
+            job = None
+            if checkpoint:
+                chunk_segments = min(chunk_segments, max(
+                    int(checkpoint_seconds * sample_rate) // segment_samples, 1))
+                job = ChunkCheckpoint(
+                    checkpoint_dir(stems_dir, number, scratch_dir),
+                    _checkpoint_signature(waveform, number, stems, instrumental),
+                )
+            peak = estimate_peak_memory(waveform.shape[0], waveform.shape[1], number,
+                                        chunk_samples=chunk_segments * segment_samples,
+                                        mapped=mapped)
+            if not checkpoint:
+                print(f"Input too long for the memory budget, separating in chunks of "
+                      f"{chunk_segments * segment_samples / sample_rate:.0f}s")
+            with governor.reserve(peak):
+                names = _separate_chunked(
+                    separator, waveform, stems_dir, chunk_segments, stems=stems,
+                    instrumental=instrumental, audio_descriptor=audio_path,
+                    on_chunk=lambda seconds: tracker.advance(seconds, stem_number=number),
+                    mask_manifest=mask_manifest, checkpoint=job,
+                )
+        else:
+            with governor.reserve(peak):
+                if stft is None:
+                    stft = _compute_stft(separators[0], waveform[:])
+                stem_names, needed = _resolve_outputs(separator._params["instrument_list"],
+                                                      stems, instrumental)
+                if save_masks:
+                    needed = list(separator._params["instrument_list"])
+                masked = _masked_spectrograms(separator, stft, needed, audio_path)
+                if save_masks:
+                    with mask_writer(os.path.join(stems_dir, MASKS_DIR), mask_manifest,
+                                     *stft.shape) as masks:
+                        masks.write(0, stft, masked)
+                sources = _render_sources(separator, masked, stem_names, instrumental,
+                                          waveform.shape[0])
+                if spectrogram_cache is not None:
+                    _cache_spectrograms(spectrogram_cache, separator, audio_path, number,
+                                        stft, masked, stem_names, instrumental)
+                tracker.advance(audio_seconds, stem_number=number)
+                writer = ProgressTracker(progress, 'write', total=audio_seconds)
+                _write_stems(separator, sources, audio_path, stems_dir, scratch_dir)
+                writer.finish(stem_number=number, files=len(sources))
+                names = list(sources)
+                del sources, masked
+        if fingerprint_index is not None:
+            fingerprint_index.add(fingerprint, audio_seconds, number, stems_dir)
+        
+        if stems is None and not instrumental:
+            print(f"✅ Audio successfully split into {number} stems")
+        else:
+            print(f"✅ Extracted {', '.join(names)} ({number}-stem model)")
+    tracker.finish()
+    return output_dir
+
+
+def _checkpoint_signature(waveform, stem_number, stems, instrumental):
+    """Describes a checkpointed separation, so a checkpoint is only resumed by the same job."""
+    # Identify the input by its samples: a download repeated after the
+    # interruption lands in another file but decodes to the same audio.
+    # Hashed block by block, so a memory-mapped input is never decoded whole
+    digest = hashlib.sha1()
+    for start in range(0, waveform.shape[0], _HASH_BLOCK_SAMPLES):
+        block = waveform[start:start + _HASH_BLOCK_SAMPLES]
+        digest.update(np.ascontiguousarray(block, dtype=np.float32).data)
+    return {
+        "audio": digest.hexdigest(),
+        "length": waveform.shape[0],
+        "stem_number": stem_number,
+        "stems": list(stems) if stems else None,
+        "instrumental": instrumental,
+    }
+
+
+def _mask_manifest(separator, stem_number, audio_path, offset, duration, length):
+    """Describes a separation for the manifest of its saved masks."""
+    params = separator._params
+    return {
+        "audio_path": os.path.abspath(audio_path),
+        "offset": offset,
+        "duration": duration,
+        "length": length,
+        "sample_rate": separator._sample_rate,
+        "frame_length": params["frame_length"],
+        "frame_step": params["frame_step"],
+        "stem_number": stem_number,
+        "instruments": list(params["instrument_list"]),
+    }
+
+
+def _cache_spectrograms(cache, separator, audio_path, stem_number, stft, masked, stems,
+                        instrumental):
+    """Stores the mix STFT and the masked STFTs of the written stems in a SpectrogramCache."""
+    params = separator._params
+
+    def spectrogram(data):
+        return Spectrogram(data, separator._sample_rate, params["frame_length"],
+                           params["frame_step"])
+
+    cache.put(audio_path, MIX, spectrogram(stft))
+    for stem in stems:
+        cache.put(audio_path, stem, spectrogram(masked[stem]), stem_number)
+    if instrumental:
+        accompaniment = sum(spec for inst, spec in masked.items() if inst != "vocals")
+        cache.put(audio_path, INSTRUMENTAL, spectrogram(accompaniment), stem_number)
+
+
+def stream_stem(audio_path, stem, stream, stem_number=2, offset=None, duration=None,
+                sample_format='s16le', container='wav', block_seconds=1.0):
+    """
+    Separates one stem and writes it as PCM to a binary stream (e.g. stdout).
+
+    Only the requested stem is computed, and no files are written.
+
+    Args:
+        audio_path (str): Path to the input audio file.
+        stem (str): Stem to write, e.g. "vocals", or "instrumental".
+        stream (file): Binary stream to write to (e.g. sys.stdout.buffer).
+        stem_number (int): Number of stems of the model (2, 4, or 5). Default is 2 stems.
+        offset (float, optional): Start of the segment to separate, in seconds.
+        duration (float, optional): Length of the segment to separate, in seconds.
+        sample_format (str): "s16le", "s24le" or "f32le".
+        container (str): "wav" for a WAV stream or "raw" for bare PCM.
+        block_seconds (float): Size of the blocks written to the stream.
+    """
+    separator = _create_separator(stem_number)
+    sample_rate = separator._sample_rate
+    waveform = load_audio(audio_path, offset=offset, duration=duration,
+                          sample_rate=sample_rate)
+    if stem == INSTRUMENTAL:
+        sources = _separate(separator, waveform, instrumental=True, audio_descriptor=audio_path)
+    else:
+        sources = _separate(separator, waveform, stems=[stem], audio_descriptor=audio_path)
+    source = sources[stem]
+
+    writer = PCMWriter(stream, sample_rate, source.shape[1], sample_format=sample_format,
+                       container=container, num_frames=source.shape[0])
+    block = max(int(block_seconds * sample_rate), 1)
+    for start in range(0, source.shape[0], block):
+        writer.write(source[start:start + block])
+    writer.flush()
@@ -0,0 +1,238 @@
+"""
+Streaming stem separation with bounded latency.
+
+`StreamingSeparator` accepts audio in blocks of any size (from stdin, a
+socket or a live input) and returns separated stems block by block. Each
+model invocation sees a sliding window of the most recent STFT frames: the
+frames of the block being emitted, the frames before it as context, and a
+few frames after it as lookahead. The latency is the block length plus the
+lookahead plus one STFT frame, and the cost is one model segment per block.
+
+Unlike `extract_stems`, the model never sees the future beyond the
+lookahead, so the stems differ slightly from an offline separation.
+"""
+
+import numpy as np
+
+from .pcm import SAMPLE_FORMATS, from_pcm_bytes
+from .spleeter_processor import (
+    _create_separator, _masked_spectrograms, _render_sources, _resolve_outputs, _stft_frames,
+    INSTRUMENTAL,
+)
+
+
+class StreamingSeparator:
+    """
+    Separates an audio stream block by block.
+
+    Args:
+        stem_number (int): Number of stems of the model (2, 4, or 5).
+        stems (list, optional): Stems to return (default: all).
+        instrumental (bool): Also return the instrumental mix.
+        block_seconds (float): Length of the blocks the stems are produced in.
+        lookahead_seconds (float): Audio after each block given to the model.
+        context_seconds (float, optional): Audio the model sees per invocation,
+                                           including the block and lookahead
+                                           (default and maximum: one model
+                                           segment, about 11.9 s).
+        separator (Separator, optional): Separator to use (e.g. a warm one
+                                         from a `Toolkit`).
+    """
+
+    def __init__(self, stem_number=2, stems=None, instrumental=False, block_seconds=1.0,
+                 lookahead_seconds=0.5, context_seconds=None, separator=None):
+        self.separator = separator or _create_separator(stem_number)
+        params = self.separator._params
+        self.sample_rate = self.separator._sample_rate
+        self._frame_length = params["frame_length"]
+        self._frame_step = params["frame_step"]
+        # Frames overlapping a sample: the overlap-add context of each block
+        self._overlap = self._frame_length // self._frame_step
+
+        self.stems, self._needed = _resolve_outputs(params["instrument_list"], stems,
+                                                    instrumental)
+        self.instrumental = instrumental
+        self.outputs = self.stems + ([INSTRUMENTAL] if instrumental else [])
+
+        self._block = max(self._seconds_to_frames(block_seconds), self._overlap + 1)
+        self._lookahead = max(self._seconds_to_frames(lookahead_seconds), 0)
+        window = params["T"]
+        if context_seconds is not None:
+            window = min(self._seconds_to_frames(context_seconds), window)
+        self._window = max(window, self._block + self._lookahead)
+        if self._window > params["T"]:
+            raise ValueError("block_seconds + lookahead_seconds must fit in one model segment "
+                             f"({params['T'] * self._frame_step / self.sample_rate:.1f}s)")
+        self.reset()
+
+    def _seconds_to_frames(self, seconds):
+        return int(round(seconds * self.sample_rate / self._frame_step))
+
+    @property
+    def latency(self):
+        """Seconds between a sample entering `process` and its stems coming out (excluding compute)."""
+        frames = self._block + self._lookahead + self._overlap
+        return frames * self._frame_step / self.sample_rate
+
+    def reset(self):
+        """Starts a new stream."""
+        self._samples = None  # Received samples still needed, from sample _sample_offset on
+        self._sample_offset = 0
+        self._received = 0
+        self._frames = None  # Computed STFT frames still needed, from frame _frame_offset on
+        self._frame_offset = 0
+        self._emitted = 0  # First frame whose stems haven't been produced
+        self._previous = {}  # Masked frames before _emitted, for the overlap-add
+
+    def process(self, block):
+        """
+        Adds audio to the stream and returns the stems that are ready.
+
+        Args:
+            block (numpy.ndarray): Samples of shape (frames, channels) at `sample_rate`.
+
+        Returns:
+            dict: Mapping of output name to a waveform of shape (frames, 2);
+                  the waveforms are empty until enough audio has arrived.
+        """
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim == 1:
+            block = block[:, None]
+        if self._samples is None:
+            self._samples = block[:0]
+        self._samples = np.concatenate([self._samples, block])
+        self._received += len(block)
+        # Frame k covers samples [k * step - length, k * step)
+        return self._produce(available=self._received // self._frame_step + 1)
+
+    def flush(self):
+        """
+        Ends the stream and returns the remaining stems.
+
+        Returns:
+            dict: Mapping of output name to the last waveform of the stream.
+        """
+        if self._samples is None:
+            return {name: np.zeros((0, 2), dtype=np.float32) for name in self.outputs}
+        total = (self._received + self._frame_length) // self._frame_step + 1
+        result = self._produce(available=total, total=total)
+        self.reset()
+        return result
+
+    def _compute_frames(self, available):
+        """Extends the computed STFT frames up to `available` (zero-filling past the input)."""
+        computed = self._frame_offset + (0 if self._frames is None else len(self._frames))
+        if available <= computed:
+            return
+        frames = _stft_frames(self.separator, self._samples, computed, available,
+                              offset=self._sample_offset)
+        self._frames = frames if self._frames is None else np.concatenate([self._frames, frames])
+
+    def _produce(self, available, total=None):
+        outputs = {name: [] for name in self.outputs}
+        self._compute_frames(available)
+        while True:
+            first = self._emitted
+            if total is None:
+                last = first + self._block
+                if last + self._lookahead > available:
+                    break
+                window_end = last + self._lookahead
+            else:
+                if first >= total:
+                    break
+                last = min(first + self._block, total)
+                window_end = min(last + self._lookahead, total)
+            window_start = max(window_end - self._window, 0)
+
+            frames = self._frames[window_start - self._frame_offset:window_end - self._frame_offset]
+            masked = _masked_spectrograms(self.separator, frames, self._needed)
+            block = {
+                inst: spec[first - window_start:last - window_start]
+                for inst, spec in masked.items()
+            }
+
+            # As in the chunked separation: prepend the previous frames so the
+            # overlap-add of every output sample is complete
+            out_start = (first - self._overlap) * self._frame_step if self._previous else 0
+            if total is not None and last == total:
+                out_end = self._received
+            else:
+                out_end = (last - self._overlap) * self._frame_step
+            spectrograms = {
+                inst: np.concatenate([self._previous[inst], spec]) if self._previous else spec
+                for inst, spec in block.items()
+            }
+            sources = _render_sources(self.separator, spectrograms, self.stems,
+                                      self.instrumental, out_end - out_start)
+            for name in self.outputs:
+                outputs[name].append(sources[name])
+            self._previous = {inst: spec[-self._overlap:] for inst, spec in block.items()}
+            self._emitted = last
+        self._trim()
+        return {
+            name: (np.concatenate(parts) if parts else np.zeros((0, 2), dtype=np.float32))
+            for name, parts in outputs.items()
+        }
+
+    def _trim(self):
+        """Drops the samples and frames no later window or frame needs."""
+        # The next window ends at least one frame past _emitted (shorter at the end of the stream)
+        keep_frames = max(self._emitted + 1 - self._window, 0)
+        if self._frames is not None and keep_frames > self._frame_offset:
+            self._frames = self._frames[keep_frames - self._frame_offset:]
+            self._frame_offset = keep_frames
+        computed = self._frame_offset + (0 if self._frames is None else len(self._frames))
+        keep_samples = max(computed * self._frame_step - self._frame_length, 0)
+        if keep_samples > self._sample_offset:
+            self._samples = self._samples[keep_samples - self._sample_offset:]
+            self._sample_offset = keep_samples
+
+
+def separate_stream(stream, on_output, stem_number=2, stems=None, instrumental=False,
+                    channels=2, sample_format='s16le', block_seconds=1.0,
+                    lookahead_seconds=0.5, separator=None):
+    """
+    Separates raw PCM read from a binary stream (stdin, a socket file...).
+
+    The input must be at the model's sample rate (44100 Hz).
+
+    Args:
+        stream (file): Binary stream of interleaved little-endian PCM.
+        on_output (callable): Called with a dict of output name to waveform
+                              for every block of stems produced.
+        stem_number (int): Number of stems of the model (2, 4, or 5).
+        stems (list, optional): Stems to produce (default: all).
+        instrumental (bool): Also produce the instrumental mix.
+        channels (int): Number of channels of the input.
+        sample_format (str): "s16le", "s24le" or "f32le".
+        block_seconds (float): Length of the blocks the stems are produced in.
+        lookahead_seconds (float): Audio after each block given to the model.
+        separator (Separator, optional): Separator to use.
+
+    Returns:
+        StreamingSeparator: The separator, e.g. to read its `latency`.
+    """
+    if sample_format not in SAMPLE_FORMATS:
+        raise ValueError(f"Unsupported sample format: {sample_format}")
+    streamer = StreamingSeparator(stem_number, stems=stems, instrumental=instrumental,
+                                  block_seconds=block_seconds,
+                                  lookahead_seconds=lookahead_seconds, separator=separator)
+    frame_bytes = SAMPLE_FORMATS[sample_format][0] * channels
+    read_size = max(int(block_seconds * streamer.sample_rate), 1) * frame_bytes
+    pending = b''
+    while True:
+        data = stream.read(read_size)
+        if not data:
+            break
+        pending += data
+        usable = len(pending) - len(pending) % frame_bytes
+        if usable:
+            result = streamer.process(from_pcm_bytes(pending[:usable], channels, sample_format))
+            pending = pending[usable:]
+            if len(next(iter(result.values()))):
+                on_output(result)
+    result = streamer.flush()
+    if len(next(iter(result.values()))):
+        on_output(result)
+    return streamer
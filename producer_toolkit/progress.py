@@ -0,0 +1,165 @@
+"""
+Progress reporting for Producer Toolkit.
+
+Long-running stages (downloading, decoding, separating, writing) report
+progress as plain dictionaries passed to a callback. Every event carries
+the stage name, the amount of work done and, when the total is known, the
+estimated time remaining. Stages that process audio also report the
+real-time factor (processing time divided by seconds of audio processed).
+
+Example event:
+    {"event": "progress", "stage": "separate", "unit": "seconds",
+     "done": 30.0, "total": 180.0, "elapsed": 3.1, "rtf": 0.103, "eta": 15.5}
+"""
+
+import json
+import sys
+import threading
+import time
+
+
+def json_lines_callback(stream=None):
+    """
+    Creates a progress callback that writes each event as one JSON line.
+
+    Args:
+        stream (file, optional): Stream to write to (default: sys.stderr).
+
+    Returns:
+        callable: Callback accepting a progress event dictionary.
+    """
+    lock = threading.Lock()
+
+    def callback(event):
+        line = json.dumps(event, separators=(',', ':'))
+        with lock:
+            out = stream or sys.stderr
+            out.write(line + '\n')
+            out.flush()
+
+    return callback
+
+
+class ProgressTracker:
+    """
+    Tracks the progress of one stage and forwards events to a callback.
+
+    Args:
+        callback (callable, optional): Receives each event dictionary. If None,
+                                       the tracker does nothing.
+        stage (str): Name of the stage (e.g. "download", "separate").
+        total (float, optional): Total amount of work, if known.
+        unit (str): Unit of work: "seconds" (of audio) or "bytes".
+    """
+
+    def __init__(self, callback, stage, total=None, unit='seconds'):
+        self.callback = callback
+        self.stage = stage
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.started = time.monotonic()
+        self._emit('start')
+
+    def update(self, done=None, total=None, **extra):
+        """
+        Records progress and emits a "progress" event.
+
+        Args:
+            done (float, optional): Amount of work done so far.
+            total (float, optional): Updated total, if it became known.
+            **extra: Additional fields to include in the event.
+        """
+        if done is not None:
+            self.done = done
+        if total is not None:
+            self.total = total
+        self._emit('progress', **extra)
+
+    def advance(self, amount, **extra):
+        """Adds `amount` to the work done and emits a "progress" event."""
+        self.update(self.done + amount, **extra)
+
+    def finish(self, **extra):
+        """Marks the stage complete and emits an "end" event."""
+        if self.total is not None:
+            self.done = self.total
+        self._emit('end', **extra)
+
+    def _emit(self, kind, **extra):
+        if self.callback is None:
+            return
+        elapsed = time.monotonic() - self.started
+        event = {
+            'event': kind,
+            'stage': self.stage,
+            'unit': self.unit,
+            'done': self.done,
+            'total': self.total,
+            'elapsed': round(elapsed, 3),
+        }
+        if self.done and elapsed > 0:
+            if self.unit == 'seconds':
+                event['rtf'] = round(elapsed / self.done, 4)
+            if self.total is not None:
+                remaining = max(self.total - self.done, 0)
+                event['eta'] = round(remaining * elapsed / self.done, 3)
+        event.update(extra)
+        self.callback(event)
+
+
+def yt_dlp_hook(callback, stage='download'):
+    """
+    Adapts yt-dlp progress hooks into progress events.
+
+    Args:
+        callback (callable): Receives each event dictionary.
+        stage (str): Stage name to report.
+
+    Returns:
+        callable: A hook for yt-dlp's `progress_hooks` option.
+    """
+    trackers = {}
+
+    def hook(status):
+        filename = status.get('filename')
+        tracker = trackers.get(filename)
+        if tracker is None:
+            tracker = trackers[filename] = ProgressTracker(callback, stage, unit='bytes')
+        total = status.get('total_bytes') or status.get('total_bytes_estimate')
+        if status.get('status') == 'downloading':
+            extra = {}
+            if status.get('speed') is not None:
+                extra['speed'] = status['speed']
+            # Prefer yt-dlp's own ETA, which is based on the current speed
+            if status.get('eta') is not None:
+                extra['eta'] = status['eta']
+            tracker.update(status.get('downloaded_bytes') or 0, total, **extra)
+        elif status.get('status') == 'finished':
+            tracker.total = total or tracker.total
+            tracker.finish()
+
+    return hook
+
+
+def postprocessor_hook(callback):
+    """
+    Adapts yt-dlp postprocessor hooks (ffmpeg transcoding) into progress events.
+
+    Args:
+        callback (callable): Receives each event dictionary.
+
+    Returns:
+        callable: A hook for yt-dlp's `postprocessor_hooks` option.
+    """
+    trackers = {}
+
+    def hook(status):
+        name = status.get('postprocessor')
+        if status.get('status') == 'started':
+            trackers[name] = ProgressTracker(callback, 'transcode', unit='files',
+                                             total=1)
+        elif status.get('status') == 'finished' and name in trackers:
+            trackers.pop(name).finish(postprocessor=name)
+
+    return hook
@@ -0,0 +1,185 @@
+"""
+Scheduling of multi-item runs.
+
+A batch processed in input order lets one 90-minute mix hold back every
+short track queued after it. Here the duration of each item is probed up
+front (from the cached file header or video metadata, without downloading),
+and the items are run in an order chosen by a policy:
+
+    fifo      input order
+    sjf       shortest job first, which minimizes the mean completion time
+    priority  highest priority first, shortest first within a priority
+    fair      fair share between submitters: the next job goes to the
+              submitter that has received the least processing time so
+              far, and is that submitter's shortest job
+
+Items whose duration can't be probed run after the others.
+"""
+
+import math
+import shlex
+import time
+
+from .processor.probe import probe_file, probe_link
+
+POLICIES = ("fifo", "sjf", "priority", "fair")
+DEFAULT_POLICY = "sjf"
+
+
+class Job:
+    """
+    An item of a batch run.
+
+    Args:
+        source (str): Link, audio file or folder to process.
+        priority (int): Higher priorities run first with the "priority" policy.
+        submitter (str, optional): Who queued the job, for the "fair" policy.
+        duration (float, optional): Length of the audio in seconds, if known.
+        index (int): Position in the input, used to keep the order stable.
+    """
+
+    def __init__(self, source, priority=0, submitter=None, duration=None, index=0):
+        self.source = source
+        self.priority = priority
+        self.submitter = submitter
+        self.duration = duration
+        self.index = index
+
+    def __repr__(self):
+        return (f"Job({self.source!r}, priority={self.priority}, "
+                f"submitter={self.submitter!r}, duration={self.duration})")
+
+
+def read_batch_file(path):
+    """
+    Reads the jobs of a batch file.
+
+    Each non-empty line holds a link or path, optionally followed by
+    "priority=N" and "submitter=NAME" fields (whitespace separated, quoted
+    like a shell command line). Lines starting with "#" are comments.
+
+    Args:
+        path (str): Path to the batch file.
+
+    Returns:
+        list: The jobs, in file order.
+    """
+    jobs = []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            source, *fields = shlex.split(line)
+            job = Job(source, index=len(jobs))
+            for field in fields:
+                name, _, value = field.partition('=')
+                if name == 'priority':
+                    try:
+                        job.priority = int(value)
+                    except ValueError:
+                        raise ValueError(f"{path}:{line_number}: invalid priority {value!r}")
+                elif name == 'submitter':
+                    job.submitter = value
+                else:
+                    raise ValueError(f"{path}:{line_number}: unknown field {field!r}")
+            jobs.append(job)
+    return jobs
+
+
+def probe_duration(source, metadata_cache=None):
+    """
+    Returns the duration of a job's audio without downloading or decoding it.
+
+    Args:
+        source (str): Link or path to an audio file.
+        metadata_cache (MetadataCache, optional): Cache of video metadata.
+
+    Returns:
+        float: Duration in seconds, or None when it can't be determined.
+    """
+    try:
+        if '://' in source:
+            return probe_link(source, metadata_cache).duration
+        return probe_file(source).duration
+    except Exception:
+        return None
+
+
+def _length(job):
+    return math.inf if job.duration is None else job.duration
+
+
+def order_jobs(jobs, policy=DEFAULT_POLICY):
+    """
+    Orders jobs according to a scheduling policy.
+
+    Args:
+        jobs (list): Jobs with their durations probed.
+        policy (str): "fifo", "sjf", "priority" or "fair".
+
+    Returns:
+        list: The jobs in the order to run them.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown scheduling policy: {policy} (use {', '.join(POLICIES)})")
+    if policy == "fifo":
+        return sorted(jobs, key=lambda job: job.index)
+    if policy == "sjf":
+        return sorted(jobs, key=lambda job: (_length(job), job.index))
+    if policy == "priority":
+        return sorted(jobs, key=lambda job: (-job.priority, _length(job), job.index))
+
+    # Fair share: serve the submitter with the least processing time so far
+    queues = {}
+    for job in sorted(jobs, key=lambda job: (_length(job), job.index)):
+        queues.setdefault(job.submitter, []).append(job)
+    served = dict.fromkeys(queues, 0.0)
+    ordered = []
+    while queues:
+        submitter = min(queues, key=lambda s: (served[s], _length(queues[s][0]),
+                                               queues[s][0].index))
+        job = queues[submitter].pop(0)
+        ordered.append(job)
+        # Unknown durations count as long jobs
+        served[submitter] += job.duration if job.duration is not None else 3600.0
+        if not queues[submitter]:
+            del queues[submitter]
+    return ordered
+
+
+def run_jobs(jobs, handler, policy=DEFAULT_POLICY, metadata_cache=None):
+    """
+    Probes the duration of each job, then runs them in scheduled order.
+
+    A failing job doesn't stop the others.
+
+    Args:
+        jobs (list): Jobs to run (durations that are None are probed).
+        handler (callable): Called with each Job; its return value is the job's result.
+        policy (str): Scheduling policy (see `order_jobs`).
+        metadata_cache (MetadataCache, optional): Cache of video metadata for probing links.
+
+    Returns:
+        list: (job, result, error, completion seconds) for each job, in run order.
+    """
+    for job in jobs:
+        if job.duration is None:
+            job.duration = probe_duration(job.source, metadata_cache)
+    ordered = order_jobs(jobs, policy)
+    print(f"Scheduled {len(ordered)} jobs ({policy}):")
+    for position, job in enumerate(ordered, 1):
+        length = "unknown length" if job.duration is None else f"{job.duration:.0f}s"
+        print(f"  {position}. {job.source} ({length})")
+
+    started = time.monotonic()
+    outcomes = []
+    for job in ordered:
+        result, error = None, None
+        try:
+            result = handler(job)
+        except Exception as e:
+            error = e
+            print(f"Error processing {job.source}: {str(e)}")
+        outcomes.append((job, result, error, time.monotonic() - started))
+    return outcomes
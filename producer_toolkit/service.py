@@ -0,0 +1,248 @@
+"""
+Separation service for multi-threaded hosts.
+
+A web backend that calls `extract_stems` from several request threads
+would load one model per call and compete for CPU and memory. A
+`SeparationService` owns one `Toolkit` (one warm separator per stem
+count) and a worker thread that runs the requests one after another:
+
+- Identical requests in flight (same file, unchanged, same output and
+  options) are coalesced: later callers get the future of the first.
+- Whole-file requests for the same model that arrive within a short
+  window are micro-batched into one model invocation (see
+  producer_toolkit.processor.batch). The batch isn't packed, so each
+  input gets the masks it would get from a separate call.
+- Each request stages its temporary files in a private scratch folder,
+  so requests writing same-named files never collide.
+
+Example:
+    service = SeparationService()
+    # From any thread:
+    stems_dir = service.extract_stems("upload.wav", "stems/1234", stem_number=4)
+"""
+
+import collections
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from .session import Toolkit
+from .staging import staging_dir
+
+# How long the worker waits for more requests to batch with the first one
+DEFAULT_BATCH_WINDOW = 0.05
+DEFAULT_MAX_BATCH = 8
+
+# Options a micro-batched request may have; anything else runs on its own
+_BATCH_OPTIONS = {'stems', 'instrumental'}
+
+
+class _Request:
+    """A queued separation and the future its callers wait on."""
+
+    def __init__(self, audio_path, output_dir, stem_number, kwargs, key):
+        self.audio_path = audio_path
+        self.output_dir = output_dir
+        self.stem_number = stem_number
+        self.kwargs = kwargs
+        self.key = key
+        self.future = Future()
+        self.batch_key = None
+        if isinstance(stem_number, int) and set(kwargs) <= _BATCH_OPTIONS:
+            stems = kwargs.get('stems')
+            self.batch_key = (stem_number, tuple(stems) if stems else None,
+                              bool(kwargs.get('instrumental')))
+
+
+def _request_key(audio_path, output_dir, stem_number, kwargs):
+    """Returns the coalescing key of a request, or None if it must run on its own."""
+    if kwargs.get('progress') is not None:
+        # Every caller expects its own progress events
+        return None
+    try:
+        stat = os.stat(audio_path)
+    except OSError:
+        return None
+    options = tuple(sorted((name, repr(value)) for name, value in kwargs.items()))
+    stem_numbers = (stem_number,) if isinstance(stem_number, int) else tuple(stem_number)
+    return (os.path.abspath(audio_path), stat.st_size, stat.st_mtime_ns,
+            os.path.abspath(output_dir), stem_numbers, options)
+
+
+class SeparationService:
+    """
+    Thread-safe front end that runs separations on one set of warm models.
+
+    Args:
+        toolkit (Toolkit, optional): Session whose separators to use (default:
+                                     a new one, closed with the service).
+        batch_window (float): Seconds to wait for requests to batch together
+                              (0 disables micro-batching).
+        max_batch (int): Maximum number of requests per model invocation.
+        scratch_dir (str, optional): Where per-request scratch folders are
+                                     created (see producer_toolkit.staging).
+    """
+
+    def __init__(self, toolkit=None, batch_window=DEFAULT_BATCH_WINDOW,
+                 max_batch=DEFAULT_MAX_BATCH, scratch_dir=None):
+        self._owns_toolkit = toolkit is None
+        self.toolkit = toolkit or Toolkit()
+        self.batch_window = batch_window
+        self.max_batch = max(max_batch, 1)
+        self.scratch_dir = scratch_dir
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+        self._in_flight = {}
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name='pt-separation-service',
+                                        daemon=True)
+        self._worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, audio_path, output_dir, stem_number=2, **kwargs):
+        """
+        Queues a separation.
+
+        Accepts the same arguments as `processor.extract_stems`.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the output directory.
+        """
+        kwargs.pop('models_dir', None)
+        key = _request_key(audio_path, output_dir, stem_number, kwargs)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Separation service is closed")
+            if key is not None and key in self._in_flight:
+                return self._in_flight[key].future
+            request = _Request(audio_path, output_dir, stem_number, kwargs, key)
+            if key is not None:
+                self._in_flight[key] = request
+            self._queue.append(request)
+            self._condition.notify()
+        return request.future
+
+    def extract_stems(self, audio_path, output_dir, stem_number=2, timeout=None, **kwargs):
+        """
+        Separates an audio file and waits for the result.
+
+        Accepts the same arguments as `processor.extract_stems`.
+
+        Args:
+            timeout (float, optional): Seconds to wait before raising TimeoutError
+                                       (the request keeps running).
+
+        Returns:
+            str: The output directory where stems are saved.
+        """
+        return self.submit(audio_path, output_dir, stem_number, **kwargs).result(timeout)
+
+    def close(self):
+        """Finishes the queued requests, then stops the worker (and the owned session)."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join()
+        if self._owns_toolkit:
+            self.toolkit.close()
+
+    def _next_batch(self):
+        """Waits for a request and collects compatible ones (call with the lock held)."""
+        while not self._queue and not self._closed:
+            self._condition.wait()
+        if not self._queue:
+            return None
+        first = self._queue.popleft()
+        batch = [first]
+        if first.batch_key is None or self.batch_window <= 0:
+            return batch
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            for request in list(self._queue):
+                if len(batch) < self.max_batch and request.batch_key == first.batch_key:
+                    self._queue.remove(request)
+                    batch.append(request)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._closed or len(batch) >= self.max_batch:
+                break
+            self._condition.wait(remaining)
+        return batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                batch = self._next_batch()
+            if batch is None:
+                return
+            running = []
+            for request in batch:
+                if request.future.set_running_or_notify_cancel():
+                    running.append(request)
+                else:
+                    self._forget(request)
+            batch = running
+            if len(batch) > 1:
+                try:
+                    results = self._separate_together(batch)
+                except Exception:
+                    # One bad input shouldn't fail the others: retry them one by one
+                    results = None
+                if results is not None:
+                    for request, result in zip(batch, results):
+                        self._finish(request, result=result)
+                    continue
+            for request in batch:
+                try:
+                    result = self._separate(request)
+                except Exception as e:
+                    self._finish(request, error=e)
+                else:
+                    self._finish(request, result=result)
+
+    def _separate_together(self, batch):
+        """Separates whole-file requests for the same model in one invocation."""
+        from .processor.batch import _separate_batch
+
+        first = batch[0]
+        separator, lock = self.toolkit._separator(first.stem_number)
+        with lock:
+            # Unpacked layout: every input starts on a segment boundary, so its
+            # masks don't depend on the other requests of the batch
+            _separate_batch(separator, [request.audio_path for request in batch], None,
+                            pack=False, governor=self.toolkit.governor,
+                            stems_dirs=[request.output_dir for request in batch],
+                            **first.kwargs)
+        return [request.output_dir for request in batch]
+
+    def _separate(self, request):
+        """Runs one request with its own scratch folder."""
+        kwargs = dict(request.kwargs)
+        if kwargs.get('checkpoint'):
+            # Checkpoints must outlive the request to be resumed
+            return self.toolkit.extract_stems(request.audio_path, request.output_dir,
+                                              request.stem_number, **kwargs)
+        os.makedirs(request.output_dir, exist_ok=True)
+        with staging_dir(request.output_dir, kwargs.get('scratch_dir', self.scratch_dir),
+                         prefix=".pt-request-") as scratch:
+            kwargs['scratch_dir'] = scratch
+            return self.toolkit.extract_stems(request.audio_path, request.output_dir,
+                                              request.stem_number, **kwargs)
+
+    def _forget(self, request):
+        """Stops coalescing new requests with a finished or cancelled one."""
+        with self._condition:
+            if request.key is not None and self._in_flight.get(request.key) is request:
+                del self._in_flight[request.key]
+
+    def _finish(self, request, result=None, error=None):
+        self._forget(request)
+        if error is not None:
+            request.future.set_exception(error)
+        else:
+            request.future.set_result(result)
@@ -0,0 +1,292 @@
+"""
+Session-style API for Producer Toolkit.
+
+The module-level functions (`download_audio`, `download_video`,
+`extract_stems`) create fresh yt-dlp and Spleeter objects on every call.
+A `Toolkit` keeps them alive instead, so services that embed the toolkit
+pay for extractor setup, HTTP connections and model loading only once.
+
+Example:
+    with Toolkit() as toolkit:
+        paths = toolkit.download_audio_batch(urls, "downloads")
+        for path in paths:
+            toolkit.extract_stems(path, "stems", stem_number=4)
+"""
+
+import contextlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+
+from .downloader.download import (
+    _audio_options, _video_options, _section_options, _download_audio_with,
+    _download_with, _downloaded_path,
+)
+from .progress import yt_dlp_hook, postprocessor_hook
+
+# Arguments `extract_stems_batch` can hand to batched separation, and those only it accepts
+_BATCH_ARGS = {'stems', 'instrumental', 'gap_frames', 'max_segments', 'pack', 'progress',
+               'governor'}
+_BATCH_ONLY_ARGS = {'gap_frames', 'max_segments', 'pack'}
+
+
+class _Downloader:
+    """A long-lived YoutubeDL instance, used by one call at a time."""
+
+    def __init__(self, ydl_opts):
+        ydl_opts = dict(ydl_opts)
+        # Hooks are registered once; they forward to the callback of the current call
+        ydl_opts['progress_hooks'] = [self._on_progress]
+        ydl_opts['postprocessor_hooks'] = [self._on_postprocess]
+        self.ydl = yt_dlp.YoutubeDL(ydl_opts)
+        self._progress_hook = None
+        self._postprocessor_hook = None
+
+    def set_progress(self, progress):
+        """Routes hook events of the next call to `progress`."""
+        self._progress_hook = yt_dlp_hook(progress) if progress else None
+        self._postprocessor_hook = postprocessor_hook(progress) if progress else None
+
+    def set_section(self, start=None, end=None):
+        """Restricts the next call to a time range."""
+        for key in ('download_ranges', 'force_keyframes_at_cuts'):
+            self.ydl.params.pop(key, None)
+        self.ydl.params.update(_section_options(start, end))
+
+    def _on_progress(self, status):
+        if self._progress_hook:
+            self._progress_hook(status)
+
+    def _on_postprocess(self, status):
+        if self._postprocessor_hook:
+            self._postprocessor_hook(status)
+
+    def close(self):
+        self.ydl.close()
+
+
+class Toolkit:
+    """
+    Holds long-lived downloader and separator instances.
+
+    All methods are thread-safe. Downloaders are pooled per kind and output
+    location: each is used by one call at a time, and up to `max_workers`
+    idle ones are kept, so parallel downloads to the same place don't wait
+    for each other. Each separator (one per stem count) is used by one call
+    at a time; calls on different separators run in parallel.
+
+    Args:
+        output_dir (str, optional): Default output directory for downloads.
+        cookiefile (str, optional): Netscape cookie file shared by all downloads.
+        cachedir (str, optional): yt-dlp cache directory shared by all downloads.
+        max_workers (int): Number of parallel workers used by the batch methods.
+        metadata_cache (MetadataCache, optional): Reuse cached video metadata
+                                                  instead of re-running the extractor.
+        memory_budget (int or str, optional): RAM budget shared by the session's
+                                              separations, e.g. "8G" (default: the
+                                              process-wide budget).
+    """
+
+    def __init__(self, output_dir=None, cookiefile=None, cachedir=None, max_workers=4,
+                 metadata_cache=None, memory_budget=None):
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.metadata_cache = metadata_cache
+        self.governor = None
+        if memory_budget:
+            from .processor.memory import MemoryGovernor
+
+            self.governor = MemoryGovernor(memory_budget)
+        self._shared_opts = {}
+        if cookiefile:
+            self._shared_opts['cookiefile'] = cookiefile
+        if cachedir:
+            self._shared_opts['cachedir'] = cachedir
+        self._lock = threading.Lock()
+        self._downloaders = {}
+        self._separators = {}
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Releases the downloaders and separators held by the session."""
+        with self._lock:
+            self._closed = True
+            downloaders = [downloader for idle in self._downloaders.values() for downloader in idle]
+            self._downloaders.clear()
+            self._separators.clear()
+        # Downloaders in use are closed when their call returns them
+        for downloader in downloaders:
+            downloader.close()
+
+    @contextlib.contextmanager
+    def _downloader(self, kind, output_path):
+        """
+        Checks out a pooled downloader for a kind/location for the duration of a call.
+
+        Yields:
+            tuple: (downloader, return path template).
+        """
+        if kind == 'audio':
+            ydl_opts, template = _audio_options(output_path)
+        else:
+            ydl_opts, template = _video_options(output_path)
+        ydl_opts.update(self._shared_opts)
+        key = (kind, ydl_opts['outtmpl'])
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Toolkit session is closed")
+            idle = self._downloaders.setdefault(key, [])
+            downloader = idle.pop() if idle else None
+        if downloader is None:
+            downloader = _Downloader(ydl_opts)
+        try:
+            yield downloader, template
+        finally:
+            downloader.set_progress(None)
+            with self._lock:
+                idle = None if self._closed else self._downloaders.setdefault(key, [])
+                if idle is not None and len(idle) < self.max_workers:
+                    idle.append(downloader)
+                    downloader = None
+            if downloader is not None:
+                downloader.close()
+
+    def _separator(self, stem_number):
+        """Returns the cached separator for a stem count, with its lock."""
+        # Imported lazily: loading Spleeter pulls in TensorFlow, which
+        # download-only sessions never need
+        from .processor.spleeter_processor import _create_separator
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Toolkit session is closed")
+            entry = self._separators.get(stem_number)
+            if entry is None:
+                entry = self._separators[stem_number] = (
+                    _create_separator(stem_number), threading.Lock()
+                )
+        return entry
+
+    def download_audio(self, url, output_path=None, start=None, end=None, progress=None):
+        """
+        Downloads a video's audio as WAV. See `downloader.download_audio`.
+
+        Returns:
+            str: Path to the downloaded WAV file.
+        """
+        location = output_path or self.output_dir
+        with self._downloader('audio', location) as (downloader, return_path):
+            downloader.set_section(start, end)
+            downloader.set_progress(progress)
+            return _download_audio_with(downloader.ydl, url, return_path, self.metadata_cache)
+
+    def download_video(self, url, output_path=None, start=None, end=None, progress=None):
+        """
+        Downloads a video as MP4. See `downloader.download_video`.
+
+        Returns:
+            str: Path to the downloaded MP4 file.
+        """
+        location = output_path or self.output_dir
+        with self._downloader('video', location) as (downloader, template):
+            downloader.set_section(start, end)
+            downloader.set_progress(progress)
+            info_dict = _download_with(downloader.ydl, url, self.metadata_cache)
+            return _downloaded_path(info_dict, template)
+
+    def extract_stems(self, audio_path, output_dir, stem_number=2, **kwargs):
+        """
+        Splits an audio file into stems with the session's warm separators.
+
+        Accepts the same arguments as `processor.extract_stems`.
+
+        Returns:
+            str: The output directory where stems are saved.
+        """
+        from .processor.spleeter_processor import _extract, _stem_numbers
+
+        kwargs.pop('models_dir', None)
+        kwargs.setdefault('governor', self.governor)
+        stem_numbers = _stem_numbers(stem_number)
+        entries = [self._separator(number) for number in stem_numbers]
+        locks = [lock for _, lock in entries]
+        # Always lock in stem-count order so concurrent multi-model calls cannot deadlock
+        for _, lock in sorted(zip(stem_numbers, locks)):
+            lock.acquire()
+        try:
+            return _extract([separator for separator, _ in entries], stem_numbers,
+                            audio_path, output_dir, **kwargs)
+        finally:
+            for lock in locks:
+                lock.release()
+
+    def _map(self, fn, items):
+        """Applies fn to every item on the session's worker pool, preserving order."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(fn, items))
+
+    def download_audio_batch(self, urls, output_path=None, **kwargs):
+        """
+        Downloads the audio of several videos in parallel.
+
+        Returns:
+            list: Paths to the downloaded WAV files, in the order of `urls`.
+        """
+        return self._map(lambda url: self.download_audio(url, output_path, **kwargs), urls)
+
+    def download_video_batch(self, urls, output_path=None, **kwargs):
+        """
+        Downloads several videos in parallel.
+
+        Returns:
+            list: Paths to the downloaded MP4 files, in the order of `urls`.
+        """
+        return self._map(lambda url: self.download_video(url, output_path, **kwargs), urls)
+
+    def extract_stems_batch(self, audio_paths, output_dir, stem_number=2, **kwargs):
+        """
+        Splits several audio files into stems, each in "<output_dir>/<name>_stems".
+
+        For a single stem count, and arguments batching supports (`stems`,
+        `instrumental`, `progress`, `governor` and the batch layout options
+        `gap_frames`, `max_segments`, `pack`), the inputs are separated with
+        batched model invocations (see `processor.batch.separate_batch`).
+        Otherwise each file goes through `extract_stems`, which accepts its
+        other arguments (offset, fingerprint_index, save_masks...).
+
+        Returns:
+            list: The stem directories, in the order of `audio_paths`.
+
+        Raises:
+            TypeError: If batch layout options are combined with arguments
+                       only the per-file path supports.
+        """
+        kwargs.pop('models_dir', None)
+        kwargs.setdefault('governor', self.governor)
+        if isinstance(stem_number, int) and kwargs.keys() <= _BATCH_ARGS:
+            from .processor.batch import _separate_batch
+
+            separator, lock = self._separator(stem_number)
+            with lock:
+                return _separate_batch(separator, list(audio_paths), output_dir, **kwargs)
+
+        batch_only = _BATCH_ONLY_ARGS & kwargs.keys()
+        if batch_only:
+            unsupported = sorted(kwargs.keys() - _BATCH_ARGS) or ["several stem counts"]
+            raise TypeError(f"{', '.join(sorted(batch_only))} only apply to batched separation, "
+                            f"which doesn't support {', '.join(unsupported)}")
+
+        def extract(audio_path):
+            filename = os.path.splitext(os.path.basename(audio_path))[0]
+            stems_dir = os.path.join(output_dir, f"{filename}_stems")
+            return self.extract_stems(audio_path, stems_dir, stem_number, **kwargs)
+
+        return self._map(extract, audio_paths)
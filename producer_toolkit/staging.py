@@ -0,0 +1,125 @@
+"""
+Staging of intermediate files and atomic commits of outputs.
+
+Temporary files are placed on the same filesystem as the outputs (a
+hidden directory inside the output directory by default), so finished
+files are committed with a rename instead of a copy. Readers of the
+output directory never see a partially written file.
+
+The scratch location can be overridden with the `scratch_dir` arguments
+or the PT_SCRATCH_DIR environment variable, e.g. to use a fast local disk
+that shares a filesystem with the outputs.
+"""
+
+import contextlib
+import errno
+import os
+import secrets
+import shutil
+import stat
+import tempfile
+
+SCRATCH_DIR_ENV = "PT_SCRATCH_DIR"
+
+
+def scratch_root(output_dir, scratch_dir=None):
+    """
+    Returns the directory under which staging directories are created.
+
+    Args:
+        output_dir (str): Directory the results will be committed to.
+        scratch_dir (str, optional): Explicit scratch directory.
+
+    Returns:
+        str: scratch_dir, else $PT_SCRATCH_DIR, else output_dir.
+    """
+    return scratch_dir or os.environ.get(SCRATCH_DIR_ENV) or output_dir
+
+
+@contextlib.contextmanager
+def staging_dir(output_dir, scratch_dir=None, prefix=".pt-staging-"):
+    """
+    Creates a unique staging directory and removes it afterwards.
+
+    Each call gets its own directory, so concurrent jobs writing to the
+    same output directory never collide.
+
+    Args:
+        output_dir (str): Directory the results will be committed to.
+        scratch_dir (str, optional): Explicit scratch directory (see `scratch_root`).
+        prefix (str): Name prefix of the staging directory.
+
+    Yields:
+        str: Path of the staging directory.
+    """
+    root = scratch_root(output_dir, scratch_dir)
+    os.makedirs(root, exist_ok=True)
+    path = tempfile.mkdtemp(prefix=prefix, dir=root)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def commit_file(src_path, dst_path):
+    """
+    Atomically moves a finished file into place.
+
+    A rename when both paths share a filesystem; otherwise the file is
+    copied next to the destination first and then renamed, so dst_path
+    only ever appears complete.
+
+    Args:
+        src_path (str): The finished file.
+        dst_path (str): Its final location (replaced if it exists).
+    """
+    try:
+        os.replace(src_path, dst_path)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    with atomic_path(dst_path) as tmp_path:
+        shutil.copy2(src_path, tmp_path)
+    os.remove(src_path)
+
+
+@contextlib.contextmanager
+def atomic_path(dst_path):
+    """
+    Yields a temporary path next to dst_path and renames it into place on success.
+
+    Args:
+        dst_path (str): Final location of the file.
+
+    Yields:
+        str: Temporary path to write the file to.
+    """
+    directory, name = os.path.split(os.path.abspath(dst_path))
+    os.makedirs(directory, exist_ok=True)
+    # Keep the extension last so tools that infer the format from it still work
+    stem, extension = os.path.splitext(name)
+    while True:
+        tmp_path = os.path.join(directory, f".{stem}.{secrets.token_hex(4)}.part{extension}")
+        try:
+            # Created like any new file (0666 less the umask), unlike mkstemp's private 0600
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            break
+        except FileExistsError:
+            continue
+    try:
+        mode = stat.S_IMODE(os.fstat(fd).st_mode)
+    finally:
+        os.close(fd)
+    # A replaced file keeps its permissions
+    with contextlib.suppress(OSError):
+        mode = stat.S_IMODE(os.stat(dst_path).st_mode)
+    try:
+        yield tmp_path
+        # Only once written, in case the mode is read-only
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
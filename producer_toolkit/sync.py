@@ -0,0 +1,249 @@
+"""
+Incremental sync of playlists and drop folders.
+
+Re-running a daily job on the same playlist or folder used to download and
+separate everything again. A sync keeps a state file recording what was
+processed, and only hands new or changed items to the handler:
+
+- Playlist items are identified by their video ID, listed with one flat
+  playlist request (no per-video extraction).
+- Folder files are identified by their path. A file whose size and
+  modification time are unchanged is skipped after a stat; otherwise its
+  content hash is compared with the recorded one, so a touched or copied
+  file isn't processed again.
+
+The cost of a run is then proportional to what changed, not to the size of
+the library. `watch` repeats a sync at a fixed interval (polling, which
+works on every platform and on network shares).
+
+Items are recorded once their handler succeeds, so a failing item doesn't
+hold back the others; failed items are retried by the next run.
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+from .staging import atomic_path
+
+# Files modified more recently than this may still be being copied
+DEFAULT_SETTLE_SECONDS = 5.0
+DEFAULT_WATCH_INTERVAL = 60.0
+
+_HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def default_state_path(source, output_dir):
+    """
+    Returns the default state file of a sync: a hidden file in the output directory.
+
+    Args:
+        source (str): Playlist link or folder being synced.
+        output_dir (str): Directory the results are written to.
+
+    Returns:
+        str: Path of the state file (one per source).
+    """
+    if os.path.isdir(source):
+        source = os.path.abspath(source)
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(output_dir, f".pt-sync-{digest}.json")
+
+
+class SyncState:
+    """
+    Processed items of a sync, persisted as JSON.
+
+    Args:
+        path (str): State file (created on the first save).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.items = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.items = json.load(f).get('items', {})
+
+    def get(self, key):
+        """Returns the record of an item, or None if it was never processed."""
+        return self.items.get(key)
+
+    def record(self, key, **fields):
+        """Records an item as processed (call `save` to persist)."""
+        self.items[key] = dict(fields, processed=datetime.now().isoformat(timespec='seconds'))
+
+    def save(self):
+        """Writes the state file atomically, so an interrupted run can't corrupt it."""
+        with atomic_path(self.path) as tmp_path:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'items': self.items}, f, indent=2, sort_keys=True)
+
+
+def file_hash(path):
+    """Returns the SHA-1 of a file's content, read block by block."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sync_folder(folder, handler, state, extensions=None, settle_seconds=DEFAULT_SETTLE_SECONDS):
+    """
+    Processes the files of a folder that are new or changed since the last sync.
+
+    The new files are handed to the handler together; if that fails, each
+    is retried on its own, so one bad file doesn't hold back the others.
+    Files that still fail are retried by the next sync.
+
+    Args:
+        folder (str): Folder to sync (not recursive).
+        handler (callable): Called with a list of new or changed file paths;
+                            raises if they couldn't be processed.
+        state (SyncState): Processed files, updated as files succeed and saved
+                           when the sync ends, even if it is interrupted.
+        extensions (set, optional): Lowercase extensions to pick up, e.g. {".wav"}
+                                    (default: every file).
+        settle_seconds (float): Skip files modified more recently than this; they
+                                are picked up once they stop changing.
+
+    Returns:
+        tuple: (paths processed, paths that failed).
+    """
+    processed, failed = [], []
+    changed = {}
+
+    def process(names):
+        handler([changed[name][0] for name in names])
+        for name in names:
+            path, stat, content = changed[name]
+            state.record(name, size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha1=content)
+            processed.append(path)
+
+    try:
+        now = time.time()
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if not os.path.isfile(path) or name.startswith('.'):
+                continue
+            if extensions is not None and os.path.splitext(name)[1].lower() not in extensions:
+                continue
+            stat = os.stat(path)
+            if now - stat.st_mtime < settle_seconds:
+                continue
+            record = state.get(name)
+            if record and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+                continue
+            content = file_hash(path)
+            if record and record['sha1'] == content:
+                # Touched or copied over, same content: just refresh the stat
+                state.record(name, size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha1=content)
+                continue
+            changed[name] = (path, stat, content)
+
+        if not changed:
+            print(f"Sync: {folder} is up to date")
+            return processed, failed
+        print(f"Sync: {len(changed)} new or changed file(s) in {folder}")
+        try:
+            process(list(changed))
+        except Exception as e:
+            if len(changed) == 1:
+                path = next(iter(changed.values()))[0]
+                print(f"Error processing {path}: {str(e)}")
+                failed.append(path)
+            else:
+                print(f"Sync: processing the files together failed ({str(e)}), "
+                      f"retrying them one by one")
+                for name in changed:
+                    try:
+                        process([name])
+                    except Exception as e:
+                        print(f"Error processing {changed[name][0]}: {str(e)}")
+                        failed.append(changed[name][0])
+        return processed, failed
+    finally:
+        state.save()
+
+
+def list_playlist(url):
+    """
+    Lists the videos of a playlist (or channel) without extracting each of them.
+
+    Args:
+        url (str): Playlist URL; a single video URL gives a single entry.
+
+    Returns:
+        list: (video ID, video URL, title) of each entry, in playlist order.
+    """
+    import yt_dlp
+
+    options = {'extract_flat': 'in_playlist', 'quiet': True, 'no_warnings': True}
+    with yt_dlp.YoutubeDL(options) as ydl:
+        info = ydl.extract_info(url, download=False)
+    entries = info.get('entries')
+    if entries is None:
+        return [(info['id'], info.get('webpage_url') or url, info.get('title'))]
+    listed = []
+    for entry in entries:
+        if not entry or not entry.get('id'):
+            continue  # Private or deleted videos
+        video_url = entry.get('webpage_url') or entry.get('url')
+        if not video_url or '://' not in video_url:
+            video_url = f"https://www.youtube.com/watch?v={entry['id']}"
+        listed.append((entry['id'], video_url, entry.get('title')))
+    return listed
+
+
+def sync_playlist(url, handler, state):
+    """
+    Processes the videos of a playlist that weren't processed by a previous sync.
+
+    A failing video doesn't stop the others; it is retried by the next sync.
+
+    Args:
+        url (str): Playlist URL.
+        handler (callable): Called with the URL of each new video.
+        state (SyncState): Processed videos, saved after each success.
+
+    Returns:
+        tuple: (URLs processed, URLs that failed).
+    """
+    entries = list_playlist(url)
+    new = [(video_id, video_url, title) for video_id, video_url, title in entries
+           if state.get(video_id) is None]
+    print(f"Sync: {len(new)} new of {len(entries)} item(s) in {url}")
+    processed, failed = [], []
+    for video_id, video_url, title in new:
+        try:
+            handler(video_url)
+        except Exception as e:
+            print(f"Error processing {video_url}: {str(e)}")
+            failed.append(video_url)
+            continue
+        state.record(video_id, url=video_url, title=title)
+        state.save()
+        processed.append(video_url)
+    return processed, failed
+
+
+def watch(sync_once, interval=DEFAULT_WATCH_INTERVAL):
+    """
+    Runs a sync, then runs it again every `interval` seconds until interrupted.
+
+    Errors of a sync (e.g. the network being down) are reported and the
+    next sync is attempted as usual.
+
+    Args:
+        sync_once (callable): Runs one sync.
+        interval (float): Seconds between the end of a sync and the next one.
+    """
+    while True:
+        try:
+            sync_once()
+        except Exception as e:
+            print(f"Sync failed: {str(e)}")
+        time.sleep(interval)
@@ -0,0 +1,1445 @@
+#!/usr/bin/env python3
+"""
+Component Testing Script for Producer Toolkit
+
+This script tests the building blocks of the toolkit that need neither the
+Spleeter models nor a network connection (staging of outputs, memory
+budget, batching, caches, scheduling...), on small synthetic inputs.
+
+Instructions:
+1. Activate your conda environment: conda activate producer-toolkit
+2. Run this script: python -m tests.local.test_components
+"""
+
+import os
+import sys
+import stat
+import platform
+import tempfile
+import traceback
+from pathlib import Path
+from datetime import datetime
+
+# Make sure the package root is in sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+def print_step(message):
+    """Print a formatted step message."""
+    print(f"\n{'=' * 50}")
+    print(f"  {message}")
+    print(f"{'=' * 50}")
+
+def run_test(name, test):
+    """Run one test function, which raises AssertionError on failure."""
+    print_step(f"Testing {name}")
+    try:
+        test()
+    except AssertionError as e:
+        print(f"❌ ERROR: {name}: {str(e) or traceback.format_exc(limit=-1).strip()}")
+        return False
+    except Exception as e:
+        print(f"❌ ERROR: {name} failed with exception: {e!r}")
+        traceback.print_exc()
+        return False
+    print(f"✅ SUCCESS: {name}")
+    return True
+
+# ---------------------------------------------------------------------------
+# Staging and atomic commits
+# ---------------------------------------------------------------------------
+
+def test_atomic_commit():
+    """Committed files appear complete, with the usual permissions, and nothing is left behind."""
+    from producer_toolkit.staging import atomic_path, commit_file, staging_dir
+
+    umask = os.umask(0o022)
+    os.umask(umask)
+    with tempfile.TemporaryDirectory() as work_dir:
+        target = os.path.join(work_dir, "out", "stem.wav")
+        with atomic_path(target) as tmp_path:
+            assert os.path.dirname(tmp_path) == os.path.dirname(target), "temp file not next to target"
+            assert tmp_path.endswith(".wav"), "temp file lost its extension"
+            assert not os.path.exists(target), "target visible before commit"
+            with open(tmp_path, "w") as f:
+                f.write("data")
+        assert open(target).read() == "data"
+        mode = stat.S_IMODE(os.stat(target).st_mode)
+        assert mode == 0o666 & ~umask, f"committed file has mode {oct(mode)}, expected {oct(0o666 & ~umask)}"
+
+        # Replacing a file keeps its permissions
+        os.chmod(target, 0o640)
+        with atomic_path(target) as tmp_path:
+            with open(tmp_path, "w") as f:
+                f.write("new")
+        assert stat.S_IMODE(os.stat(target).st_mode) == 0o640, "replaced file lost its mode"
+
+        # A failed write leaves the previous file and no temporary file
+        try:
+            with atomic_path(target) as tmp_path:
+                with open(tmp_path, "w") as f:
+                    f.write("partial")
+                raise RuntimeError("interrupted")
+        except RuntimeError:
+            pass
+        assert open(target).read() == "new", "failed write replaced the target"
+        assert os.listdir(os.path.dirname(target)) == ["stem.wav"], "temporary file left behind"
+
+        # Staged files are committed with their permissions, and the staging folder is removed
+        with staging_dir(work_dir) as scratch:
+            staged = os.path.join(scratch, "song.wav")
+            with atomic_path(staged) as tmp_path:
+                with open(tmp_path, "w") as f:
+                    f.write("song")
+            commit_file(staged, os.path.join(work_dir, "song.wav"))
+        mode = stat.S_IMODE(os.stat(os.path.join(work_dir, "song.wav")).st_mode)
+        assert mode == 0o666 & ~umask, f"committed file has mode {oct(mode)}"
+        assert sorted(os.listdir(work_dir)) == ["out", "song.wav"], os.listdir(work_dir)
+
+# ---------------------------------------------------------------------------
+# Spectrogram cache
+# ---------------------------------------------------------------------------
+
+def test_spectrogram_cache():
+    """The cache stays within its bound and drops a file's spectrograms once tagged."""
+    import numpy as np
+    from producer_toolkit.processor.spectrogram import MIX, Spectrogram, SpectrogramCache
+
+    def spectrogram(frames=10):
+        return Spectrogram(np.zeros((frames, 8, 2), dtype=np.complex64), 44100, 4096, 1024)
+
+    size = spectrogram().nbytes
+    cache = SpectrogramCache(max_bytes=3 * size)
+    cache.put("a.wav", MIX, spectrogram())
+    cache.put("a.wav", "vocals", spectrogram(), stem_number=2)
+    cache.put("b.wav", MIX, spectrogram())
+    cache.get("a.wav")  # Most recently used, so kept
+    cache.put("b.wav", "vocals", spectrogram(), stem_number=2)
+    assert cache.get("a.wav", "vocals", 2) is None, "least recently used entry not evicted"
+    assert cache.names("a.wav", 2) == [MIX], cache.names("a.wav", 2)
+    assert cache.names("b.wav", 2) == [MIX, "vocals"], cache.names("b.wav", 2)
+
+    cache.discard("b.wav")
+    assert cache.names("b.wav", 2) == [], "discarded entries still cached"
+    assert cache._size == size, f"cache size is {cache._size}, expected {size}"
+
+# ---------------------------------------------------------------------------
+# Toolkit sessions
+# ---------------------------------------------------------------------------
+
+def test_session():
+    """Parallel downloads use separate pooled downloaders; batch arguments are routed safely."""
+    import time
+    import threading
+    import types
+    from producer_toolkit import session
+
+    created = []
+
+    class FakeYoutubeDL:
+        def __init__(self, params):
+            self.params = dict(params)
+            self.closed = False
+            created.append(self)
+
+        def close(self):
+            self.closed = True
+
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def fake_download(ydl, url, return_path, metadata_cache):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        return f"{url}.wav"
+
+    saved = session.yt_dlp, session._download_audio_with
+    session.yt_dlp = types.SimpleNamespace(YoutubeDL=FakeYoutubeDL)
+    session._download_audio_with = fake_download
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            toolkit = session.Toolkit(output_dir=work_dir, max_workers=3)
+            urls = [f"video{i}" for i in range(6)]
+            assert toolkit.download_audio_batch(urls) == [f"{url}.wav" for url in urls]
+            assert active["max"] == 3, f"{active['max']} downloads ran at once, expected 3"
+            assert len(created) == 3, f"{len(created)} downloaders created, expected 3"
+            # Warm downloaders are reused
+            toolkit.download_audio("again")
+            assert len(created) == 3, "idle downloader not reused"
+            toolkit.close()
+            assert all(ydl.closed for ydl in created), "downloaders left open"
+
+            # Arguments batching doesn't support go through the per-file path
+            toolkit = session.Toolkit()
+            calls = []
+
+            def fake_extract(audio_path, stems_dir, stem_number, **kwargs):
+                calls.append(kwargs)
+                return stems_dir
+
+            toolkit.extract_stems = fake_extract
+            dirs = toolkit.extract_stems_batch(["a.wav", "b.wav"], "out", 2,
+                                               fingerprint_index=object(), checkpoint=True)
+            assert dirs == [os.path.join("out", "a_stems"), os.path.join("out", "b_stems")], dirs
+            assert len(calls) == 2 and calls[0]["checkpoint"], calls
+            try:
+                toolkit.extract_stems_batch(["a.wav"], "out", 2, pack=False, save_masks=True)
+            except TypeError as e:
+                assert "save_masks" in str(e), str(e)
+            else:
+                raise AssertionError("batch-only argument combined with save_masks was accepted")
+    finally:
+        session.yt_dlp, session._download_audio_with = saved
+
+# ---------------------------------------------------------------------------
+# Batched separation layout
+# ---------------------------------------------------------------------------
+
+def test_batch_layout():
+    """Packed inputs never overlap, unpacked inputs start on segment boundaries."""
+    from producer_toolkit.processor.batch import _batches, _plan_layout
+
+    segment_frames, gap_frames = 8, 1
+    frame_counts = [3, 3, 20, 2, 8, 1, 5]
+
+    units = _plan_layout(frame_counts, segment_frames, gap_frames, pack=True)
+    placed = sorted(index for _, members in units for index, _ in members)
+    assert placed == list(range(len(frame_counts))), f"inputs placed {placed}"
+    for num_segments, members in units:
+        if len(members) > 1:
+            assert num_segments == 1, "inputs sharing a unit span several segments"
+        spans = sorted((offset, offset + frame_counts[index]) for index, offset in members)
+        assert spans[-1][1] <= num_segments * segment_frames, f"unit overflows: {spans}"
+        for (_, end), (start, _) in zip(spans, spans[1:]):
+            assert start - end >= gap_frames, f"inputs closer than the gap: {spans}"
+    assert len(units) < len(frame_counts), "short inputs were not packed"
+
+    units = _plan_layout(frame_counts, segment_frames, gap_frames, pack=False)
+    assert len(units) == len(frame_counts), "unpacked inputs share units"
+    for num_segments, [(index, offset)] in units:
+        assert offset == 0, "unpacked input doesn't start on a segment boundary"
+        assert num_segments == max(-(-frame_counts[index] // segment_frames), 1)
+
+    batches = list(_batches([(3, []), (2, []), (1, []), (4, []), (6, [])], max_segments=5))
+    sizes = [[unit[0] for unit in batch] for batch in batches]
+    assert sizes == [[3, 2], [1, 4], [6]], f"batches {sizes}"
+
+# ---------------------------------------------------------------------------
+# Incremental sync
+# ---------------------------------------------------------------------------
+
+def test_sync_folder():
+    """Only new or changed files reach the handler; touched files are recognized by content."""
+    import time
+    from producer_toolkit.sync import SyncState, sync_folder
+
+    with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as out:
+        state_path = os.path.join(out, "state.json")
+        settled = time.time() - 100
+
+        def write(name, content):
+            path = os.path.join(folder, name)
+            with open(path, "w") as f:
+                f.write(content)
+            os.utime(path, (settled, settled))
+
+        calls = []
+
+        def handler(paths):
+            calls.append(sorted(os.path.basename(path) for path in paths))
+
+        write("a.wav", "a")
+        write("b.wav", "b")
+        write("notes.txt", "not audio")
+        write(".hidden.wav", "hidden")
+        with open(os.path.join(folder, "copying.wav"), "w") as f:
+            f.write("still being written")
+        sync_folder(folder, handler, SyncState(state_path), extensions={".wav"})
+        assert calls == [["a.wav", "b.wav"]], calls
+
+        # Nothing changed; a touched file with the same content isn't processed again
+        os.utime(os.path.join(folder, "a.wav"), (settled + 5, settled + 5))
+        sync_folder(folder, handler, SyncState(state_path), extensions={".wav"})
+        assert len(calls) == 1, calls
+
+        # Changed content and settled files are picked up, with the state reloaded from disk
+        write("b.wav", "changed")
+        os.utime(os.path.join(folder, "copying.wav"), (settled, settled))
+        sync_folder(folder, handler, SyncState(state_path), extensions={".wav"})
+        assert calls[-1] == ["b.wav", "copying.wav"], calls
+
+        # A bad file doesn't hold back the others: they are retried one by one
+        write("c.wav", "c")
+        write("d.wav", "d")
+        write("bad.wav", "undecodable")
+        os.utime(os.path.join(folder, "a.wav"), (settled + 9, settled + 9))
+
+        def failing(paths):
+            if any(path.endswith("bad.wav") for path in paths):
+                raise RuntimeError("separation failed")
+            handler(paths)
+
+        processed, failed = sync_folder(folder, failing, SyncState(state_path), extensions={".wav"})
+        assert [os.path.basename(path) for path in failed] == ["bad.wav"], failed
+        assert calls[-2:] == [["c.wav"], ["d.wav"]], calls
+        assert len(processed) == 2, processed
+        # Only the failed file is retried, and the touched file's new stat was saved
+        calls.clear()
+        state = SyncState(state_path)
+        assert state.get("a.wav")["mtime_ns"] == os.stat(os.path.join(folder, "a.wav")).st_mtime_ns
+        assert sync_folder(folder, handler, state, extensions={".wav"})[1] == []
+        assert calls == [["bad.wav"]], calls
+
+# ---------------------------------------------------------------------------
+# Metadata cache
+# ---------------------------------------------------------------------------
+
+def test_metadata_cache():
+    """Entries are shared between link forms and expire; no cache means no extraction reuse."""
+    import time
+    import types
+    from producer_toolkit.downloader import metadata
+
+    extractions = []
+
+    class FakeYoutubeDL:
+        def __init__(self, params):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            pass
+
+        def extract_info(self, url, download):
+            extractions.append(url)
+            return {"id": "dQw4w9WgXcQ", "extractor_key": "Youtube", "title": "Song"}
+
+        def sanitize_info(self, info, remove_private_keys):
+            return info
+
+    saved = metadata.yt_dlp
+    metadata.yt_dlp = types.SimpleNamespace(YoutubeDL=FakeYoutubeDL)
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = metadata.MetadataCache(cache_dir, ttl=60)
+            metadata.fetch_info("https://youtu.be/dQw4w9WgXcQ", cache)
+            info = metadata.fetch_info("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=10", cache)
+            assert info["title"] == "Song"
+            assert len(extractions) == 1, f"{len(extractions)} extractions, expected 1"
+            assert not [name for name in os.listdir(cache_dir) if not name.endswith(".json")], \
+                "temporary files left in the cache"
+
+            # Stale entries are extracted again
+            assert cache.get("https://youtu.be/dQw4w9WgXcQ", max_age=0) is None
+            cache.ttl = 0
+            time.sleep(0.01)
+            metadata.fetch_info("https://youtu.be/dQw4w9WgXcQ", cache)
+            assert len(extractions) == 2, "stale entry was used"
+
+            # Without a cache, nothing is read or written
+            entries = sorted(os.listdir(cache_dir))
+            metadata.fetch_info("https://youtu.be/dQw4w9WgXcQ", None)
+            metadata.fetch_info("https://youtu.be/dQw4w9WgXcQ", None)
+            assert len(extractions) == 4, "extraction reused without a cache"
+            assert sorted(os.listdir(cache_dir)) == entries
+    finally:
+        metadata.yt_dlp = saved
+
+# ---------------------------------------------------------------------------
+# Fingerprints
+# ---------------------------------------------------------------------------
+
+def test_fingerprint():
+    """Fingerprints survive gain changes and offsets; reused stems line up with the new copy."""
+    import numpy as np
+    import soundfile as sf
+    from producer_toolkit.processor import fingerprint
+    from producer_toolkit.processor.fingerprint import (
+        FingerprintIndex, align_offset, bit_error_rate, compute_fingerprint, reuse_stems,
+    )
+
+    sample_rate = 44100
+
+    def melody(seed, seconds=10):
+        """Decaying three-tone notes, four per second, over a little noise."""
+        rng = np.random.default_rng(seed)
+        times = np.arange(sample_rate // 4) / sample_rate
+        notes = [np.sin(2 * np.pi * rng.uniform(200, 2000, (3, 1)) * times).sum(axis=0)
+                 * np.exp(-3 * times) for _ in range(seconds * 4)]
+        mix = np.concatenate(notes) * 0.2 + rng.standard_normal(seconds * sample_rate) * 0.01
+        return np.stack([mix, mix * 0.8], axis=1).astype(np.float32)
+
+    song, other = melody(0), melody(1)
+    reference = compute_fingerprint(song, sample_rate)
+    assert len(reference) > 0, "no fingerprint for 10 s of audio"
+    assert bit_error_rate(reference, compute_fingerprint(song * 0.5, sample_rate)) == (0.0, 0)
+    assert bit_error_rate(reference, compute_fingerprint(other, sample_rate))[0] > 0.3
+
+    # Computing block by block gives the same fingerprint as all at once
+    saved = fingerprint._BLOCK_SAMPLES
+    fingerprint._BLOCK_SAMPLES = 10007
+    try:
+        assert np.array_equal(compute_fingerprint(song, sample_rate), reference)
+    finally:
+        fingerprint._BLOCK_SAMPLES = saved
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        index = FingerprintIndex(os.path.join(work_dir, "index.sqlite"))
+        stems_dir = os.path.join(work_dir, "song_stems")
+        os.makedirs(stems_dir)
+        sf.write(os.path.join(stems_dir, "vocals.wav"), song * 0.75, sample_rate, subtype="FLOAT")
+        sf.write(os.path.join(stems_dir, "accompaniment.wav"), song * 0.25, sample_rate,
+                 subtype="FLOAT")
+        duration = song.shape[0] / sample_rate
+        index.add(reference, duration, 2, stems_dir)
+
+        quieter = compute_fingerprint(song * 0.5, sample_rate)
+        assert index.lookup(quieter, duration, 2, ["vocals.wav"]) == (os.path.abspath(stems_dir), 0)
+        assert index.lookup(reference, duration, 4, ["vocals.wav"]) is None, "other model matched"
+        assert index.lookup(reference, duration, 2, ["drums.wav"]) is None, "missing stem matched"
+        assert index.lookup(compute_fingerprint(other, sample_rate), duration, 2,
+                            ["vocals.wav"]) is None, "other audio matched"
+        half = song[:5 * sample_rate]
+        assert index.lookup(compute_fingerprint(half, sample_rate), 5.0, 2,
+                            ["vocals.wav"]) is None, "audio of another duration matched"
+
+        # Another encode: 0.3 s of leading silence (not a whole frame) and a shorter tail
+        delay = int(0.3 * sample_rate) + 17
+        copy = np.concatenate([np.zeros((delay, 2), np.float32), song])[:-sample_rate // 2]
+        match_dir, shift = index.lookup(compute_fingerprint(copy, sample_rate),
+                                        copy.shape[0] / sample_rate, 2, ["vocals.wav"])
+        assert match_dir == os.path.abspath(stems_dir)
+        assert abs(shift - delay / sample_rate) < 0.05, f"offset {shift:.3f} s, expected 0.3 s"
+        files = ["vocals.wav", "accompaniment.wav"]
+        shift = align_offset(copy, sample_rate, [os.path.join(match_dir, f) for f in files],
+                             int(round(shift * sample_rate)))
+        assert shift == delay, f"aligned to {shift} samples, expected {delay}"
+
+        output_dir = os.path.join(work_dir, "copy_stems")
+        reuse_stems(match_dir, files, output_dir, offset=shift, length=copy.shape[0])
+        vocals, _ = sf.read(os.path.join(output_dir, "vocals.wav"), dtype="float32")
+        assert vocals.shape == copy.shape, f"reused stem has {vocals.shape[0]} samples"
+        assert np.abs(vocals - copy * 0.75).max() < 1e-6, "reused stem doesn't line up"
+
+        # A copy missing its first 0.3 s and padded at the end: the stems are advanced
+        trimmed = np.concatenate([song[delay:], np.zeros((sample_rate // 2, 2), np.float32)])
+        match_dir, shift = index.lookup(compute_fingerprint(trimmed, sample_rate),
+                                        trimmed.shape[0] / sample_rate, 2, files)
+        shift = align_offset(trimmed, sample_rate, [os.path.join(match_dir, f) for f in files],
+                             int(round(shift * sample_rate)))
+        assert shift == -delay, f"aligned to {shift} samples, expected {-delay}"
+        reuse_stems(match_dir, files, output_dir, offset=shift, length=trimmed.shape[0])
+        vocals, _ = sf.read(os.path.join(output_dir, "vocals.wav"), dtype="float32")
+        assert np.abs(vocals - trimmed * 0.75).max() < 1e-6, "trimmed copy's stem doesn't line up"
+
+        # An aligned copy of the same length gets the stored files themselves
+        reuse_stems(match_dir, files, os.path.join(work_dir, "same"), length=song.shape[0])
+        assert os.path.samefile(os.path.join(work_dir, "same", "vocals.wav"),
+                                os.path.join(stems_dir, "vocals.wav")), "aligned stems copied"
+
+# ---------------------------------------------------------------------------
+# Checkpointed separation
+# ---------------------------------------------------------------------------
+
+class FakeSeparator:
+    """
+    Stand-in for a Spleeter separator with the librosa STFT backend, on a tiny scale.
+
+    The STFT pads frame_length samples on both sides and doesn't center
+    frames, like Spleeter's; masks are computed per model segment (see
+    `fake_masks`), so chunk boundaries matter as they do with the model.
+    """
+
+    _sample_rate = 1000
+    _params = {"instrument_list": ["vocals", "accompaniment"], "T": 8,
+               "frame_length": 64, "frame_step": 16}
+
+    def _stft(self, data, inverse=False, length=None):
+        import numpy as np
+
+        size, step = self._params["frame_length"], self._params["frame_step"]
+        window = np.hanning(size + 1)[:-1]
+        channels = []
+        for channel in range(data.shape[-1]):
+            if inverse:
+                spec = data[:, :, channel]
+                out = np.zeros(size + step * (len(spec) - 1))
+                norm = np.zeros_like(out)
+                for k, frame in enumerate(np.fft.irfft(spec, size, axis=1)):
+                    out[k * step:k * step + size] += frame * window
+                    norm[k * step:k * step + size] += window ** 2
+                out[norm > 1e-10] /= norm[norm > 1e-10]
+                out = np.concatenate([out, np.zeros(max(length + 2 * size - len(out), 0))])
+                channels.append(out[size:size + length, None])
+            else:
+                padded = np.concatenate([np.zeros(size), data[:, channel], np.zeros(size)])
+                frames = np.lib.stride_tricks.sliding_window_view(padded, size)[::step]
+                channels.append(np.fft.rfft(frames * window, axis=1)[:, :, None])
+        return np.concatenate(channels, axis=1 if inverse else 2)
+
+    def save_to_file(self, sources, audio_descriptor, destination):
+        """Writes <destination>/<input name>/<stem>.wav files, like Spleeter's."""
+        import soundfile as sf
+
+        folder = os.path.join(destination, os.path.splitext(os.path.basename(audio_descriptor))[0])
+        os.makedirs(folder, exist_ok=True)
+        for name, waveform in sources.items():
+            sf.write(os.path.join(folder, f"{name}.wav"), waveform, self._sample_rate)
+
+def fake_masks(separator, stft, instruments, audio_descriptor=""):
+    """Soft masks normalized per model segment, standing in for the U-Net."""
+    import numpy as np
+
+    segment = separator._params["T"]
+    pad = -len(stft) % segment
+    magnitude = np.abs(np.concatenate([stft, np.zeros((pad,) + stft.shape[1:])]))
+    segments = magnitude.reshape(-1, segment, *stft.shape[1:])
+    mask = np.clip(segments / (segments.mean(axis=1, keepdims=True) + 1), 0, 1)
+    mask = mask.reshape(-1, *stft.shape[1:])[:len(stft)]
+    # The other instruments share what isn't vocals
+    others = [inst for inst in separator._params["instrument_list"] if inst != "vocals"]
+    masked = {inst: stft * (1 - mask) / len(others) for inst in others}
+    masked["vocals"] = stft * mask
+    return {inst: masked[inst] for inst in instruments}
+
+def test_checkpoint_resume():
+    """An interrupted run resumed with another chunk size writes the same bytes."""
+    import numpy as np
+    from producer_toolkit.processor import spleeter_processor
+    from producer_toolkit.processor.checkpoint import ChunkCheckpoint
+
+    class Interrupted(Exception):
+        pass
+
+    def read(folder):
+        return {name: open(os.path.join(folder, name), "rb").read()
+                for name in sorted(os.listdir(folder)) if name.endswith(".wav")}
+
+    separator = FakeSeparator()
+    waveform = (np.random.default_rng(1).standard_normal((5000, 2)) * 0.3).astype(np.float32)
+    outputs = {"stems": ["vocals", "accompaniment"], "instrumental": True}
+    signature = {"audio": "test", "stem_number": 2}
+    saved = spleeter_processor._masked_spectrograms
+    spleeter_processor._masked_spectrograms = fake_masks
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            reference = os.path.join(work_dir, "reference")
+            spleeter_processor._separate_chunked(separator, waveform, reference, 1, **outputs)
+            expected = read(reference)
+            assert list(expected) == ["accompaniment.wav", "instrumental.wav", "vocals.wav"]
+
+            for stop_after, resume_segments in ((3, 1), (3, 2), (4, 3)):
+                output = os.path.join(work_dir, f"run-{stop_after}-{resume_segments}")
+                folder = os.path.join(output, ".checkpoint")
+                chunks = []
+
+                def interrupt(seconds):
+                    chunks.append(seconds)
+                    if len(chunks) == stop_after:
+                        raise Interrupted()
+
+                try:
+                    spleeter_processor._separate_chunked(
+                        separator, waveform, output, 1, on_chunk=interrupt,
+                        checkpoint=ChunkCheckpoint(folder, signature), **outputs)
+                except Interrupted:
+                    pass
+                assert read(output) == {}, "stems written before the run finished"
+
+                progress = []
+                spleeter_processor._separate_chunked(
+                    separator, waveform, output, resume_segments, on_chunk=progress.append,
+                    checkpoint=ChunkCheckpoint(folder, signature), **outputs)
+                assert read(output) == expected, \
+                    f"resumed run (chunks of {resume_segments}) differs from an uninterrupted one"
+                assert abs(sum(progress) - 5.0) < 1e-9, f"progress adds up to {sum(progress)}"
+                assert not os.path.exists(folder), "checkpoint not removed"
+
+            # A checkpoint of another job is discarded
+            output = os.path.join(work_dir, "other")
+            folder = os.path.join(output, ".checkpoint")
+            stale = ChunkCheckpoint(folder, {"audio": "other", "stem_number": 2})
+            stale.resume()
+            stale.save_chunk(0, 8, {name[:-4]: np.ones((100, 2)) * 0.5 for name in expected},
+                             fake_masks(separator, np.zeros((4, 33, 2)), ["vocals", "accompaniment"]),
+                             separator._sample_rate)
+            spleeter_processor._separate_chunked(separator, waveform, output, 1,
+                                                 checkpoint=ChunkCheckpoint(folder, signature),
+                                                 **outputs)
+            assert read(output) == expected, "stale checkpoint was resumed"
+    finally:
+        spleeter_processor._masked_spectrograms = saved
+
+# ---------------------------------------------------------------------------
+# PCM streams
+# ---------------------------------------------------------------------------
+
+def test_pcm_round_trip():
+    """PCM read and written again is unchanged; full scale maps to the format's limits."""
+    import io
+    import numpy as np
+    import soundfile as sf
+    from producer_toolkit.processor.pcm import PCMWriter, from_pcm_bytes, to_pcm_bytes
+
+    rng = np.random.default_rng(0)
+    for sample_format, dtype, limit in (("s16le", "<i2", 1 << 15), ("s24le", None, 1 << 23)):
+        ints = rng.integers(-limit, limit, size=(1000, 2))
+        ints[:2] = [[-limit, limit - 1], [0, 1]]
+        if dtype:
+            data = ints.astype(dtype).tobytes()
+        else:
+            data = ints.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+        waveform = from_pcm_bytes(data, 2, sample_format)
+        assert waveform.min() >= -1.0 and waveform.max() < 1.0, f"{sample_format} out of range"
+        assert to_pcm_bytes(waveform, sample_format) == data, f"{sample_format} round trip changed"
+        clipped = from_pcm_bytes(to_pcm_bytes(np.array([[1.5, -1.5]]), sample_format), 2,
+                                 sample_format)
+        assert np.allclose(clipped, [[(limit - 1) / limit, -1.0]]), f"{sample_format} clipping"
+
+    # The WAV stream decodes like a file, at the given rate
+    waveform = (rng.standard_normal((500, 2)) * 0.2).astype(np.float32)
+    stream = io.BytesIO()
+    writer = PCMWriter(stream, 22050, 2, num_frames=len(waveform))
+    writer.write(waveform)
+    decoded, sample_rate = sf.read(io.BytesIO(stream.getvalue()), dtype="float32")
+    assert sample_rate == 22050
+    assert np.abs(decoded - waveform).max() <= 0.5 / (1 << 15) + 1e-7
+
+# ---------------------------------------------------------------------------
+# Memory governor
+# ---------------------------------------------------------------------------
+
+def test_memory_governor():
+    """Jobs are admitted in order within the budget; chunk sizes fit the budget."""
+    import threading
+    import time
+    from producer_toolkit.processor.memory import (
+        MemoryGovernor, estimate_peak_memory, max_chunk_samples, parse_size)
+
+    assert parse_size("512M") == 512 * 1024 ** 2
+    assert parse_size("1.5g") == 3 * 1024 ** 3 // 2
+    assert parse_size("8GiB") == 8 * 1024 ** 3
+    try:
+        parse_size("lots")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("invalid size accepted")
+
+    governor = MemoryGovernor("100")
+    assert governor.budget == 100
+    admitted = []
+    first = governor.reserve(60)
+    first.__enter__()
+
+    def job(name, nbytes):
+        with governor.reserve(nbytes):
+            admitted.append((name, governor.in_use))
+
+    # The large job queued first blocks the small one behind it until it fits
+    threads = [threading.Thread(target=job, args=("large", 70))]
+    threads[0].start()
+    while not governor._queue:
+        time.sleep(0.01)
+    threads.append(threading.Thread(target=job, args=("small", 10)))
+    threads[1].start()
+    while len(governor._queue) < 2:
+        time.sleep(0.01)
+    assert admitted == [], f"jobs admitted past the budget: {admitted}"
+    first.__exit__(None, None, None)
+    for thread in threads:
+        thread.join(5)
+    assert [name for name, _ in admitted] == ["large", "small"], admitted
+    assert all(in_use <= 100 for _, in_use in admitted), admitted
+
+    # A job larger than the whole budget still runs, on its own
+    with governor.reserve(1000):
+        assert governor.in_use == 100
+    assert governor.in_use == 0
+
+    # The chunk chosen for a budget fits it, one sample more doesn't
+    budget = parse_size("2G")
+    for mapped in (False, True):
+        chunk = max_chunk_samples(budget, 44100 * 3600, 2, 5, mapped=mapped)
+        assert 0 < chunk < 44100 * 3600
+        assert estimate_peak_memory(44100 * 3600, 2, 5, chunk, mapped) <= budget
+        assert estimate_peak_memory(44100 * 3600, 2, 5, chunk + 1, mapped) > budget
+    assert max_chunk_samples(parse_size("100M"), 44100, 2, 5) == 0
+
+# ---------------------------------------------------------------------------
+# Memory-mapped WAV inputs
+# ---------------------------------------------------------------------------
+
+def test_mapped_waveform():
+    """Mapped 16/24/32-bit and float WAVs decode like libsndfile, in any window."""
+    import numpy as np
+    import soundfile as sf
+    from producer_toolkit.processor.audio import MappedWaveform, map_wav
+
+    rng = np.random.default_rng(3)
+    waveform = np.clip(rng.standard_normal((7001, 2)) * 0.3, -1, 1).astype(np.float32)
+    with tempfile.TemporaryDirectory() as work_dir:
+        for subtype in ("PCM_16", "PCM_24", "PCM_32", "FLOAT"):
+            path = os.path.join(work_dir, f"{subtype}.wav")
+            sf.write(path, waveform, 1000, subtype=subtype)
+            expected, _ = sf.read(path, dtype="float32", always_2d=True)
+
+            mapped = map_wav(path, sample_rate=1000)
+            assert isinstance(mapped, MappedWaveform), f"{subtype} not mapped"
+            assert mapped.shape == expected.shape, f"{subtype} shape {mapped.shape}"
+            assert np.array_equal(mapped[:], expected), f"{subtype} differs from libsndfile"
+            assert np.array_equal(mapped[100:2000], expected[100:2000]), f"{subtype} window differs"
+
+            segment = map_wav(path, offset=1.0, duration=2.0, sample_rate=1000)
+            assert np.array_equal(np.asarray(segment), expected[1000:3000]), f"{subtype} segment"
+            assert segment[5:2].shape == (0, 2), "empty slice has the wrong shape"
+            assert map_wav(path, sample_rate=44100) is None, "mapped at another sample rate"
+
+        # RF64 maps too; other formats and subtypes are left to the decoder
+        path = os.path.join(work_dir, "long.wav")
+        sf.write(path, waveform[:, :1], 1000, subtype="PCM_16", format="RF64")
+        expected, _ = sf.read(path, dtype="float32", always_2d=True)
+        assert np.array_equal(map_wav(path, sample_rate=1000)[:], expected), "RF64 differs"
+        for name, subtype in (("song.flac", None), ("u8.wav", "PCM_U8")):
+            path = os.path.join(work_dir, name)
+            sf.write(path, waveform, 1000, subtype=subtype)
+            assert map_wav(path, sample_rate=1000) is None, f"{name} mapped"
+
+# ---------------------------------------------------------------------------
+# Resampling and channel layouts
+# ---------------------------------------------------------------------------
+
+def test_conform():
+    """Inputs are resampled with little error, downmixed without clipping, and kept when conformant."""
+    import numpy as np
+    from producer_toolkit.processor.resample import QUALITIES, conform, convert_channels, resample
+
+    waveform = np.zeros((480, 2), dtype=np.float32)
+    assert conform(waveform, 44100, 44100, channels=2) is waveform, "conformant input copied"
+
+    # A 1 kHz tone at 96 kHz comes out as the same tone at 44.1 kHz
+    times = np.arange(96000) / 96000
+    tone = np.stack([np.sin(2 * np.pi * 1000 * times)] * 2, axis=1).astype(np.float32)
+    expected = np.sin(2 * np.pi * 1000 * np.arange(44100) / 44100)
+    for quality in QUALITIES:
+        resampled = resample(tone, 96000, 44100, quality)
+        assert resampled.shape == (44100, 2) and resampled.dtype == np.float32, resampled.shape
+        error = np.abs(resampled[1000:-1000, 0] - expected[1000:-1000]).max()
+        assert error < 1e-2, f"{quality} resampling error {error:.2e}"
+    try:
+        resample(tone, 96000, 44100, "bogus")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown quality accepted")
+
+    # Mono is duplicated; full-scale 5.1 and 4.0 mix down to full-scale stereo
+    mono = np.random.default_rng(0).standard_normal((100, 1)).astype(np.float32)
+    assert np.array_equal(convert_channels(mono, 2), np.repeat(mono, 2, axis=1))
+    for source in (6, 4):
+        stereo = convert_channels(np.ones((10, source), dtype=np.float32), 2)
+        assert stereo.shape == (10, 2) and np.allclose(stereo, 1.0), f"{source} channels: {stereo[0]}"
+    assert conform(tone[:, :1], 96000, 44100, channels=2).shape == (44100, 2)
+    assert conform(np.ones((960, 6), np.float32), 96000, 48000, channels=2).shape == (480, 2)
+
+# ---------------------------------------------------------------------------
+# Probe cache and planning
+# ---------------------------------------------------------------------------
+
+def test_probe_cache():
+    """Headers are read once per file version; plans chunk inputs over the budget."""
+    import numpy as np
+    import soundfile as sf
+    from producer_toolkit.processor import probe
+    from producer_toolkit.processor.memory import MemoryGovernor
+
+    reads = []
+    read_header = probe._read_header
+
+    def counting_read(path):
+        reads.append(os.path.basename(path))
+        return read_header(path)
+
+    probe._read_header = counting_read
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            paths = []
+            for name, rate, channels in (("a.wav", 44100, 2), ("b.flac", 48000, 1)):
+                paths.append(os.path.join(work_dir, name))
+                sf.write(paths[-1], np.zeros((rate // 2, channels), np.float32), rate)
+            database = os.path.join(work_dir, "probes.sqlite")
+
+            infos = probe.probe_files(paths, probe.ProbeCache(database))
+            assert [(i.duration, i.sample_rate, i.channels, i.codec) for i in infos] == \
+                [(0.5, 44100, 2, "wav"), (0.5, 48000, 1, "flac")], infos
+            # A new cache on the same database (another process) doesn't read the headers again
+            assert probe.probe_files(paths, probe.ProbeCache(database))[1].sample_rate == 48000
+            assert reads == ["a.wav", "b.flac"], reads
+
+            # A rewritten file is probed again
+            sf.write(paths[0], np.zeros((44100, 2), np.float32), 44100)
+            os.utime(paths[0], ns=(0, 10 ** 9))
+            assert probe.probe_file(paths[0], probe.ProbeCache(database)).duration == 1.0
+            assert reads == ["a.wav", "b.flac", "a.wav"], reads
+
+            # Without a usable database the cache still works in memory
+            blocked = os.path.join(work_dir, "a.wav", "probes.sqlite")
+            memory_only = probe.ProbeCache(blocked)
+            assert memory_only.path is None
+            probe.probe_files(paths * 2, memory_only)
+            assert reads[3:] == ["a.wav", "b.flac"], reads
+
+            # A database that breaks after opening doesn't fail the probe
+            broken = probe.ProbeCache(os.path.join(work_dir, "broken.sqlite"))
+            with open(broken.path, "wb") as f:
+                f.write(b"not a database" * 100)
+            assert probe.probe_file(paths[1], broken).sample_rate == 48000
+            assert probe.probe_file(paths[1], broken).sample_rate == 48000
+            assert reads[5:] == ["b.flac"], reads
+    finally:
+        probe._read_header = read_header
+
+    # Inputs over the budget are planned in whole model segments
+    hour = probe.MediaInfo(3600.0, 48000, 6, "flac")
+    plan = probe.plan_separation(hour, stem_number=4, governor=MemoryGovernor("4G"))
+    assert plan["seconds"] == 3600.0 and plan["resampled"] is True, plan
+    assert plan["chunk_seconds"] and plan["peak_memory"] <= 4 * 1024 ** 3, plan
+    assert plan["chunk_seconds"] * 44100 % (512 * 1024) == 0, plan
+    plan = probe.plan_separation(hour, offset=3590, duration=60, governor=MemoryGovernor("4G"))
+    assert plan["seconds"] == 10 and plan["chunk_seconds"] is None, plan
+    plan = probe.plan_separation(probe.MediaInfo(None, None, None))
+    assert plan == {"seconds": None, "resampled": None, "peak_memory": None,
+                    "chunk_seconds": None}, plan
+
+# ---------------------------------------------------------------------------
+# Batch scheduling
+# ---------------------------------------------------------------------------
+
+def test_scheduler():
+    """Policies order jobs as documented; a failing job doesn't stop the batch."""
+    from producer_toolkit.scheduler import Job, order_jobs, read_batch_file, run_jobs
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        batch_file = os.path.join(work_dir, "batch.txt")
+        with open(batch_file, "w") as f:
+            f.write("# nightly\n"
+                    "long.wav priority=1 submitter=ann\n"
+                    "\n"
+                    "'short one.wav' submitter=bob\n"
+                    "mid.wav submitter=ann\n"
+                    "unknown.wav priority=1 submitter=bob\n"
+                    "tiny.wav submitter=ann\n")
+        jobs = read_batch_file(batch_file)
+        with open(batch_file, "a") as f:
+            f.write("bad.wav speed=2\n")
+        try:
+            read_batch_file(batch_file)
+        except ValueError as e:
+            assert ":8:" in str(e), str(e)
+        else:
+            raise AssertionError("unknown field accepted")
+
+    assert [job.source for job in jobs] == ["long.wav", "short one.wav", "mid.wav",
+                                           "unknown.wav", "tiny.wav"]
+    for job, duration in zip(jobs, (5400.0, 60.0, 600.0, None, 30.0)):
+        job.duration = duration
+
+    def sources(policy):
+        return [job.source for job in order_jobs(jobs, policy)]
+
+    assert sources("fifo") == [job.source for job in jobs]
+    assert sources("sjf") == ["tiny.wav", "short one.wav", "mid.wav", "long.wav",
+                              "unknown.wav"], sources("sjf")
+    assert sources("priority") == ["long.wav", "unknown.wav", "tiny.wav", "short one.wav",
+                                   "mid.wav"], sources("priority")
+    # Each job goes to whoever has received the least processing time so far
+    assert sources("fair") == ["tiny.wav", "short one.wav", "mid.wav", "unknown.wav",
+                               "long.wav"], sources("fair")
+    try:
+        order_jobs(jobs, "lifo")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown policy accepted")
+
+    def handler(job):
+        if job.source == "mid.wav":
+            raise RuntimeError("decode failed")
+        return job.source.upper()
+
+    outcomes = run_jobs([Job(job.source, duration=job.duration or 1e9, index=job.index)
+                         for job in jobs], handler)
+    assert [job.source for job, _, _, _ in outcomes] == sources("sjf")
+    results = {job.source: (result, error) for job, result, error, _ in outcomes}
+    assert results["tiny.wav"] == ("TINY.WAV", None)
+    assert isinstance(results["mid.wav"][1], RuntimeError), results["mid.wav"]
+    assert results["long.wav"][0] == "LONG.WAV", "batch stopped at the failing job"
+
+# ---------------------------------------------------------------------------
+# Separation service
+# ---------------------------------------------------------------------------
+
+def test_separation_service():
+    """Identical requests share a future, compatible ones share a model call, failures are retried alone."""
+    import threading
+    import numpy as np
+    import soundfile as sf
+    from producer_toolkit.processor import batch
+    from producer_toolkit.service import SeparationService
+
+    release = threading.Event()
+    calls = []
+
+    class FakeToolkit:
+        governor = None
+
+        def _separator(self, stem_number):
+            return object(), threading.Lock()
+
+        def extract_stems(self, audio_path, output_dir, stem_number, **kwargs):
+            scratch = kwargs["scratch_dir"]
+            assert os.path.isdir(scratch) and os.path.dirname(scratch) == output_dir, scratch
+            calls.append(("single", os.path.basename(audio_path)))
+            if kwargs.get("progress"):
+                release.wait(5)
+            return output_dir
+
+    def fake_batch(separator, audio_paths, output_dir, stems_dirs=None, **kwargs):
+        names = [os.path.basename(path) for path in audio_paths]
+        calls.append(("batch", names))
+        if "bad.wav" in names:
+            raise ValueError("bad input")
+        return stems_dirs
+
+    separate_batch = batch._separate_batch
+    batch._separate_batch = fake_batch
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            paths = {}
+            for name in ("busy.wav", "a.wav", "b.wav", "c.wav", "bad.wav"):
+                paths[name] = os.path.join(work_dir, name)
+                sf.write(paths[name], np.zeros((100, 2), np.float32), 44100)
+
+            def output(name):
+                return os.path.join(work_dir, "out", name[:-4])
+
+            service = SeparationService(FakeToolkit(), batch_window=0.05)
+            # Keeps the worker busy while the other requests queue up
+            busy = service.submit(paths["busy.wav"], output("busy.wav"), progress=print)
+            first = service.submit(paths["a.wav"], output("a.wav"), 2)
+            assert service.submit(paths["a.wav"], output("a.wav"), 2) is first, "not coalesced"
+            other = service.submit(paths["a.wav"], output("a2.wav"), 2)
+            assert other is not first, "different outputs coalesced"
+            b = service.submit(paths["b.wav"], output("b.wav"), 2)
+            c = service.submit(paths["c.wav"], output("c.wav"), 4)
+            # A failing batch is retried one request at a time
+            bad = service.submit(paths["bad.wav"], output("bad.wav"), 2, stems=["vocals"])
+            good = service.submit(paths["b.wav"], output("b2.wav"), 2, stems=["vocals"])
+            release.set()
+            assert busy.result(5) == output("busy.wav")
+            assert [f.result(5) for f in (first, other, b, c, bad, good)] == \
+                [output(name) for name in ("a.wav", "a2.wav", "b.wav", "c.wav", "bad.wav",
+                                           "b2.wav")]
+            service.close()
+            try:
+                service.submit(paths["a.wav"], output("a.wav"))
+            except RuntimeError:
+                pass
+            else:
+                raise AssertionError("closed service accepted a request")
+
+            assert calls == [("single", "busy.wav"), ("batch", ["a.wav", "a.wav", "b.wav"]),
+                             ("single", "c.wav"), ("batch", ["bad.wav", "b.wav"]),
+                             ("single", "bad.wav"), ("single", "b.wav")], calls
+            for name in ("busy", "c", "bad"):
+                assert os.listdir(os.path.join(work_dir, "out", name)) == [], "scratch left"
+    finally:
+        batch._separate_batch = separate_batch
+
+# ---------------------------------------------------------------------------
+# Saved masks
+# ---------------------------------------------------------------------------
+
+def test_render_from_masks():
+    """Stems rendered from saved masks match the separated ones, and any mix of them can be rendered."""
+    import numpy as np
+    import soundfile as sf
+    from producer_toolkit.processor import masks, spleeter_processor
+
+    separator = FakeSeparator()
+    saved = (spleeter_processor._masked_spectrograms, masks.compute_stft, masks.inverse_stft)
+    spleeter_processor._masked_spectrograms = fake_masks
+    # The fake separator's STFT stands in for librosa's, with the same framing
+    masks.compute_stft = lambda waveform, frame_length, frame_step: separator._stft(waveform)
+    masks.inverse_stft = lambda stft, frame_length, frame_step, length: separator._stft(
+        stft, inverse=True, length=length)
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            waveform = (np.random.default_rng(2).standard_normal((3000, 2)) * 0.3).astype(np.float32)
+            source = os.path.join(work_dir, "mix.wav")
+            sf.write(source, waveform, separator._sample_rate, subtype="FLOAT")
+            manifest = spleeter_processor._mask_manifest(separator, 2, source, None, None,
+                                                         len(waveform))
+            stems_dir = os.path.join(work_dir, "stems")
+            spleeter_processor._separate_chunked(separator, waveform, stems_dir, 2,
+                                                 mask_manifest=manifest)
+            masks_dir = os.path.join(stems_dir, "masks")
+            assert sorted(os.listdir(masks_dir)) == ["accompaniment.npy", "manifest.json",
+                                                    "vocals.npy"], os.listdir(masks_dir)
+            assert masks.load_manifest(masks_dir)["dtype"] == "float16"
+
+            rendered_dir = os.path.join(work_dir, "rendered")
+            paths = masks.render_from_masks(masks_dir, rendered_dir,
+                                            stems=["vocals", "vocals+accompaniment"],
+                                            sample_format="f32le")
+            vocals, _ = sf.read(os.path.join(stems_dir, "vocals.wav"), dtype="float32")
+            rendered, _ = sf.read(paths[0], dtype="float32")
+            error = np.abs(rendered - vocals).max()
+            assert error < 5e-3, f"rendered vocals differ by {error:.1e}"
+            # The masks add up to the mix (up to float16 rounding)
+            mix, _ = sf.read(paths[1], dtype="float32")
+            assert np.abs(mix - waveform).max() < 2e-3, "stem masks don't add up to the mix"
+
+            path, = masks.render_from_masks(masks_dir, rendered_dir, stems=["instrumental"],
+                                            sample_rate=2000, file_format="flac")
+            info = sf.info(path)
+            assert (info.samplerate, info.frames) == (2000, 6000), info
+            for kwargs in ({"stems": ["drums"]}, {"file_format": "mp3"},
+                           {"file_format": "flac", "sample_format": "f32le"}):
+                try:
+                    masks.render_from_masks(masks_dir, rendered_dir, **kwargs)
+                except ValueError:
+                    pass
+                else:
+                    raise AssertionError(f"render_from_masks accepted {kwargs}")
+
+            # A modified source is refused rather than rendered with the wrong masks
+            sf.write(source, waveform[:2000], separator._sample_rate)
+            try:
+                masks.render_from_masks(masks_dir, rendered_dir)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("masks applied to a modified source")
+    finally:
+        spleeter_processor._masked_spectrograms, masks.compute_stft, masks.inverse_stft = saved
+
+# ---------------------------------------------------------------------------
+# In-process decoding
+# ---------------------------------------------------------------------------
+
+def test_soundfile_adapter():
+    """WAV, FLAC and AIFF segments decode in-process; other files go to the fallback adapter."""
+    import numpy as np
+    import soundfile as sf
+    from producer_toolkit.processor import audio
+
+    class FallbackAdapter(audio.AudioAdapter):
+        def __init__(self):
+            self.calls = []
+
+        def load(self, audio_path, offset=None, duration=None, sample_rate=44100):
+            self.calls.append(os.path.basename(audio_path))
+            return np.zeros((0, 2), dtype=np.float32)
+
+    waveform = (np.random.default_rng(0).standard_normal((8000, 2)) * 0.2).astype(np.float32)
+    fallback = FallbackAdapter()
+    saved = audio.get_audio_adapter()
+    audio.set_audio_adapter(audio.SoundfileAdapter(fallback))
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for name, subtype in (("a.wav", "PCM_16"), ("b.wav", "PCM_24"),
+                                  ("c.wav", "FLOAT"), ("d.flac", "PCM_16"), ("e.aiff", "PCM_24")):
+                path = os.path.join(work_dir, name)
+                sf.write(path, waveform, 4000, subtype=subtype)
+                expected, _ = sf.read(path, dtype="float32")
+                segment = audio.load_audio(path, offset=0.5, duration=1.0, sample_rate=4000)
+                assert segment.dtype == np.float32, f"{name} decoded as {segment.dtype}"
+                assert np.array_equal(segment, expected[2000:6000]), f"{name} segment differs"
+                assert audio.load_audio(path, offset=5.0, sample_rate=4000).shape == (0, 2)
+
+            # Other rates are resampled and surround is mixed down, in-process
+            path = os.path.join(work_dir, "surround.wav")
+            sf.write(path, np.ones((8000, 6), np.float32) * 0.5, 8000, subtype="FLOAT")
+            decoded = audio.load_audio(path, sample_rate=4000)
+            assert decoded.shape == (4000, 2), decoded.shape
+            assert np.allclose(decoded[100:-100], 0.5, atol=1e-3), "downmix changed the level"
+
+            # An M4A header libsndfile doesn't recognise, and a format it reads but isn't lossless
+            path = os.path.join(work_dir, "song.m4a")
+            with open(path, "wb") as f:
+                f.write(b"\x00\x00\x00\x20ftypM4A " + bytes(64))
+            audio.load_audio(path)
+            sf.write(os.path.join(work_dir, "song.ogg"), waveform, 4000)
+            audio.load_audio(os.path.join(work_dir, "song.ogg"))
+            assert fallback.calls == ["song.m4a", "song.ogg"], fallback.calls
+    finally:
+        audio.set_audio_adapter(saved)
+
+# ---------------------------------------------------------------------------
+# Progress events
+# ---------------------------------------------------------------------------
+
+def test_progress_events():
+    """Trackers report real-time factor and ETA; yt-dlp hooks become progress events."""
+    import io
+    import json
+    import time
+    from producer_toolkit import progress
+
+    events = []
+    tracker = progress.ProgressTracker(events.append, "separate", total=120.0)
+    time.sleep(0.05)
+    tracker.update(30.0)
+    tracker.advance(30.0, chunk=2)
+    tracker.finish()
+    assert [event["event"] for event in events] == ["start", "progress", "progress", "end"]
+    assert "rtf" not in events[0] and "eta" not in events[0], "estimates before any work"
+    half = events[2]
+    assert half["done"] == 60.0 and half["chunk"] == 2, half
+    assert half["rtf"] == round(half["elapsed"] / 60.0, 4), half
+    assert abs(half["eta"] - half["elapsed"]) < 0.01, f"half done, ETA {half['eta']} s"
+    assert events[3]["done"] == 120.0 and events[3]["eta"] == 0, events[3]
+
+    # Without a callback nothing is reported
+    progress.ProgressTracker(None, "separate", total=1.0).finish()
+
+    events.clear()
+    hook = progress.yt_dlp_hook(events.append)
+    hook({"status": "downloading", "filename": "a.webm", "downloaded_bytes": 250,
+          "total_bytes_estimate": 1000, "speed": 100.0, "eta": 7})
+    hook({"status": "finished", "filename": "a.webm", "total_bytes": 1000})
+    assert [(e["event"], e["unit"], e["done"]) for e in events] == \
+        [("start", "bytes", 0), ("progress", "bytes", 250), ("end", "bytes", 1000)], events
+    assert events[1]["eta"] == 7 and events[1]["speed"] == 100.0, "yt-dlp's ETA not kept"
+
+    stream = io.StringIO()
+    progress.json_lines_callback(stream)(events[2])
+    assert json.loads(stream.getvalue()) == events[2]
+    assert stream.getvalue().count("\n") == 1, "event not written as one line"
+
+# ---------------------------------------------------------------------------
+# Stem subsets
+# ---------------------------------------------------------------------------
+
+def test_stem_subsets():
+    """Only the requested stems are computed and written."""
+    import numpy as np
+    import soundfile as sf
+    from producer_toolkit.processor import probe, spleeter_processor
+    from producer_toolkit.processor.memory import MemoryGovernor
+
+    resolve = spleeter_processor._resolve_outputs
+    four = ["vocals", "drums", "bass", "other"]
+    assert resolve(four) == (four, four)
+    assert resolve(four, ["bass", "vocals"]) == (["bass", "vocals"], ["vocals", "bass"])
+    assert resolve(four, instrumental=True) == ([], ["drums", "bass", "other"])
+    assert resolve(four, ["vocals"], instrumental=True) == (["vocals"], four)
+    try:
+        resolve(four, ["piano"])
+    except ValueError as e:
+        assert "piano" in str(e) and "drums" in str(e), str(e)
+    else:
+        raise AssertionError("unknown stem accepted")
+
+    computed = []
+
+    def recording_masks(separator, stft, instruments, audio_descriptor=""):
+        computed.append(list(instruments))
+        return fake_masks(separator, stft, instruments, audio_descriptor)
+
+    saved = (spleeter_processor._masked_spectrograms, probe._default_cache)
+    spleeter_processor._masked_spectrograms = recording_masks
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            probe._default_cache = probe.ProbeCache(os.path.join(work_dir, "probes.sqlite"))
+            audio_path = os.path.join(work_dir, "song.wav")
+            waveform = (np.random.default_rng(4).standard_normal((3000, 2)) * 0.3).astype(np.float32)
+            sf.write(audio_path, waveform, FakeSeparator._sample_rate)
+
+            for run, (stems, instrumental, needed, written) in enumerate((
+                (["vocals"], False, ["vocals"], ["vocals.wav"]),
+                (None, True, ["accompaniment"], ["instrumental.wav"]),
+                (["vocals"], True, ["vocals", "accompaniment"], ["instrumental.wav", "vocals.wav"]),
+            )):
+                output_dir = os.path.join(work_dir, f"out-{run}")
+                computed.clear()
+                spleeter_processor._extract([FakeSeparator()], [2], audio_path, output_dir,
+                                            stems=stems, instrumental=instrumental,
+                                            governor=MemoryGovernor("4G"))
+                assert computed == [needed], f"{stems}/{instrumental}: model computed {computed}"
+                assert sorted(os.listdir(output_dir)) == written, os.listdir(output_dir)
+    finally:
+        spleeter_processor._masked_spectrograms, probe._default_cache = saved
+
+# ---------------------------------------------------------------------------
+# Several stem counts
+# ---------------------------------------------------------------------------
+
+class FakeFourStemSeparator(FakeSeparator):
+    """FakeSeparator with the instruments of the 4-stem model."""
+
+    _params = dict(FakeSeparator._params, instrument_list=["vocals", "drums", "bass", "other"])
+
+def test_stem_counts():
+    """Several stem counts share one decode and one STFT, each in its own folder."""
+    import numpy as np
+    import soundfile as sf
+    from producer_toolkit.processor import probe, spleeter_processor
+    from producer_toolkit.processor.memory import MemoryGovernor
+
+    assert spleeter_processor._stem_numbers(2) == [2]
+    assert spleeter_processor._stem_numbers([4, 2, 4]) == [4, 2]
+
+    calls = []
+
+    def counting(name, function):
+        def wrapper(*args, **kwargs):
+            calls.append(name)
+            return function(*args, **kwargs)
+        return wrapper
+
+    saved = (spleeter_processor._masked_spectrograms, spleeter_processor.load_audio,
+             spleeter_processor._compute_stft, probe._default_cache)
+    spleeter_processor._masked_spectrograms = fake_masks
+    spleeter_processor.load_audio = counting("decode", spleeter_processor.load_audio)
+    spleeter_processor._compute_stft = counting("stft", spleeter_processor._compute_stft)
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            probe._default_cache = probe.ProbeCache(os.path.join(work_dir, "probes.sqlite"))
+            audio_path = os.path.join(work_dir, "song.wav")
+            waveform = (np.random.default_rng(5).standard_normal((3000, 2)) * 0.3).astype(np.float32)
+            sf.write(audio_path, waveform, FakeSeparator._sample_rate)
+
+            output_dir = os.path.join(work_dir, "both")
+            spleeter_processor._extract([FakeSeparator(), FakeFourStemSeparator()], [2, 4],
+                                        audio_path, output_dir, governor=MemoryGovernor("4G"))
+            assert calls == ["decode", "stft"], f"decoded or transformed again: {calls}"
+            assert sorted(os.listdir(output_dir)) == ["2stems", "4stems"], os.listdir(output_dir)
+            assert sorted(os.listdir(os.path.join(output_dir, "4stems"))) == \
+                ["bass.wav", "drums.wav", "other.wav", "vocals.wav"]
+
+            # Each configuration is saved as a separate run would save it
+            single_dir = os.path.join(work_dir, "single")
+            spleeter_processor._extract([FakeSeparator()], [2], audio_path, single_dir,
+                                        governor=MemoryGovernor("4G"))
+            for name in ("accompaniment.wav", "vocals.wav"):
+                with open(os.path.join(single_dir, name), "rb") as single, \
+                        open(os.path.join(output_dir, "2stems", name), "rb") as shared:
+                    assert single.read() == shared.read(), f"{name} differs from a single run"
+    finally:
+        (spleeter_processor._masked_spectrograms, spleeter_processor.load_audio,
+         spleeter_processor._compute_stft, probe._default_cache) = saved
+
+# ---------------------------------------------------------------------------
+# Asyncio API
+# ---------------------------------------------------------------------------
+
+def test_async_toolkit():
+    """Downloads overlap, separations are bounded, and timed-out work stops at its next update."""
+    import asyncio
+    import threading
+    import time
+    from producer_toolkit.aio import AsyncToolkit, OperationCancelled
+
+    lock = threading.Lock()
+    running = {"download": 0, "separate": 0}
+    peak = dict(running)
+    stopped = []
+
+    class FakeToolkit:
+        def _work(self, stage, name, steps, progress):
+            with lock:
+                running[stage] += 1
+                peak[stage] = max(peak[stage], running[stage])
+            try:
+                for step in range(steps):
+                    time.sleep(0.02)
+                    progress({"stage": stage, "done": step + 1})
+            except OperationCancelled:
+                stopped.append(name)
+                raise
+            finally:
+                with lock:
+                    running[stage] -= 1
+            return name
+
+        def download_audio(self, url, output_path=None, progress=None, steps=5):
+            return self._work("download", url, steps, progress)
+
+        def extract_stems(self, audio_path, output_dir, stem_number=2, progress=None):
+            return self._work("separate", audio_path, 5, progress)
+
+    async def scenario():
+        events = []
+        async with AsyncToolkit(FakeToolkit(), download_workers=4,
+                                separation_workers=1) as toolkit:
+            urls = [f"https://example.com/{i}" for i in range(4)]
+            downloads = await asyncio.gather(*(toolkit.download_audio(url, progress=events.append)
+                                               for url in urls))
+            assert downloads == urls
+            assert len(events) == 20 and events[0]["stage"] == "download", events[:1]
+            separated = await asyncio.gather(*(toolkit.extract_stems(f"{i}.wav", "stems")
+                                               for i in range(3)))
+            assert separated == ["0.wav", "1.wav", "2.wav"]
+            try:
+                await toolkit.download_audio("https://example.com/slow", steps=100, timeout=0.1)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                raise AssertionError("timeout not raised")
+
+    asyncio.run(scenario())
+    assert peak["download"] > 1, "downloads didn't run concurrently"
+    assert peak["separate"] == 1, f"{peak['separate']} separations ran at once"
+    # Closing the toolkit waited for the timed-out download, which stopped early
+    assert stopped == ["https://example.com/slow"], stopped
+
+# ---------------------------------------------------------------------------
+# Single-fetch video and audio
+# ---------------------------------------------------------------------------
+
+def test_download_media():
+    """The WAV comes from the audio stream before the video is merged; only the MP4 and WAV remain."""
+    import time
+    import types
+    from producer_toolkit.downloader import download
+
+    events = []
+
+    class FakeYoutubeDL:
+        """Writes the streams of a format selection and reports them like yt-dlp."""
+
+        streams = [("137", "avc1", "mp4"), ("140", "none", "m4a")]
+
+        def __init__(self, options):
+            self.options = options
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def extract_info(self, url, download=True):
+            assert self.options["keepvideo"], "streams not kept for the WAV"
+            folder = os.path.dirname(self.options["outtmpl"])
+            for format_id, vcodec, ext in self.streams:
+                path = os.path.join(folder, f"Song.f{format_id}.{ext}")
+                with open(path, "w") as f:
+                    f.write(format_id)
+                for hook in self.options["progress_hooks"]:
+                    hook({"status": "finished", "filename": path,
+                          "info_dict": {"vcodec": vcodec, "format_id": format_id}})
+            # The merge and re-encode, while the WAV is being derived
+            deadline = time.monotonic() + 5
+            while len(self.streams) > 1 and not events and time.monotonic() < deadline:
+                time.sleep(0.01)
+            events.append("merged")
+            video_path = os.path.join(folder, "Song.mp4")
+            with open(video_path, "w") as f:
+                f.write("mp4")
+            return {"requested_downloads": [{"filepath": video_path}]}
+
+    class SingleFileYoutubeDL(FakeYoutubeDL):
+        streams = []
+
+    class BrokenAudioYoutubeDL(FakeYoutubeDL):
+        streams = [("137", "avc1", "mp4"), ("broken", "none", "m4a")]
+
+    def fake_extract_wav(source_path, wav_path):
+        with open(source_path) as f:
+            content = f.read()
+        if content == "broken":
+            events.append("failed")
+            raise RuntimeError("ffmpeg failed")
+        with open(wav_path, "w") as f:
+            f.write(f"wav of {content}")
+
+    saved = (download.yt_dlp, download._extract_wav)
+    download._extract_wav = fake_extract_wav
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            download.yt_dlp = types.SimpleNamespace(YoutubeDL=FakeYoutubeDL, utils=saved[0].utils)
+            video_path, audio_path = download.download_media(
+                "https://example.com/v", work_dir, on_audio=lambda path: events.append(path))
+            assert events == [audio_path, "merged"], f"WAV not derived before the merge: {events}"
+            assert open(audio_path).read() == "wav of 140", "WAV not taken from the audio stream"
+            assert sorted(os.listdir(work_dir)) == ["Song.mp4", "Song.wav"], os.listdir(work_dir)
+            assert video_path == os.path.join(work_dir, "Song.mp4")
+
+            # Without a separate audio stream, the WAV comes from the finished MP4
+            events.clear()
+            download.yt_dlp.YoutubeDL = SingleFileYoutubeDL
+            video_path, audio_path = download.download_media("https://example.com/v", work_dir)
+            assert open(audio_path).read() == "wav of mp4"
+
+            # A failed conversion is raised, and the kept streams are still removed
+            events.clear()
+            os.remove(audio_path)
+            download.yt_dlp.YoutubeDL = BrokenAudioYoutubeDL
+            try:
+                download.download_media("https://example.com/v", work_dir)
+            except RuntimeError:
+                pass
+            else:
+                raise AssertionError("conversion failure not raised")
+            assert sorted(os.listdir(work_dir)) == ["Song.mp4"], os.listdir(work_dir)
+    finally:
+        download.yt_dlp, download._extract_wav = saved
+
+TESTS = [
+    ("Atomic Commits", test_atomic_commit),
+    ("Spectrogram Cache", test_spectrogram_cache),
+    ("Toolkit Sessions", test_session),
+    ("Batch Layout", test_batch_layout),
+    ("Folder Sync", test_sync_folder),
+    ("Metadata Cache", test_metadata_cache),
+    ("Fingerprints", test_fingerprint),
+    ("Checkpoint Resume", test_checkpoint_resume),
+    ("PCM Streams", test_pcm_round_trip),
+    ("Memory Governor", test_memory_governor),
+    ("Mapped WAV Inputs", test_mapped_waveform),
+    ("Resampling", test_conform),
+    ("Probe Cache", test_probe_cache),
+    ("Scheduling", test_scheduler),
+    ("Separation Service", test_separation_service),
+    ("Saved Masks", test_render_from_masks),
+    ("In-Process Decoding", test_soundfile_adapter),
+    ("Progress Events", test_progress_events),
+    ("Stem Subsets", test_stem_subsets),
+    ("Stem Counts", test_stem_counts),
+    ("Asyncio API", test_async_toolkit),
+    ("Single-Fetch Media", test_download_media),
+]
+
+def run_tests(force_fail=False):
+    """Run all tests."""
+    print_step("Starting Producer Toolkit Component Tests")
+    print(f"Date and time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"System: {platform.system()} {platform.release()} ({platform.machine()})")
+    print(f"Python: {sys.version}")
+
+    results = [(name, run_test(name, test)) for name, test in TESTS]
+
+    # For testing cleanup behavior with failing tests
+    if force_fail:
+        print("⚠️ Forcing test failure for cleanup testing")
+        results = [(name, False) for name, _ in results]
+
+    # Print summary
+    print_step("Test Summary")
+    for name, success in results:
+        print(f"{name}: {'✅ SUCCESS' if success else '❌ FAILED'}")
+
+    # Return test result for the test runner
+    return all(success for _, success in results)
+
+if __name__ == "__main__":
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -89,6 +89,77 @@ def test_stem_extraction(audio_file, output_dir, stem_number=2):
         print(f"❌ ERROR: Stem extraction failed with exception: {str(e)}")
         return False
 
+def test_time_range_extraction(audio_file, output_dir, offset=0.5, duration=1.0):
+    """Test that only the requested segment is separated."""
+    print_step(f"Testing Time-Range Extraction ({offset}s + {duration}s)")
+    
+    try:
+        import soundfile as sf
+        extract_stems(audio_file, str(output_dir), stem_number=2,
+                      offset=offset, duration=duration)
+        
+        vocals = Path(output_dir) / "vocals.wav"
+        if not vocals.exists():
+            print(f"❌ ERROR: vocals.wav missing from {output_dir}")
+            return False
+        
+        stem_duration = sf.info(str(vocals)).duration
+        if abs(stem_duration - duration) > 0.1:
+            print(f"❌ ERROR: Expected {duration:.2f}s of audio, got {stem_duration:.2f}s")
+            return False
+        
+        print(f"✅ SUCCESS: Segment separated ({stem_duration:.2f}s)")
+        return True
+    except Exception as e:
+        print(f"❌ ERROR: Time-range extraction failed with exception: {str(e)}")
+        return False
+
+def test_streaming_separation(seconds=5.0, block_seconds=1.0, lookahead_seconds=0.5):
+    """Test block-wise separation of a synthesized stream."""
+    print_step(f"Testing Streaming Separation ({seconds}s stream, {block_seconds}s blocks)")
+    
+    try:
+        import numpy as np
+        from producer_toolkit.processor.streaming import StreamingSeparator
+        
+        # A chord with a vibrato "voice" on top, fed in blocks of random sizes
+        sample_rate = 44100
+        t = np.arange(int(seconds * sample_rate)) / sample_rate
+        chord = sum(0.1 * np.sin(2 * np.pi * f * t) for f in (110.0, 138.6, 164.8))
+        voice = 0.2 * np.sin(2 * np.pi * 440.0 * t + 3 * np.sin(2 * np.pi * 5 * t))
+        mix = np.stack([chord + voice, chord + 0.8 * voice], axis=1).astype(np.float32)
+        
+        streamer = StreamingSeparator(2, block_seconds=block_seconds,
+                                      lookahead_seconds=lookahead_seconds)
+        rng = np.random.default_rng(0)
+        outputs = {name: [] for name in streamer.outputs}
+        position = 0
+        while position < len(mix):
+            size = int(rng.integers(256, 16384))
+            for name, block in streamer.process(mix[position:position + size]).items():
+                outputs[name].append(block)
+            position += size
+        for name, block in streamer.flush().items():
+            outputs[name].append(block)
+        stems = {name: np.concatenate(blocks) for name, blocks in outputs.items()}
+        
+        for name, stem in stems.items():
+            if stem.shape != mix.shape:
+                print(f"❌ ERROR: {name} has shape {stem.shape}, expected {mix.shape}")
+                return False
+        
+        # The soft masks sum to one, so the stems add back up to the mix
+        residual = np.abs(sum(stems.values()) - mix).max()
+        if residual > 0.01:
+            print(f"❌ ERROR: Stems don't add up to the mix (max error {residual:.4f})")
+            return False
+        
+        print(f"✅ SUCCESS: Stream separated with {streamer.latency:.2f}s latency")
+        return True
+    except Exception as e:
+        print(f"❌ ERROR: Streaming separation failed with exception: {str(e)}")
+        return False
+
 def run_tests(force_fail=False):
     """Run all tests."""
     print_step("Starting Offline Producer Toolkit Tests")
@@ -107,19 +178,25 @@ def run_tests(force_fail=False):
     
     # Test stem extraction (convert paths to strings)
     stem_success = test_stem_extraction(str(sample_audio), str(dirs["stems"]), stem_number=2)
+    range_success = test_time_range_extraction(str(sample_audio), str(dirs["base"] / "range"))
+    streaming_success = test_streaming_separation()
     
     # For testing cleanup behavior with failing tests
     if force_fail:
         print("⚠️ Forcing test failure for cleanup testing")
         stem_success = False
+        range_success = False
+        streaming_success = False
     
     # Print summary
     print_step("Test Summary")
     print(f"Stem Extraction: {'✅ SUCCESS' if stem_success else '❌ FAILED'}")
+    print(f"Time-Range Extraction: {'✅ SUCCESS' if range_success else '❌ FAILED'}")
+    print(f"Streaming Separation: {'✅ SUCCESS' if streaming_success else '❌ FAILED'}")
     print(f"\nOutput files are located in: {dirs['base'].absolute()}")
     
     # Return test result for the test runner
-    return stem_success
+    return stem_success and range_success and streaming_success
 
 if __name__ == "__main__":
     run_tests()
\ No newline at end of file
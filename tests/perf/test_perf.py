@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Performance Regression Tests for Producer Toolkit
+
+This script measures the toolkit on synthetic audio and compares the results
+with the baselines recorded in tests/perf/baselines.json:
+
+- startup time of `pt --help`
+- real-time factor of a 2-stem separation (warm model)
+- peak resident memory (RSS), and the RSS added per minute of audio
+
+Each measurement runs in a fresh Python process, so peak memory is not
+inflated by earlier tests. A metric fails when it exceeds its baseline by
+more than its tolerance (25% unless the baseline says otherwise). Baselines
+are only valid on the machine they were recorded on, which the file
+describes; until they are recorded, the measurements are only printed.
+
+Instructions:
+1. Activate your conda environment: conda activate producer-toolkit
+2. Run this script: python -m tests.perf.test_perf
+3. After an intended change, record new baselines on the reference machine:
+   python -m tests.perf.test_perf --update-baselines
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+from datetime import datetime
+
+# Make sure the package root is in sys.path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+BASELINES_PATH = Path(__file__).resolve().parent / "baselines.json"
+SAMPLE_RATE = 44100
+DEFAULT_TOLERANCE = 0.25
+
+# Measured metrics, with their tolerance when it differs from the default
+METRICS = {
+    "startup_seconds": {
+        "tolerance": 0.5,
+        "description": "Wall time of `pt --help` (median of 3 runs)",
+    },
+    "rtf_2stems": {
+        "description": "Separation time / audio time, 60 s input, 2 stems, warm model",
+    },
+    "peak_rss_mb_2stems": {
+        "description": "Peak resident memory separating a 60 s input with 2 stems",
+    },
+    "rss_per_minute_mb_2stems": {
+        "description": "Peak resident memory added per minute of audio (90 s run minus 30 s run)",
+    },
+}
+
+def print_step(message):
+    """Print a formatted step message."""
+    print(f"\n{'=' * 50}")
+    print(f"  {message}")
+    print(f"{'=' * 50}")
+
+def write_synthetic_audio(path, seconds):
+    """Write a stereo test signal: a chord with a vibrato "voice" on top."""
+    import numpy as np
+    import soundfile as sf
+
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    chord = sum(0.1 * np.sin(2 * np.pi * f * t) for f in (110.0, 138.6, 164.8))
+    voice = 0.2 * np.sin(2 * np.pi * 440.0 * t + 3 * np.sin(2 * np.pi * 5 * t))
+    mix = np.stack([chord + voice, chord + 0.8 * voice], axis=1).astype(np.float32)
+    sf.write(path, mix, SAMPLE_RATE, subtype='PCM_16')
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MiB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 ** 2 if platform.system() == "Darwin" else peak / 1024
+
+def separation_worker(audio_path, output_dir, stem_number):
+    """Separate one file in this process and print its measurements as JSON."""
+    from producer_toolkit.processor.memory import MemoryGovernor
+    from producer_toolkit.processor.spleeter_processor import _create_separator, _extract
+    import soundfile as sf
+
+    # Load the model before timing, as a warm Toolkit would have it
+    separator = _create_separator(stem_number)
+    started = time.perf_counter()
+    # A large budget keeps the whole-file path, so memory grows with the input
+    _extract([separator], [stem_number], audio_path, output_dir,
+             governor=MemoryGovernor(1024 ** 4))
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "audio_seconds": sf.info(audio_path).duration,
+        "elapsed": elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+def measure_separation(seconds, work_dir, stem_number=2):
+    """Run `separation_worker` on a synthetic input in a fresh process."""
+    audio_path = os.path.join(work_dir, f"synthetic_{seconds:g}s.wav")
+    write_synthetic_audio(audio_path, seconds)
+    output_dir = os.path.join(work_dir, f"stems_{seconds:g}s")
+    result = subprocess.run(
+        [sys.executable, "-m", "tests.perf.test_perf", "--worker", audio_path, output_dir,
+         str(stem_number)],
+        cwd=str(root_dir), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"separation failed:\n{result.stderr[-2000:]}")
+    # The measurements are the last line; the rest is the toolkit's own output
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure_startup(runs=3):
+    """Median wall time of `pt --help` (or the equivalent module invocation)."""
+    command = [shutil.which("pt")] if shutil.which("pt") else [sys.executable, "-m",
+                                                               "producer_toolkit.cli"]
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command + ["--help"], cwd=str(root_dir), capture_output=True, check=True)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+def collect_metrics(work_dir):
+    """Measure every metric of METRICS."""
+    metrics = {}
+
+    print_step("Measuring startup time of pt --help")
+    metrics["startup_seconds"] = measure_startup()
+
+    print_step("Measuring 2-stem separation (30s, 60s and 90s inputs)")
+    runs = {seconds: measure_separation(seconds, work_dir) for seconds in (30, 60, 90)}
+    metrics["rtf_2stems"] = runs[60]["elapsed"] / runs[60]["audio_seconds"]
+    if runs[60]["peak_rss_mb"] is not None:
+        metrics["peak_rss_mb_2stems"] = runs[60]["peak_rss_mb"]
+        # The slope between two lengths excludes the fixed cost of TensorFlow and the model
+        minutes = (runs[90]["audio_seconds"] - runs[30]["audio_seconds"]) / 60
+        metrics["rss_per_minute_mb_2stems"] = (
+            (runs[90]["peak_rss_mb"] - runs[30]["peak_rss_mb"]) / minutes
+        )
+    return metrics
+
+def compare(metrics, baselines):
+    """Print each metric against its budget; return True if all are within budget."""
+    print_step("Performance Summary")
+    default_tolerance = baselines.get("tolerance", DEFAULT_TOLERANCE)
+    all_within = True
+    for name, entry in baselines["metrics"].items():
+        if name not in metrics:
+            print(f"{name}: ⚠️ SKIPPED (not measurable on this platform)")
+            continue
+        if "baseline" not in entry:
+            print(f"{name}: ⚠️ {metrics[name]:.3f} (no baseline recorded)")
+            continue
+        value, baseline = metrics[name], entry["baseline"]
+        limit = baseline * (1 + entry.get("tolerance", default_tolerance))
+        change = (value - baseline) / baseline * 100
+        if value <= limit:
+            print(f"{name}: ✅ {value:.3f} (baseline {baseline}, {change:+.0f}%)")
+        else:
+            print(f"{name}: ❌ {value:.3f} exceeds {limit:.3f} (baseline {baseline}, {change:+.0f}%)")
+            all_within = False
+    return all_within
+
+def run_tests(update_baselines=False):
+    """Run the performance tests."""
+    print_step("Starting Producer Toolkit Performance Tests")
+    print(f"Date and time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"System: {platform.system()} {platform.release()} ({platform.machine()})")
+    print(f"Python: {sys.version}")
+
+    baselines = None
+    if BASELINES_PATH.exists():
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+
+    work_dir = tempfile.mkdtemp(prefix="pt-perf-")
+    try:
+        metrics = collect_metrics(work_dir)
+    except Exception as e:
+        print(f"❌ ERROR: Performance measurement failed with exception: {str(e)}")
+        return False
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if update_baselines:
+        recorded = baselines or {"tolerance": DEFAULT_TOLERANCE, "metrics": {}}
+        for name, value in metrics.items():
+            entry = recorded["metrics"].setdefault(name, dict(METRICS[name]))
+            entry["baseline"] = round(value, 3)
+        # Baselines only mean something on the machine they were measured on
+        recorded["recorded"] = {
+            "date": datetime.now().strftime('%Y-%m-%d'),
+            "system": f"{platform.system()} {platform.release()} ({platform.machine()})",
+            "processor": platform.processor() or None,
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "command": "python -m tests.run_tests --perf --update-baselines",
+        }
+        with open(BASELINES_PATH, "w") as f:
+            json.dump(recorded, f, indent=2)
+            f.write("\n")
+        print(f"✅ Baselines updated in {BASELINES_PATH}")
+        return True
+
+    if baselines is None:
+        print_step("Performance Summary")
+        for name, value in metrics.items():
+            print(f"{name}: {value:.3f}")
+        print(f"⚠️ No baselines recorded yet ({BASELINES_PATH.name} is missing). Record them on "
+              f"the reference machine with: python -m tests.run_tests --perf --update-baselines")
+        return True
+
+    return compare(metrics, baselines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run Producer Toolkit performance tests")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help="Record the measurements as the new baselines")
+    parser.add_argument("--worker", nargs=3, metavar=("AUDIO", "OUTPUT_DIR", "STEMS"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        audio_path, output_dir, stem_number = args.worker
+        separation_worker(audio_path, output_dir, int(stem_number))
+    else:
+        sys.exit(0 if run_tests(update_baselines=args.update_baselines) else 1)
@@ -5,12 +5,14 @@ Test Runner for Producer Toolkit
 This script provides a convenient way to run all or specific tests.
 
 Usage:
-    python -m tests.run_tests [--all|--offline|--local] [--cleanup] [YOUTUBE_URL]
+    python -m tests.run_tests [--all|--offline|--local|--perf] [--cleanup] [YOUTUBE_URL]
     
 Options:
     --all       Run all tests (offline and local)
-    --offline   Run offline tests only (using sample files)
+    --offline   Run offline tests only (component tests and sample files)
     --local     Run local tests (with YouTube download)
+    --perf      Run performance tests against tests/perf/baselines.json
+    --update-baselines  With --perf, record the measurements as new baselines
     --cleanup   Clean up test output files after successful tests
     --fail      Force failure (for testing cleanup behavior)
     
@@ -22,6 +24,7 @@ Examples:
     python -m tests.run_tests --local                    # Run local tests with YouTube download
     python -m tests.run_tests --local --cleanup          # Run local tests and clean up after
     python -m tests.run_tests --local YOUTUBE_URL        # Run local tests with specific URL
+    python -m tests.run_tests --perf                     # Check performance budgets
 """
 
 import sys
@@ -43,15 +46,18 @@ def get_args():
     test_group.add_argument("--all", action="store_true", help="Run all tests")
     test_group.add_argument("--offline", action="store_true", help="Run offline tests only")
     test_group.add_argument("--local", action="store_true", help="Run local tests with YouTube download")
+    test_group.add_argument("--perf", action="store_true", help="Run performance regression tests")
     
     parser.add_argument("--cleanup", action="store_true", help="Clean up test files after successful tests")
     parser.add_argument("--fail", action="store_true", help="Force failure (for testing cleanup behavior)")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help="With --perf, record the measurements as the new baselines")
     parser.add_argument("youtube_url", nargs="?", help="YouTube URL for testing (optional)")
     
     args = parser.parse_args()
     
     # Default to offline if no option specified
-    if not (args.all or args.offline or args.local):
+    if not (args.all or args.offline or args.local or args.perf):
         args.offline = True
         
     return args
@@ -103,8 +109,9 @@ def main():
     all_tests_passed = True
     
     if args.all or args.offline:
+        components_result = run_test_module("tests.local.test_components")
         offline_result = run_test_module("tests.local.test_offline", force_fail=args.fail)
-        all_tests_passed = all_tests_passed and offline_result
+        all_tests_passed = all_tests_passed and components_result and offline_result
         
     if args.all or args.local:
         # For local tests, allow specifying a YouTube URL
@@ -117,6 +124,11 @@ def main():
             local_result = run_test_module("tests.local.test_local")
             all_tests_passed = all_tests_passed and local_result
     
+    if args.perf:
+        import tests.perf.test_perf as test_perf
+        perf_result = test_perf.run_tests(update_baselines=args.update_baselines)
+        all_tests_passed = all_tests_passed and perf_result
+    
     print("\nAll tests completed.")
     
     # Clean up if requested and all tests passed